@@ -4,68 +4,430 @@ API服务模块
 """
 
 import asyncio
+import concurrent.futures
+import math
+import random
+import threading
 import time
-from typing import Optional, Tuple, Dict, Any
-from openai import OpenAI, AsyncOpenAI
+from collections import deque
+from typing import Optional, Tuple, Dict, Any, List, Hashable, Callable, Awaitable, TYPE_CHECKING
 from loguru import logger
-from config import config_manager, APIConfig
-from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
+from config import config_manager, APIConfig, ProviderProfile
+from similarity_cache import SimilarityCache
+from rule_engine import rule_engine
+from compiled_rules import compile_rules, rules_hash
+from http_pool import http_pool
+from token_budget import token_budget, BUDGET_NORMAL, BUDGET_EXHAUSTED
+from events import event_bus, THROTTLED
+
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
+
+# openai导入耗时较长，在首次调用API时才导入，避免拖慢程序启动
+
+# 本地服务不校验密钥，但客户端要求密钥非空
+LOCAL_API_KEY = "local"
+
+
+class RateLimiter:
+    """请求限速器（按固定间隔发放请求许可，线程安全）"""
+    
+    def __init__(self, requests_per_minute: float = 0):
+        """
+        初始化限速器
+        
+        Args:
+            requests_per_minute: 每分钟最多请求数，0表示不限速
+        """
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+        self.set_rate(requests_per_minute)
+    
+    def set_rate(self, requests_per_minute: float):
+        """
+        设置限速
+        
+        Args:
+            requests_per_minute: 每分钟最多请求数，0表示不限速
+        """
+        with self._lock:
+            self.requests_per_minute = requests_per_minute
+            self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+    
+    def _reserve(self) -> float:
+        """预约下一个请求许可，返回需要等待的秒数"""
+        with self._lock:
+            if self._interval <= 0:
+                return 0.0
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self._interval
+            return start - now
+    
+    def acquire(self) -> float:
+        """
+        获取请求许可（阻塞等待）
+        
+        Returns:
+            实际等待的秒数
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+    
+    async def acquire_async(self) -> float:
+        """
+        异步获取请求许可
+        
+        Returns:
+            实际等待的秒数
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class LatencyTracker:
+    """请求耗时统计（按近期耗时的分位数计算单次请求的截止时间，线程安全）"""
+    
+    def __init__(self, window: int = 200):
+        """
+        初始化耗时统计
+        
+        Args:
+            window: 保留的近期请求数
+        """
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.timeouts = 0
+        # 预检测得的基线延迟（样本不足时作为截止时间的起点）
+        self.baseline: Optional[float] = None
+    
+    def record(self, duration: float):
+        """记录一次成功请求的耗时(秒)"""
+        with self._lock:
+            self._samples.append(duration)
+    
+    def record_timeout(self, deadline: Optional[float] = None):
+        """
+        记录一次超过截止时间的请求
+        
+        实际耗时至少为截止时间，按截止时间计入耗时样本并抬高基线，
+        截止时间设得过低时随超时增多而上升，不会一直停留在过低的值。
+        
+        Args:
+            deadline: 本次请求的截止时间(秒)
+        """
+        with self._lock:
+            self.timeouts += 1
+            if deadline is not None:
+                self._samples.append(deadline)
+                if self.baseline is not None:
+                    self.baseline = max(self.baseline, deadline)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        获取近期请求耗时的分位数
+        
+        Args:
+            q: 分位（0~1）
+            
+        Returns:
+            耗时(秒)，没有样本时返回None
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    
+    def deadline(self, app_config) -> float:
+        """
+        计算单次请求的截止时间
+        
+        未启用时使用全局超时；否则为分位数耗时乘以倍数，并限制在下限与全局超时之间。
+        样本不足时以预检测得的基线延迟为起点，没有基线时使用全局超时。
+        
+        Args:
+            app_config: 应用配置
+            
+        Returns:
+            截止时间(秒)
+        """
+        if not app_config.adaptive_timeout:
+            return float(app_config.timeout)
+        if len(self._samples) >= app_config.deadline_min_samples:
+            latency = self.percentile(app_config.deadline_percentile)
+        elif self.baseline is not None:
+            latency = self.baseline
+        else:
+            return float(app_config.timeout)
+        return min(float(app_config.timeout), max(app_config.min_deadline, latency * app_config.deadline_multiplier))
+    
+    def reset_timeouts(self):
+        """重置超时计数（耗时样本跨运行保留）"""
+        with self._lock:
+            self.timeouts = 0
+
+
+class SingleFlight:
+    """
+    相同请求合并（线程与协程通用）
+    
+    同一键的请求正在进行时，后来者等待同一个Future并共享其结果，不再重复调用。
+    领头的协程被取消时，等待者自行重新发起请求；等待的协程被取消时不影响共享的Future。
+    """
+    
+    def __init__(self):
+        """初始化请求合并"""
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, concurrent.futures.Future] = {}
+        self.coalesced = 0
+    
+    def _join(self, key: Hashable) -> Tuple[concurrent.futures.Future, bool]:
+        """
+        加入进行中的请求
+        
+        Returns:
+            (共享的Future, 是否由本调用方发起请求)
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._flights[key] = future
+            return future, True
+    
+    def _land(self, key: Hashable, future: concurrent.futures.Future):
+        """请求结束，后来者重新发起请求"""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+    
+    @staticmethod
+    def _settle(future: concurrent.futures.Future, result: Any = None, error: Optional[BaseException] = None):
+        """设置共享Future的结果（已结束的Future不再设置）"""
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except concurrent.futures.InvalidStateError:
+            pass
+    
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行请求（同键请求进行中时等待其结果）
+        
+        Args:
+            key: 请求键
+            func: 发起请求的函数
+            
+        Returns:
+            (结果, 是否为共享的结果)
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result(), True
+                except concurrent.futures.CancelledError:
+                    continue
+            
+            try:
+                result = func()
+            except BaseException as e:
+                self._land(key, future)
+                self._settle(future, error=e)
+                raise
+            self._land(key, future)
+            self._settle(future, result)
+            return result, False
+    
+    async def do_async(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        异步执行请求（可与线程中的同键请求互相合并）
+        
+        Args:
+            key: 请求键
+            func: 发起请求的协程函数
+            
+        Returns:
+            (结果, 是否为共享的结果)
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                # 每个等待者包装自己的Future并屏蔽取消，自身被取消时共享的Future不受影响
+                waiter = asyncio.wrap_future(future)
+                try:
+                    return await asyncio.shield(waiter), True
+                except asyncio.CancelledError:
+                    # 领头的协程被取消时重新发起，自身被取消时向上抛出
+                    if waiter.cancelled() and future.cancelled():
+                        continue
+                    # 不再等待的结果也要取出，避免未取出异常的警告
+                    waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+                    raise
+            
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                self._land(key, future)
+                future.cancel()
+                raise
+            except BaseException as e:
+                self._land(key, future)
+                self._settle(future, error=e)
+                raise
+            self._land(key, future)
+            self._settle(future, result)
+            return result, False
+    
+    def reset_stats(self):
+        """重置合并计数"""
+        with self._lock:
+            self.coalesced = 0
 
 
 class APIService:
     """API服务类"""
     
+    # 服务商不返回logprobs时使用的基础置信度
+    NEUTRAL_CONFIDENCE = 0.7
+    
     def __init__(self):
         """初始化API服务"""
         self.config = config_manager.get_api_config()
-        self._clients: Dict[str, OpenAI] = {}
-        self._async_clients: Dict[str, AsyncOpenAI] = {}
+        self._clients: Dict[str, "OpenAI"] = {}
+        self._async_clients: Dict[str, "AsyncOpenAI"] = {}
+        self._similarity_cache: Optional[SimilarityCache] = None
+        self.rate_limiter = RateLimiter()
+        self._rate_limit_override: Optional[float] = None
+        self.latency = LatencyTracker()
+        self.single_flight = SingleFlight()
+        self._deadline_override: Optional[float] = None
+        self._logprobs_unsupported: set = set()
+        self._escalation_lock = threading.Lock()
+        self._escalation_fallbacks: set = set()
+        self.escalations = 0
+        self.escalation_changes = 0
+    
+    def set_rate_limit(self, requests_per_minute: Optional[float]):
+        """
+        覆盖配置中的限速（分片运行时每个进程只使用全局限额的一部分）
+        
+        Args:
+            requests_per_minute: 每分钟最多请求数，None表示恢复使用配置
+        """
+        self._rate_limit_override = requests_per_minute
+    
+    def set_request_deadline(self, seconds: Optional[float]):
+        """
+        覆盖自适应截止时间（隔离队列重试超时条目时使用完整的全局超时）
+        
+        Args:
+            seconds: 单次请求截止时间(秒)，None表示恢复自适应
+        """
+        self._deadline_override = seconds
+    
+    def _request_deadline(self, app_config) -> float:
+        """获取本次请求的截止时间(秒)"""
+        if self._deadline_override is not None:
+            return self._deadline_override
+        return self.latency.deadline(app_config)
+    
+    @staticmethod
+    def _is_timeout(error: Exception) -> bool:
+        """判断异常是否为请求超时"""
+        from openai import APITimeoutError
+        
+        return isinstance(error, (APITimeoutError, TimeoutError, asyncio.TimeoutError))
+    
+    def _wait_rate_limit(self, app_config) -> float:
+        """同步等待限速许可，返回等待秒数"""
+        rate = self._rate_limit_override if self._rate_limit_override is not None else app_config.rate_limit_rpm
+        if rate != self.rate_limiter.requests_per_minute:
+            self.rate_limiter.set_rate(rate)
+        waited = self.rate_limiter.acquire()
+        if waited > 0:
+            event_bus.publish(THROTTLED, reason="rate_limit", seconds=waited)
+        return waited
     
-    def _get_client(self, api_type: str) -> OpenAI:
+    async def _wait_rate_limit_async(self, app_config) -> float:
+        """异步等待限速许可，返回等待秒数"""
+        rate = self._rate_limit_override if self._rate_limit_override is not None else app_config.rate_limit_rpm
+        if rate != self.rate_limiter.requests_per_minute:
+            self.rate_limiter.set_rate(rate)
+        waited = await self.rate_limiter.acquire_async()
+        if waited > 0:
+            event_bus.publish(THROTTLED, reason="rate_limit", seconds=waited)
+        return waited
+    
+    def _get_profile(self, api_type: str) -> ProviderProfile:
+        """
+        获取服务商配置
+        
+        Args:
+            api_type: API类型（服务商配置名称）
+            
+        Returns:
+            服务商配置
+            
+        Raises:
+            ValueError: 未配置该服务商
+        """
+        profile = self.config.get_profile(api_type)
+        if profile is None:
+            raise ValueError(f"未配置的API类型: {api_type}（可用: {', '.join(self.config.profile_names())}）")
+        return profile
+    
+    def _get_client(self, api_type: str) -> "OpenAI":
         """
         获取API客户端
         
         Args:
-            api_type: API类型 ('doubao' 或 'deepseek')
+            api_type: API类型（服务商配置名称）
             
         Returns:
             OpenAI客户端实例
         """
         if api_type not in self._clients:
-            if api_type == "doubao":
-                self._clients[api_type] = OpenAI(
-                    base_url="https://ark.cn-beijing.volces.com/api/v3",
-                    api_key=self.config.doubao_api_key
-                )
-            else:  # deepseek
-                self._clients[api_type] = OpenAI(
-                    base_url="https://api.deepseek.com",
-                    api_key=self.config.deepseek_api_key
-                )
+            from openai import OpenAI
+            
+            profile = self._get_profile(api_type)
+            # 所有客户端共用连接池，重建客户端不会断开已建立的连接
+            self._clients[api_type] = OpenAI(
+                base_url=profile.base_url,
+                api_key=profile.api_key or LOCAL_API_KEY,
+                http_client=http_pool.client(config_manager.load_config(), local=profile.is_local)
+            )
         
         return self._clients[api_type]
     
-    def _get_async_client(self, api_type: str) -> AsyncOpenAI:
+    def _get_async_client(self, api_type: str) -> "AsyncOpenAI":
         """
         获取异步API客户端
         
         Args:
-            api_type: API类型 ('doubao' 或 'deepseek')
+            api_type: API类型（服务商配置名称）
             
         Returns:
             异步OpenAI客户端实例
         """
         if api_type not in self._async_clients:
-            if api_type == "doubao":
-                self._async_clients[api_type] = AsyncOpenAI(
-                    base_url="https://ark.cn-beijing.volces.com/api/v3",
-                    api_key=self.config.doubao_api_key
-                )
-            else:  # deepseek
-                self._async_clients[api_type] = AsyncOpenAI(
-                    base_url="https://api.deepseek.com",
-                    api_key=self.config.deepseek_api_key
-                )
+            from openai import AsyncOpenAI
+            
+            profile = self._get_profile(api_type)
+            self._async_clients[api_type] = AsyncOpenAI(
+                base_url=profile.base_url,
+                api_key=profile.api_key or LOCAL_API_KEY,
+                http_client=http_pool.async_client(config_manager.load_config(), local=profile.is_local)
+            )
         
         return self._async_clients[api_type]
     
@@ -79,7 +441,7 @@ class APIService:
         Returns:
             模型名称
         """
-        return "doubao-pro-32k-241215" if api_type == "doubao" else "deepseek-chat"
+        return self._get_profile(api_type).model
     
     def test_connection(self, api_type: str) -> Tuple[bool, str]:
         """
@@ -92,6 +454,8 @@ class APIService:
             (是否成功, 错误信息)
         """
         try:
+            from openai.types.chat import ChatCompletionSystemMessageParam
+            
             client = self._get_client(api_type)
             model_name = self._get_model_name(api_type)
             
@@ -108,175 +472,950 @@ class APIService:
         except Exception as e:
             return False, f"API错误: {str(e)}"
     
-    def classify_file(self, filename: str, entry_type: str, classification_rules: str) -> Tuple[bool, str, Dict[str, Any]]:
+    def _preflight_targets(self, app_config) -> List[Tuple[str, str]]:
+        """
+        获取预检的服务商和模型（当前服务商在前，启用复查时包括第二意见的服务商和模型）
+        
+        Returns:
+            [(API类型, 模型名称)]
+        """
+        profile = self.config.get_profile()
+        targets = [(self.config.api_type, profile.model if profile else "")]
+        if profile is not None and app_config.escalation_threshold > 0:
+            escalation = self._escalation_target(app_config)
+            if escalation not in targets:
+                targets.append(escalation)
+        return targets
+    
+    def _credentials_error(self, api_type: str) -> Optional[str]:
+        """检查服务商是否已配置（非本地服务需要密钥），返回错误信息"""
+        profile = self.config.get_profile(api_type)
+        if profile is None:
+            return f"未配置的API类型: {api_type}"
+        if not profile.api_key and not profile.is_local:
+            return f"{profile.name or api_type} 未配置API密钥"
+        return None
+    
+    @staticmethod
+    def _is_config_error(error: Exception) -> bool:
+        """判断异常是否由密钥或模型配置错误引起（重试无意义）"""
+        from openai import AuthenticationError, PermissionDeniedError, NotFoundError
+        
+        return isinstance(error, (AuthenticationError, PermissionDeniedError, NotFoundError))
+    
+    @staticmethod
+    def _probe_messages() -> list:
+        """预检请求的消息（只要求返回一个token）"""
+        from openai.types.chat import ChatCompletionSystemMessageParam
+        
+        return [ChatCompletionSystemMessageParam(role="system", content="测试连接")]
+    
+    def _summarize_probes(self, api_type: str, model_name: str, durations: List[float],
+                          errors: List[Exception]) -> Dict[str, Any]:
+        """
+        汇总一个服务商的预检请求
+        
+        Args:
+            api_type: API类型
+            model_name: 模型名称
+            durations: 成功请求的耗时(秒)
+            errors: 失败请求的异常
+        
+        Returns:
+            {"connections", "latency", "slowest", "slots", "error"}，slots为估计的并行处理能力（None表示不限）
+        """
+        from openai import RateLimitError
+        
+        summary: Dict[str, Any] = {"model": model_name, "connections": len(durations), "latency": None,
+                                   "slowest": None, "slots": None, "error": None}
+        config_errors = [error for error in errors if self._is_config_error(error)]
+        if config_errors or not durations:
+            summary["error"] = f"{api_type}（{model_name}）: {(config_errors or errors)[0]}"
+            return summary
+        
+        durations.sort()
+        summary["latency"] = durations[len(durations) // 2]
+        summary["slowest"] = durations[-1]
+        probes = len(durations) + len(errors)
+        if self.config.get_profile(api_type).is_local and probes > 1:
+            # 本地服务按并行槽位排队：k个槽位时最慢的请求约为最快的⌈n/k⌉倍
+            summary["slots"] = max(1, round(probes * durations[0] / durations[-1]))
+        elif any(isinstance(error, RateLimitError) for error in errors):
+            summary["slots"] = len(durations)
+        return summary
+    
+    def _calibration_request(self, sample: Tuple[str, str, str], app_config) -> Tuple[Dict[str, Any], list]:
+        """
+        构造校准请求（与正式分类相同的提示词和参数）
+        
+        Args:
+            sample: (文件名, 条目类型, 分类规则)
+            app_config: 应用配置
+        
+        Returns:
+            (请求参数, 请求消息)
+        """
+        options = self._completion_options(self.config.api_type, app_config)
+        return options, self._build_messages(*sample)
+    
+    def _finish_calibration(self, providers: Dict[str, Dict[str, Any]], duration: Optional[float],
+                            error: Optional[Exception]):
+        """记录校准请求的耗时，作为自适应截止时间的起点（失败时不设置起点，沿用全局超时）"""
+        primary = providers[self.config.api_type]
+        if error is not None:
+            logger.warning(f"预检校准请求失败，截止时间从全局超时开始: {error}")
+            return
+        primary["calibration"] = duration
+        self.latency.baseline = duration
+        self.latency.record(duration)
+    
+    def _finish_preflight(self, providers: Dict[str, Dict[str, Any]], start_time: float) -> Dict[str, Any]:
+        """
+        整理预检结果
+        
+        Returns:
+            预检结果
+        """
+        errors = [summary["error"] for summary in providers.values() if summary["error"]]
+        primary = providers.get(self.config.api_type, {})
+        
+        for api_type, summary in providers.items():
+            if summary["error"]:
+                logger.error(f"预检失败 - {summary['error']}")
+            else:
+                logger.info(f"预检 - {api_type}: 预热连接 {summary['connections']} 条，"
+                            f"连接延迟 {summary['latency']:.2f}秒（最慢 {summary['slowest']:.2f}秒）"
+                            + (f"，并行能力约 {summary['slots']}" if summary["slots"] else "")
+                            + (f"，分类请求 {summary['calibration']:.2f}秒" if summary.get("calibration") else ""))
+        return {
+            "ok": not errors,
+            "error": "; ".join(errors) or None,
+            "providers": providers,
+            "concurrency": primary.get("slots"),
+            "duration": time.time() - start_time
+        }
+    
+    def preflight(self, app_config, sample: Optional[Tuple[str, str, str]] = None) -> Dict[str, Any]:
+        """
+        运行前预检：并行打开若干条连接预热连接池（DNS、TLS握手不再集中落在前几个请求上），
+        检查各服务商的密钥和模型
+        
+        预热请求只返回一个token，耗时不代表完整的分类请求，只用于预热和估计并行能力：本地服务按
+        并行请求的排队情况估计可用的并行槽位，被限流时以成功的连接数为准，供调用方确定起始并发数。
+        提供样本时再以正式分类的提示词向当前服务商发送一次校准请求，其耗时作为自适应截止时间的起点。
+        
+        Args:
+            app_config: 应用配置（preflight_connections为每个服务商的预热连接数）
+            sample: 校准请求的(文件名, 条目类型, 分类规则)，None表示不校准
+        
+        Returns:
+            {"ok", "error", "providers": {API类型: 汇总}, "concurrency", "duration"}，
+            密钥缺失、鉴权失败、模型不存在或全部请求失败时ok为False
+        """
+        start_time = time.time()
+        connections = max(1, min(app_config.preflight_connections, app_config.http_max_connections))
+        providers: Dict[str, Dict[str, Any]] = {}
+        
+        for api_type, model_name in self._preflight_targets(app_config):
+            error = self._credentials_error(api_type)
+            if error:
+                providers[api_type] = {"model": model_name, "error": error}
+                break
+            
+            client = self._get_client(api_type).with_options(max_retries=0)
+            messages = self._probe_messages()
+            
+            def probe(_) -> Tuple[Optional[float], Optional[Exception]]:
+                request_start = time.perf_counter()
+                try:
+                    client.chat.completions.create(model=model_name, messages=messages,
+                                                   max_tokens=1, timeout=app_config.timeout)
+                    return time.perf_counter() - request_start, None
+                except Exception as e:
+                    return None, e
+            
+            with concurrent.futures.ThreadPoolExecutor(max_workers=connections,
+                                                       thread_name_prefix="preflight") as executor:
+                outcomes = list(executor.map(probe, range(connections)))
+            providers[api_type] = self._summarize_probes(
+                api_type, model_name, [duration for duration, _ in outcomes if duration is not None],
+                [error for _, error in outcomes if error is not None])
+            if providers[api_type]["error"]:
+                break
+            
+            if sample is not None and api_type == self.config.api_type:
+                options, calibration_messages = self._calibration_request(sample, app_config)
+                request_start = time.perf_counter()
+                try:
+                    client.chat.completions.create(model=model_name, messages=calibration_messages,
+                                                   timeout=app_config.timeout, **options)
+                    self._finish_calibration(providers, time.perf_counter() - request_start, None)
+                except Exception as e:
+                    self._finish_calibration(providers, None, e)
+        
+        return self._finish_preflight(providers, start_time)
+    
+    async def preflight_async(self, app_config, sample: Optional[Tuple[str, str, str]] = None) -> Dict[str, Any]:
         """
-        分类文件
+        异步运行前预检（预热异步客户端的连接池，结果格式与preflight一致）
+        
+        Args:
+            app_config: 应用配置
+            sample: 校准请求的(文件名, 条目类型, 分类规则)，None表示不校准
+        
+        Returns:
+            预检结果
+        """
+        start_time = time.time()
+        connections = max(1, min(app_config.preflight_connections, app_config.http_max_connections))
+        providers: Dict[str, Dict[str, Any]] = {}
+        
+        for api_type, model_name in self._preflight_targets(app_config):
+            error = self._credentials_error(api_type)
+            if error:
+                providers[api_type] = {"model": model_name, "error": error}
+                break
+            
+            client = self._get_async_client(api_type).with_options(max_retries=0)
+            messages = self._probe_messages()
+            
+            async def probe() -> Tuple[Optional[float], Optional[Exception]]:
+                request_start = time.perf_counter()
+                try:
+                    await client.chat.completions.create(model=model_name, messages=messages,
+                                                         max_tokens=1, timeout=app_config.timeout)
+                    return time.perf_counter() - request_start, None
+                except Exception as e:
+                    return None, e
+            
+            outcomes = await asyncio.gather(*(probe() for _ in range(connections)))
+            providers[api_type] = self._summarize_probes(
+                api_type, model_name, [duration for duration, _ in outcomes if duration is not None],
+                [error for _, error in outcomes if error is not None])
+            if providers[api_type]["error"]:
+                break
+            
+            if sample is not None and api_type == self.config.api_type:
+                options, calibration_messages = self._calibration_request(sample, app_config)
+                request_start = time.perf_counter()
+                try:
+                    await client.chat.completions.create(model=model_name, messages=calibration_messages,
+                                                         timeout=app_config.timeout, **options)
+                    self._finish_calibration(providers, time.perf_counter() - request_start, None)
+                except Exception as e:
+                    self._finish_calibration(providers, None, e)
+        
+        return self._finish_preflight(providers, start_time)
+
+    def _get_similarity_cache(self, app_config=None) -> Optional[SimilarityCache]:
+        """
+        获取相似度缓存（首次使用时按配置创建）
+        
+        Args:
+            app_config: 应用配置，默认重新加载
+        
+        Returns:
+            相似度缓存实例，未启用时返回None
+        """
+        app_config = app_config or config_manager.load_config()
+        if not app_config.similarity_cache_enabled:
+            return None
+        
+        if self._similarity_cache is None:
+            self._similarity_cache = SimilarityCache(
+                threshold=app_config.similarity_threshold,
+                audit_rate=app_config.similarity_audit_rate
+            )
+        else:
+            self._similarity_cache.threshold = app_config.similarity_threshold
+            self._similarity_cache.audit_rate = app_config.similarity_audit_rate
+        return self._similarity_cache
+    
+    def _build_messages(self, filename: str, entry_type: str, classification_rules: str) -> list:
+        """
+        构造分类请求消息
         
         Args:
             filename: 文件名
             entry_type: 条目类型（文件/文件夹）
             classification_rules: 分类规则
             
+        Returns:
+            请求消息列表
+        """
+        from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
+        
+        request_messages: list[ChatCompletionSystemMessageParam | ChatCompletionUserMessageParam] = [
+            ChatCompletionSystemMessageParam(role="system", content=compile_rules(classification_rules).prompt_prefix(entry_type) +
+                          f"请分析{entry_type}名称'{filename}'的保管期限（仅返回'永久'、'长期'或'短期'，30年→长期，10年→短期）和所属部门（按规则中的部门名称），格式为'保管期限-部门'（例如'永久-办公室（党委办公室、党委工作部）'）。\n"
+                          f"注意：输出必须为纯文本，禁止使用任何格式符号，仅返回'保管期限-部门'格式的结果。"),
+            ChatCompletionUserMessageParam(role="user", content="请严格按规则分类，输出'保管期限-部门'格式的结果")
+        ]
+        return request_messages
+    
+    def _parse_completion(self, completion, api_type: str, model_name: str,
+                          start_time: float) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        解析分类响应
+        
+        Args:
+            completion: API响应对象
+            api_type: API类型
+            model_name: 模型名称
+            start_time: 请求开始时间
+            
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        content = completion.choices[0].message.content
+        result = content.strip() if content else ""
+        duration = time.time() - start_time
+        
+        details = {
+            "api_type": api_type,
+            "model": model_name,
+            "engine": "llm",
+            "duration": duration,
+            "raw_response": result
+        }
+        
+        # 记录token用量（服务商未返回usage时不计入预算）
+        usage = getattr(completion, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+            details["prompt_tokens"] = prompt_tokens
+            details["completion_tokens"] = completion_tokens
+            token_budget.record(prompt_tokens, completion_tokens)
+        
+        # 以答案中最不确定的token概率作为模型自身的置信度
+        logprobs = getattr(completion.choices[0], "logprobs", None)
+        tokens = getattr(logprobs, "content", None)
+        if isinstance(tokens, list) and tokens:
+            details["logprob_confidence"] = min(math.exp(token.logprob) for token in tokens)
+        
+        # 验证结果格式
+        if "-" in result and any(period in result for period in ["永久", "长期", "短期"]):
+            period, dept = result.split("-", 1)
+            details["period"] = period
+            details["department"] = dept
+            return True, result, details
+        
+        details["error"] = "格式错误"
+        return False, "未分类-未分类", details
+    
+    def _completion_options(self, api_type: str, app_config) -> Dict[str, Any]:
+        """
+        获取额外的请求参数
+        
+        Args:
+            api_type: API类型
+            app_config: 应用配置
+            
+        Returns:
+            请求参数（服务商支持时请求logprobs）
+        """
+        if app_config.confidence_logprobs and api_type not in self._logprobs_unsupported:
+            return {"logprobs": True}
+        return {}
+    
+    def _disable_logprobs_on_error(self, api_type: str, options: Dict[str, Any], error: Exception) -> bool:
+        """
+        请求因logprobs参数被拒绝时，对该服务商关闭logprobs
+        
+        Returns:
+            是否需要不带logprobs重新请求
+        """
+        if "logprobs" not in options or "logprobs" not in str(error).lower():
+            return False
+        
+        self._logprobs_unsupported.add(api_type)
+        logger.warning(f"{api_type} 不支持logprobs，改用规则引擎一致性估计置信度")
+        return True
+    
+    def _request_classification(self, filename: str, entry_type: str, classification_rules: str,
+                                api_type: Optional[str] = None,
+                                model_name: Optional[str] = None,
+                                app_config=None) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        调用大模型分类文件
+        
+        Args:
+            filename: 文件名
+            entry_type: 条目类型（文件/文件夹）
+            classification_rules: 分类规则
+            api_type: API类型，默认使用当前配置
+            model_name: 模型名称，默认使用该API类型的默认模型
+            app_config: 应用配置，默认重新加载
+            
         Returns:
             (是否成功, 分类结果, 详细信息)
         """
         start_time = time.time()
-        api_type = self.config.api_type
+        api_type = api_type or self.config.api_type
+        deadline = None
         
         try:
             # 构造请求消息
-            request_messages: list[ChatCompletionSystemMessageParam | ChatCompletionUserMessageParam] = [
-                ChatCompletionSystemMessageParam(role="system", content=f"你是文件分类助手，需严格根据以下规则判断{entry_type}的保管期限和所属部门：\n"
-                              f"----- 分类规则 -----\n"
-                              f"{classification_rules}\n"
-                              f"请分析{entry_type}名称'{filename}'的保管期限（仅返回'永久'、'长期'或'短期'，30年→长期，10年→短期）和所属部门（按规则中的部门名称），格式为'保管期限-部门'（例如'永久-办公室（党委办公室、党委工作部）'）。\n"
-                              f"注意：输出必须为纯文本，禁止使用任何格式符号，仅返回'保管期限-部门'格式的结果。"),
-                ChatCompletionUserMessageParam(role="user", content="请严格按规则分类，输出'保管期限-部门'格式的结果")
-            ]
+            request_messages = self._build_messages(filename, entry_type, classification_rules)
             
             # 记录API请求
             logger.debug(f"API请求 - 文件: {filename}, API类型: {api_type}")
             
             # 调用API
             client = self._get_client(api_type)
-            model_name = self._get_model_name(api_type)
+            model_name = model_name or self._get_model_name(api_type)
+            app_config = app_config or config_manager.load_config()
+            self._wait_rate_limit(app_config)
             
-            completion = client.chat.completions.create(
-                model=model_name,
-                messages=request_messages,
-                timeout=config_manager.load_config().timeout
-            )
+            # 使用自适应截止时间时超时不再重试，由隔离队列在运行末尾重试
+            deadline = self._request_deadline(app_config)
+            if deadline < app_config.timeout:
+                client = client.with_options(max_retries=0)
+            
+            options = self._completion_options(api_type, app_config)
+            request_start = time.time()
+            try:
+                completion = client.chat.completions.create(
+                    model=model_name,
+                    messages=request_messages,
+                    timeout=deadline,
+                    **options
+                )
+            except Exception as e:
+                if not self._disable_logprobs_on_error(api_type, options, e):
+                    raise
+                request_start = time.time()
+                completion = client.chat.completions.create(
+                    model=model_name,
+                    messages=request_messages,
+                    timeout=deadline
+                )
+            self.latency.record(time.time() - request_start)
             # 解析响应
-            content = completion.choices[0].message.content
-            result = content.strip() if content else ""
+            success, result, details = self._parse_completion(completion, api_type, model_name, start_time)
             
             # 记录API响应
-            logger.debug(f"API响应 - 文件: {filename}, 结果: {result}")
-            
-            # 验证结果格式
-            if "-" in result and any(period in result for period in ["永久", "长期", "短期"]):
-                period, dept = result.split("-", 1)
-                duration = time.time() - start_time
-                
-                details = {
-                    "api_type": api_type,
-                    "model": model_name,
-                    "duration": duration,
-                    "raw_response": result,
-                    "period": period,
-                    "department": dept
-                }
-                
-                return True, result, details
-            else:
-                duration = time.time() - start_time
-                details = {
-                    "api_type": api_type,
-                    "model": model_name,
-                    "duration": duration,
-                    "raw_response": result,
-                    "error": "格式错误"
-                }
-                
-                return False, "未分类-未分类", details
+            logger.debug(f"API响应 - 文件: {filename}, 结果: {details['raw_response']}")
+            return success, result, details
                 
         except Exception as e:
             duration = time.time() - start_time
-            logger.error(f"API调用失败 - 文件: {filename}, 错误: {e}")
-            
             details = {
                 "api_type": api_type,
                 "duration": duration,
                 "error": str(e)
             }
             
+            if deadline is not None and self._is_timeout(e):
+                self.latency.record_timeout(deadline)
+                details["timed_out"] = True
+                details["error"] = f"请求超时（{deadline:.1f}秒）"
+                logger.warning(f"API请求超时 - 文件: {filename}, 截止时间: {deadline:.1f}秒")
+            else:
+                logger.error(f"API调用失败 - 文件: {filename}, 错误: {e}")
+            
             return False, "未分类-未分类", details
     
-    async def classify_file_async(self, filename: str, entry_type: str, classification_rules: str) -> Tuple[bool, str, Dict[str, Any]]:
+    async def _request_classification_async(self, filename: str, entry_type: str, classification_rules: str,
+                                            api_type: Optional[str] = None,
+                                            model_name: Optional[str] = None,
+                                            app_config=None) -> Tuple[bool, str, Dict[str, Any]]:
         """
-        异步分类文件
+        异步调用大模型分类文件
         
         Args:
             filename: 文件名
             entry_type: 条目类型（文件/文件夹）
             classification_rules: 分类规则
+            api_type: API类型，默认使用当前配置
+            model_name: 模型名称，默认使用该API类型的默认模型
+            app_config: 应用配置，默认重新加载
             
         Returns:
             (是否成功, 分类结果, 详细信息)
         """
         start_time = time.time()
-        api_type = self.config.api_type
+        api_type = api_type or self.config.api_type
+        deadline = None
         
         try:
             # 构造请求消息
-            request_messages: list[ChatCompletionSystemMessageParam | ChatCompletionUserMessageParam] = [
-                ChatCompletionSystemMessageParam(role="system", content=f"你是文件分类助手，需严格根据以下规则判断{entry_type}的保管期限和所属部门：\n"
-                              f"----- 分类规则 -----\n"
-                              f"{classification_rules}\n"
-                              f"请分析{entry_type}名称'{filename}'的保管期限（仅返回'永久'、'长期'或'短期'，30年→长期，10年→短期）和所属部门（按规则中的部门名称），格式为'保管期限-部门'（例如'永久-办公室（党委办公室、党委工作部）'）。\n"
-                              f"注意：输出必须为纯文本，禁止使用任何格式符号，仅返回'保管期限-部门'格式的结果。"),
-                ChatCompletionUserMessageParam(role="user", content="请严格按规则分类，输出'保管期限-部门'格式的结果")
-            ]
+            request_messages = self._build_messages(filename, entry_type, classification_rules)
             
             # 记录API请求
             logger.debug(f"异步API请求 - 文件: {filename}, API类型: {api_type}")
             
             # 调用异步API
             client = self._get_async_client(api_type)
-            model_name = self._get_model_name(api_type)
+            model_name = model_name or self._get_model_name(api_type)
+            app_config = app_config or config_manager.load_config()
+            await self._wait_rate_limit_async(app_config)
             
-            completion = await client.chat.completions.create(
-                model=model_name,
-                messages=request_messages,
-                timeout=config_manager.load_config().timeout
-            )
+            # 使用自适应截止时间时超时不再重试，由隔离队列在运行末尾重试
+            deadline = self._request_deadline(app_config)
+            if deadline < app_config.timeout:
+                client = client.with_options(max_retries=0)
+            
+            options = self._completion_options(api_type, app_config)
+            request_start = time.time()
+            try:
+                completion = await client.chat.completions.create(
+                    model=model_name,
+                    messages=request_messages,
+                    timeout=deadline,
+                    **options
+                )
+            except Exception as e:
+                if not self._disable_logprobs_on_error(api_type, options, e):
+                    raise
+                request_start = time.time()
+                completion = await client.chat.completions.create(
+                    model=model_name,
+                    messages=request_messages,
+                    timeout=deadline
+                )
+            self.latency.record(time.time() - request_start)
             
             # 解析响应
-            content = completion.choices[0].message.content
-            result = content.strip() if content else ""
+            success, result, details = self._parse_completion(completion, api_type, model_name, start_time)
             
             # 记录API响应
-            logger.debug(f"异步API响应 - 文件: {filename}, 结果: {result}")
-            
-            # 验证结果格式
-            if "-" in result and any(period in result for period in ["永久", "长期", "短期"]):
-                period, dept = result.split("-", 1)
-                duration = time.time() - start_time
-                
-                details = {
-                    "api_type": api_type,
-                    "model": model_name,
-                    "duration": duration,
-                    "raw_response": result,
-                    "period": period,
-                    "department": dept
-                }
-                
-                return True, result, details
-            else:
-                duration = time.time() - start_time
-                details = {
-                    "api_type": api_type,
-                    "model": model_name,
-                    "duration": duration,
-                    "raw_response": result,
-                    "error": "格式错误"
-                }
-                
-                return False, "未分类-未分类", details
+            logger.debug(f"异步API响应 - 文件: {filename}, 结果: {details['raw_response']}")
+            return success, result, details
                 
         except Exception as e:
             duration = time.time() - start_time
-            logger.error(f"异步API调用失败 - 文件: {filename}, 错误: {e}")
-            
             details = {
                 "api_type": api_type,
                 "duration": duration,
                 "error": str(e)
             }
             
+            if deadline is not None and self._is_timeout(e):
+                self.latency.record_timeout(deadline)
+                details["timed_out"] = True
+                details["error"] = f"请求超时（{deadline:.1f}秒）"
+                logger.warning(f"异步API请求超时 - 文件: {filename}, 截止时间: {deadline:.1f}秒")
+            else:
+                logger.error(f"异步API调用失败 - 文件: {filename}, 错误: {e}")
+            
             return False, "未分类-未分类", details
     
+    def _with_confidence(self, filename: str, entry_type: str, classification_rules: str,
+                         outcome: Tuple[bool, str, Dict[str, Any]]) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        为大模型结果计算置信度
+        
+        有logprobs时以其为基础，否则使用中性值；再按与本地规则引擎的一致程度调整。
+        
+        Returns:
+            (是否成功, 分类结果, 详细信息)，成功时详细信息中含confidence
+        """
+        success, result, details = outcome
+        if not success:
+            return outcome
+        
+        base = details.get("logprob_confidence", self.NEUTRAL_CONFIDENCE)
+        agreement = rule_engine.agreement(filename, entry_type, classification_rules, result)
+        details["rule_agreement"] = agreement
+        
+        if agreement is None:
+            confidence = base
+        elif agreement >= 1:
+            confidence = 1 - (1 - base) * 0.5
+        else:
+            confidence = base * (0.5 + 0.5 * agreement)
+        
+        details["confidence"] = confidence
+        return outcome
+    
+    def _needs_second_opinion(self, outcome: Tuple[bool, str, Dict[str, Any]], app_config) -> bool:
+        """判断是否需要请求第二意见（低置信度或返回格式错误，预算紧张时不复查）"""
+        if app_config.escalation_threshold <= 0 or token_budget.state() != BUDGET_NORMAL:
+            return False
+        
+        success, _, details = outcome
+        if success:
+            return details["confidence"] < app_config.escalation_threshold
+        return details.get("error") == "格式错误"
+    
+    def _escalation_target(self, app_config) -> Tuple[str, str]:
+        """
+        获取第二意见使用的服务商和模型
+        
+        Returns:
+            (API类型, 模型名称)，指定的服务商未配置或缺少密钥（本地服务无需密钥）时退回当前服务商
+        """
+        api_type = app_config.escalation_api_type or self.config.api_type
+        error = self._credentials_error(api_type)
+        if error:
+            if api_type not in self._escalation_fallbacks:
+                self._escalation_fallbacks.add(api_type)
+                logger.warning(f"第二意见服务商不可用（{error}），改用当前服务商 {self.config.api_type}")
+            api_type = self.config.api_type
+        return api_type, app_config.escalation_model or self._get_model_name(api_type)
+    
+    def _resolve_second_opinion(self, filename: str, first: Tuple[bool, str, Dict[str, Any]],
+                                second: Tuple[bool, str, Dict[str, Any]]) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        合并两次分类结果
+        
+        一致时合并置信度；不一致时取置信度较高者，并记录另一结果供人工复核。
+        
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        with self._escalation_lock:
+            self.escalations += 1
+        
+        first_success, first_result, first_details = first
+        second_success, second_result, second_details = second
+        
+        if not second_success:
+            first_details["escalated"] = True
+            return first
+        
+        second_details["escalated"] = True
+        if not first_success:
+            chosen = second
+        elif first_result == second_result:
+            second_details["confidence"] = 1 - (1 - first_details["confidence"]) * (1 - second_details["confidence"])
+            chosen = second
+        else:
+            if second_details["confidence"] >= first_details["confidence"]:
+                chosen, other = second, first
+            else:
+                chosen, other = first, second
+            chosen[2]["escalated"] = True
+            chosen[2]["second_opinion"] = other[1]
+        
+        if chosen[1] != first_result:
+            with self._escalation_lock:
+                self.escalation_changes += 1
+        
+        logger.info(f"第二意见 - 文件: {filename}, 首次: {first_result}, 复查: {second_result}, "
+                    f"采用: {chosen[1]} (置信度 {chosen[2]['confidence']:.2f})")
+        return chosen
+    
+    def _classify_with_confidence(self, filename: str, entry_type: str, classification_rules: str,
+                                  app_config=None) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        调用大模型分类，低置信度时请求第二意见
+        
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        app_config = app_config or config_manager.load_config()
+        first = self._with_confidence(filename, entry_type, classification_rules,
+                                      self._request_classification(filename, entry_type, classification_rules,
+                                                                   app_config=app_config))
+        if not self._needs_second_opinion(first, app_config):
+            return first
+        
+        api_type, model_name = self._escalation_target(app_config)
+        second = self._with_confidence(filename, entry_type, classification_rules,
+                                       self._request_classification(filename, entry_type, classification_rules,
+                                                                    api_type, model_name, app_config))
+        return self._resolve_second_opinion(filename, first, second)
+    
+    async def _classify_with_confidence_async(self, filename: str, entry_type: str, classification_rules: str,
+                                              app_config=None) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        异步调用大模型分类，低置信度时请求第二意见
+        
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        app_config = app_config or config_manager.load_config()
+        first = self._with_confidence(filename, entry_type, classification_rules,
+                                      await self._request_classification_async(filename, entry_type, classification_rules,
+                                                                               app_config=app_config))
+        if not self._needs_second_opinion(first, app_config):
+            return first
+        
+        api_type, model_name = self._escalation_target(app_config)
+        second = self._with_confidence(filename, entry_type, classification_rules,
+                                       await self._request_classification_async(filename, entry_type, classification_rules,
+                                                                                api_type, model_name, app_config))
+        return self._resolve_second_opinion(filename, first, second)
+    
+    def _budget_fallback(self, filename: str, entry_type: str, classification_rules: str,
+                         start_time: float) -> Optional[Tuple[bool, str, Dict[str, Any]]]:
+        """
+        预算紧张时改用规则引擎分类
+        
+        Returns:
+            规则引擎能判断时返回其结果；预算已用完且规则引擎无法判断时返回失败；
+            预算充足或仍可调用大模型时返回None
+        """
+        state = token_budget.state()
+        if state == BUDGET_NORMAL:
+            return None
+        
+        opinion = rule_engine.classify(filename, entry_type, classification_rules)
+        if opinion["result"]:
+            token_budget.record_rule_only()
+            return True, opinion["result"], {
+                "api_type": "rule",
+                "engine": "rule",
+                "duration": time.time() - start_time,
+                "raw_response": opinion["result"],
+                "period": opinion["period"],
+                "department": opinion["department"],
+                "confidence": self.NEUTRAL_CONFIDENCE
+            }
+        
+        if state == BUDGET_EXHAUSTED:
+            token_budget.record_refused()
+            return False, "未分类-未分类", {
+                "api_type": "budget",
+                "engine": "budget",
+                "duration": time.time() - start_time,
+                "error": "预算已用完"
+            }
+        return None
+    
+    def _lookup_similar(self, cache: Optional[SimilarityCache], filename: str, entry_type: str,
+                        classification_rules: str, start_time: float) -> Optional[Tuple[bool, str, Dict[str, Any], bool]]:
+        """
+        在相似度缓存中查找可复用的分类结果
+        
+        Returns:
+            命中时返回(是否成功, 分类结果, 详细信息, 是否需要抽样复核)，否则返回None
+        """
+        if cache is None:
+            return None
+        
+        hit = cache.lookup(filename, entry_type, classification_rules)
+        if hit is None:
+            return None
+        
+        result = hit["result"]
+        period, dept = result.split("-", 1)
+        details = {
+            "api_type": "similarity",
+            "engine": "similarity",
+            "duration": time.time() - start_time,
+            "raw_response": result,
+            "period": period,
+            "department": dept,
+            "similarity": hit["similarity"],
+            "matched_name": hit["matched_name"]
+        }
+        logger.debug(f"相似度缓存命中 - 文件: {filename}, 参照: {hit['matched_name']}, 相似度: {hit['similarity']:.3f}")
+        
+        needs_audit = cache.audit_rate > 0 and random.random() < cache.audit_rate
+        return True, result, details, needs_audit
+    
+    def _finish_audit(self, cache: SimilarityCache, filename: str, entry_type: str, classification_rules: str,
+                      cached: Tuple[bool, str, Dict[str, Any], bool],
+                      audited: Tuple[bool, str, Dict[str, Any]]) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        记录抽样复核结果，复核成功时以大模型结果为准
+        
+        复核不一致时更正命中的缓存记录，之后的近重复名称不再复用被推翻的结果。
+        
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        success, result, details = audited
+        if not success:
+            return cached[:3]
+        
+        matched_name = cached[2]["matched_name"]
+        cache.record_audit(filename, matched_name, cached[1], result)
+        if result != cached[1]:
+            cache.add(matched_name, entry_type, classification_rules, result)
+        cache.add(filename, entry_type, classification_rules, result)
+        details["audited"] = True
+        return success, result, details
+    
+    def _flight_key(self, filename: str, entry_type: str, classification_rules: str,
+                    cache: Optional[SimilarityCache], app_config) -> Optional[Tuple[str, str, str]]:
+        """
+        计算请求合并的键（与相似度缓存的规范化名称一致，未启用缓存时按原名称）
+        
+        Returns:
+            (条目类型, 名称, 规则版本)，未启用请求合并时返回None
+        """
+        if not app_config.coalesce_requests:
+            return None
+        name = SimilarityCache.normalize(filename, entry_type) if cache is not None else filename
+        return entry_type, name, rules_hash(classification_rules)
+    
+    @staticmethod
+    def _shared_outcome(flight: Tuple[Tuple[bool, str, Dict[str, Any]], bool],
+                        start_time: float) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        整理合并请求的结果（共享的结果复制详细信息并标记为合并）
+        
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        (success, result, details), shared = flight
+        if shared:
+            details = dict(details, coalesced=True, duration=time.time() - start_time)
+        return success, result, details
+    
+    def classify_file(self, filename: str, entry_type: str, classification_rules: str) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        分类文件（优先复用近重复名称的分类结果，相同名称的并发请求只调用一次，
+        低置信度时请求第二意见，预算紧张时改用规则引擎）
+        
+        Args:
+            filename: 文件名
+            entry_type: 条目类型（文件/文件夹）
+            classification_rules: 分类规则
+            
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        start_time = time.time()
+        # 每次分类只加载一次配置，传给各个步骤
+        app_config = config_manager.load_config()
+        cache = self._get_similarity_cache(app_config)
+        
+        cached = self._lookup_similar(cache, filename, entry_type, classification_rules, start_time)
+        if cached is not None:
+            # 预算紧张时不再抽样复核
+            if not cached[3] or token_budget.state() != BUDGET_NORMAL:
+                return cached[:3]
+            audited = self._request_classification(filename, entry_type, classification_rules, app_config=app_config)
+            return self._finish_audit(cache, filename, entry_type, classification_rules, cached, audited)
+        
+        fallback = self._budget_fallback(filename, entry_type, classification_rules, start_time)
+        if fallback is not None:
+            return fallback
+        
+        def classify():
+            # 在合并的请求结束前写入缓存，之后的同名请求直接命中缓存
+            outcome = self._classify_with_confidence(filename, entry_type, classification_rules, app_config)
+            if outcome[0] and cache is not None:
+                cache.add(filename, entry_type, classification_rules, outcome[1])
+            return outcome
+        
+        key = self._flight_key(filename, entry_type, classification_rules, cache, app_config)
+        if key is None:
+            return classify()
+        return self._shared_outcome(self.single_flight.do(key, classify), start_time)
+    
+    async def classify_file_async(self, filename: str, entry_type: str, classification_rules: str) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        异步分类文件（优先复用近重复名称的分类结果，相同名称的并发请求只调用一次，
+        低置信度时请求第二意见，预算紧张时改用规则引擎）
+        
+        Args:
+            filename: 文件名
+            entry_type: 条目类型（文件/文件夹）
+            classification_rules: 分类规则
+            
+        Returns:
+            (是否成功, 分类结果, 详细信息)
+        """
+        start_time = time.time()
+        app_config = config_manager.load_config()
+        cache = self._get_similarity_cache(app_config)
+        
+        cached = self._lookup_similar(cache, filename, entry_type, classification_rules, start_time)
+        if cached is not None:
+            # 预算紧张时不再抽样复核
+            if not cached[3] or token_budget.state() != BUDGET_NORMAL:
+                return cached[:3]
+            audited = await self._request_classification_async(filename, entry_type, classification_rules,
+                                                               app_config=app_config)
+            return self._finish_audit(cache, filename, entry_type, classification_rules, cached, audited)
+        
+        fallback = self._budget_fallback(filename, entry_type, classification_rules, start_time)
+        if fallback is not None:
+            return fallback
+        
+        async def classify():
+            outcome = await self._classify_with_confidence_async(filename, entry_type, classification_rules, app_config)
+            if outcome[0] and cache is not None:
+                cache.add(filename, entry_type, classification_rules, outcome[1])
+            return outcome
+        
+        key = self._flight_key(filename, entry_type, classification_rules, cache, app_config)
+        if key is None:
+            return await classify()
+        return self._shared_outcome(await self.single_flight.do_async(key, classify), start_time)
+    
+    def get_similarity_stats(self) -> Dict[str, Any]:
+        """
+        获取相似度缓存统计
+        
+        Returns:
+            命中率与复核统计，未启用时返回空字典
+        """
+        return self._similarity_cache.get_stats() if self._similarity_cache else {}
+    
+    def reset_similarity_stats(self):
+        """重置相似度缓存统计（每次运行开始时调用）"""
+        if self._similarity_cache:
+            self._similarity_cache.reset_stats()
+    
+    def get_escalation_stats(self) -> Dict[str, Any]:
+        """
+        获取第二意见统计
+        
+        Returns:
+            复查次数与改判次数
+        """
+        with self._escalation_lock:
+            return {"escalations": self.escalations, "escalation_changes": self.escalation_changes}
+    
+    def reset_escalation_stats(self):
+        """重置第二意见统计（每次运行开始时调用）"""
+        with self._escalation_lock:
+            self.escalations = 0
+            self.escalation_changes = 0
+    
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """
+        获取请求合并统计
+        
+        Returns:
+            共享进行中请求结果的次数
+        """
+        return {"coalesced_calls": self.single_flight.coalesced}
+    
+    def reset_coalescing_stats(self):
+        """重置请求合并统计（每次运行开始时调用）"""
+        self.single_flight.reset_stats()
+    
+    def get_deadline_stats(self) -> Dict[str, Any]:
+        """
+        获取请求耗时与截止时间统计
+        
+        Returns:
+            耗时中位数、P95、当前截止时间和超时次数
+        """
+        app_config = config_manager.load_config()
+        return {
+            "p50": self.latency.percentile(0.5),
+            "p95": self.latency.percentile(0.95),
+            "deadline": self._request_deadline(app_config),
+            "timeouts": self.latency.timeouts
+        }
+    
+    def reset_deadline_stats(self):
+        """重置超时计数（每次运行开始时调用）"""
+        self.latency.reset_timeouts()
+    
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """
+        获取HTTP连接复用统计
+        
+        Returns:
+            请求数、新建连接数、TLS握手数和连接复用率
+        """
+        return http_pool.get_stats()
+    
+    def reset_connection_stats(self):
+        """重置HTTP连接复用统计（每次运行开始时调用）"""
+        http_pool.reset_stats()
+    
     def update_config(self, api_config: APIConfig):
         """
         更新API配置
@@ -287,7 +1426,7 @@ class APIService:
         old_config = self.config
         self.config = api_config
         
-        # 清除缓存的客户端
+        # 清除缓存的客户端（底层连接池共享，已建立的连接继续复用）
         self._clients.clear()
         self._async_clients.clear()
         
@@ -0,0 +1,113 @@
+"""
+归档索引模块
+在归档文件夹中记录每个已归档条目的分类结果和规则版本，供规则变化后增量重新分类
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+from loguru import logger
+
+
+# 索引文件名（位于归档文件夹根目录，加载待分类文件时跳过）
+INDEX_FILE_NAME = ".file_classifier_index.json"
+
+
+class ArchiveIndex:
+    """归档索引"""
+
+    def __init__(self, archive_folder: str):
+        """
+        初始化归档索引
+
+        Args:
+            archive_folder: 归档文件夹（分类目录所在的源文件夹）
+        """
+        self.archive_folder = archive_folder
+        self.path = os.path.join(archive_folder, INDEX_FILE_NAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def relative_path(self, path: str) -> str:
+        """将条目路径转换为相对归档文件夹的路径（统一使用/分隔）"""
+        return os.path.relpath(path, self.archive_folder).replace(os.sep, "/")
+
+    def load(self) -> "ArchiveIndex":
+        """
+        读取索引文件
+
+        Returns:
+            索引自身，便于链式调用
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取归档索引失败，将重新建立: {self.path}, 错误: {e}")
+            self.entries = {}
+        return self
+
+    def save(self) -> bool:
+        """
+        写入索引文件（先写临时文件再替换，避免中断时损坏）
+
+        Returns:
+            是否成功
+        """
+        temp_path = self.path + ".tmp"
+        try:
+            with self._lock:
+                data = {"version": 1, "updated": time.strftime("%Y-%m-%d %H:%M:%S"), "entries": self.entries}
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            return True
+        except OSError as e:
+            logger.error(f"写入归档索引失败: {self.path}, 错误: {e}")
+            return False
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        查询条目记录
+
+        Args:
+            path: 条目当前路径
+
+        Returns:
+            记录字典，不存在时返回None
+        """
+        return self.entries.get(self.relative_path(path))
+
+    def record(self, path: str, result: str, rules_version: Optional[str],
+               confidence: Optional[float] = None, engine: Optional[str] = None):
+        """
+        记录已归档的条目
+
+        Args:
+            path: 条目归档后的路径
+            result: 分类结果（保管期限-部门）
+            rules_version: 分类时使用的规则版本
+            confidence: 置信度
+            engine: 分类方式
+        """
+        with self._lock:
+            self.entries[self.relative_path(path)] = {
+                "result": result,
+                "rules_version": rules_version,
+                "confidence": confidence,
+                "engine": engine
+            }
+
+    def remove(self, path: str):
+        """
+        删除条目记录
+
+        Args:
+            path: 条目原路径
+        """
+        with self._lock:
+            self.entries.pop(self.relative_path(path), None)
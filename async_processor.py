@@ -0,0 +1,464 @@
+"""
+异步文件处理模块
+大模型调用使用原生异步接口，文件系统操作在限定大小的线程池中执行，单个事件循环即可驱动大量条目
+"""
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Any, Optional, AsyncIterator
+from loguru import logger
+from api_service import api_service
+from config import config_manager
+from file_processor import FileProcessor, FileItem, STREAM_BUFFER_SIZE, STREAM_SNAPSHOT_INTERVAL
+from events import ITEM_STARTED, MOVED
+
+# aiofiles在首次执行文件操作时才导入
+aiofiles = None
+_aiofiles_loaded = False
+
+# 导出报告时每次写入的行数
+_WRITE_CHUNK_LINES = 1000
+
+
+def _load_aiofiles():
+    """
+    导入aiofiles
+
+    Returns:
+        aiofiles模块，缺失时返回None（直接在线程池中执行阻塞操作）
+    """
+    global aiofiles, _aiofiles_loaded
+    if not _aiofiles_loaded:
+        _aiofiles_loaded = True
+        try:
+            import aiofiles as module
+            import aiofiles.os
+            aiofiles = module
+        except ImportError:
+            aiofiles = None
+    return aiofiles
+
+
+class AsyncFileProcessor(FileProcessor):
+    """异步文件处理器"""
+
+    def __init__(self, io_workers: Optional[int] = None):
+        """
+        初始化异步文件处理器
+
+        Args:
+            io_workers: 文件系统操作线程数，默认读取配置
+        """
+        super().__init__()
+        self.io_workers = io_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 结果流的事件队列（aiter_results期间设置）
+        self._stream_events: Optional[asyncio.Queue] = None
+        self._stream_buffer = STREAM_BUFFER_SIZE
+        # 正在运行的事件循环（预检在其中预热异步客户端的连接）
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _io_executor(self) -> ThreadPoolExecutor:
+        """获取文件系统操作线程池（首次使用时创建）"""
+        if self._executor is None:
+            workers = self.io_workers or config_manager.load_config().io_workers
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file-io")
+        return self._executor
+
+    async def _run_io(self, func, *args, **kwargs):
+        """在文件系统操作线程池中执行阻塞调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor(), functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        """关闭文件系统操作线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _run_preflight(self, app_config, sample: Tuple[str, str, str]) -> Dict[str, Any]:
+        """
+        在事件循环中用异步客户端预检（_begin_run在文件系统操作线程中调用）
+        
+        通过继承的同步入口（process_all_files、create_plan）运行时没有事件循环，改用同步预检。
+        """
+        if self._loop is None or not self._loop.is_running():
+            return super()._run_preflight(app_config, sample)
+        return asyncio.run_coroutine_threadsafe(api_service.preflight_async(app_config, sample), self._loop).result()
+
+    async def load_files_async(self, source_folder: str) -> List[FileItem]:
+        """
+        异步加载源文件夹中的文件
+
+        Args:
+            source_folder: 源文件夹路径
+
+        Returns:
+            文件项列表
+        """
+        return await self._run_io(self.load_files, source_folder)
+
+    async def create_classification_directories_async(self) -> bool:
+        """
+        异步创建分类目录结构
+
+        Returns:
+            是否成功
+        """
+        return await self._run_io(self.create_classification_directories)
+
+    async def _ensure_directory_async(self, directory: str):
+        """
+        确保目录存在（带已存在目录缓存）
+
+        Args:
+            directory: 目录路径
+        """
+        if directory in self._known_dirs:
+            return
+        module = _load_aiofiles()
+        if module is not None:
+            await module.os.makedirs(directory, exist_ok=True, executor=self._io_executor())
+        else:
+            await self._run_io(os.makedirs, directory, exist_ok=True)
+        self._known_dirs.add(directory)
+
+    async def move_file_async(self, file_item: FileItem) -> bool:
+        """
+        异步移动文件到目标位置
+
+        Args:
+            file_item: 文件项
+
+        Returns:
+            是否成功
+        """
+        if not file_item.target_path:
+            file_item.error = "目标路径未设置"
+            return False
+
+        if os.path.normcase(os.path.abspath(file_item.path)) == os.path.normcase(os.path.abspath(file_item.target_path)):
+            # 重新分类时结果未变，条目已在目标位置
+            return True
+
+        try:
+            await self._ensure_directory_async(os.path.dirname(file_item.target_path))
+            # 以缓存的目录句柄为基准移动，跨磁盘时回退到shutil.move复制
+            await self._run_io(self.mover.move, file_item.path, file_item.target_path)
+            logger.info(f"移动成功: {file_item.name} → {file_item.target_path}")
+            self.events.publish(MOVED, file_item, target_path=file_item.target_path)
+            return True
+
+        except Exception as e:
+            file_item.error = f"移动失败: {str(e)}"
+            logger.error(f"移动失败: {file_item.name}, 错误: {e}")
+            return False
+
+    async def export_results_async(self, output_file: str) -> bool:
+        """
+        异步导出处理结果
+
+        Args:
+            output_file: 输出文件路径
+
+        Returns:
+            是否成功
+        """
+        module = _load_aiofiles()
+        if module is None:
+            return await self._run_io(self.export_results, output_file)
+
+        try:
+            async with module.open(output_file, "w", encoding="utf-8", executor=self._io_executor()) as f:
+                chunk: List[str] = []
+                for line in self.report_lines():
+                    chunk.append(line)
+                    if len(chunk) >= _WRITE_CHUNK_LINES:
+                        await f.write("".join(chunk))
+                        chunk = []
+                if chunk:
+                    await f.write("".join(chunk))
+
+            logger.info(f"结果导出成功: {output_file}")
+            return True
+
+        except Exception as e:
+            logger.error(f"结果导出失败: {e}")
+            return False
+
+    async def classify_file_async(self, file_item: FileItem, classification_rules: Optional[str] = None) -> bool:
+        """
+        异步分类单个文件
+
+        Args:
+            file_item: 文件项
+            classification_rules: 分类规则，默认使用当前规则
+
+        Returns:
+            是否成功
+        """
+        start_time = time.time()
+        classification_rules = classification_rules or self.classification_rules
+
+        try:
+            outcome = await api_service.classify_file_async(
+                file_item.name,
+                file_item.entry_type,
+                classification_rules
+            )
+            if self.buckets.touches_disk:
+                # 分桶需要统计部门目录条目数或读取修改时间，在线程池中计算目标路径，不阻塞事件循环
+                return await self._run_io(self._handle_classification, file_item, classification_rules,
+                                          start_time, outcome)
+            return self._handle_classification(file_item, classification_rules, start_time, outcome)
+
+        except Exception as e:
+            file_item.processing_time = time.time() - start_time
+            file_item.error = str(e)
+            logger.error(f"分类异常: {file_item.name}, 错误: {e}")
+            return False
+
+    async def _process_item_async(self, file_item: FileItem, classification_rules: Optional[str] = None) -> bool:
+        """
+        异步处理单个条目（分类并移动）
+
+        Returns:
+            是否成功
+        """
+        if not await self.classify_file_async(file_item, classification_rules):
+            return False
+        if self._dry_run:
+            return True
+        if await self.move_file_async(file_item):
+            file_item.completed = True
+            return True
+        return False
+
+    async def _process_group_async(self, group: List[FileItem],
+                                   classification_rules: Optional[str] = None) -> List[bool]:
+        """
+        异步处理一组名称主干相同的条目（只分类代表条目，结果应用到全组）
+
+        Returns:
+            各条目是否成功
+        """
+        for file_item in group:
+            self.events.publish(ITEM_STARTED, file_item)
+        representative = group[0]
+        results = [await self._process_item_async(representative, classification_rules)]
+
+        for member in group[1:]:
+            if representative.classification_result and representative.target_path:
+                member.engine = "group"
+                member.confidence = representative.confidence
+                member.rules_version = representative.rules_version
+                if self.buckets.touches_disk:
+                    success = await self._run_io(self.apply_classification, member,
+                                                 representative.classification_result)
+                else:
+                    success = self.apply_classification(member, representative.classification_result)
+                if success and not self._dry_run:
+                    success = await self.move_file_async(member)
+                    member.completed = success
+                self.collapsed_calls += 1
+            else:
+                success = await self._process_item_async(member, classification_rules)
+            results.append(success)
+
+        return results
+
+    async def _wait_while_paused(self):
+        """暂停期间等待（取消时立即返回）"""
+        while not self._pause_event.is_set() and not self._cancel_event.is_set():
+            await asyncio.sleep(0.1)
+
+    async def _wait_for_consumer(self):
+        """结果流积压达到上限时等待使用方取走（未在流式处理时立即返回）"""
+        while (self._stream_events is not None and self._stream_events.qsize() >= self._stream_buffer
+               and not self._cancel_event.is_set()):
+            await asyncio.sleep(0.01)
+
+    async def _run_quarantine_async(self, progress_callback=None):
+        """
+        以低并发重试隔离队列中的超时条目（主队列处理完后执行）
+
+        Args:
+            progress_callback: 进度回调函数
+        """
+        items = self._take_quarantine()
+        if not items:
+            return
+
+        pending = iter(items)
+
+        async def retry():
+            for file_item in pending:
+                await self._wait_while_paused()
+                if self._cancel_event.is_set():
+                    # 取消后未重试的条目按失败计
+                    file_item.error = "请求超时，已取消重试"
+                    self._quarantine.append(file_item)
+                    continue
+                try:
+                    success = await self._process_item_async(file_item, self._current_rules())
+                except Exception as e:
+                    file_item.error = str(e)
+                    success = False
+                self._settle_quarantined(file_item, success, progress_callback)
+                await self._wait_for_consumer()
+
+        try:
+            workers = config_manager.load_config().quarantine_workers
+            await asyncio.gather(*(retry() for _ in range(min(workers, len(items)))))
+        finally:
+            api_service.set_request_deadline(None)
+
+    async def process_all_files_async(self, classification_rules: str, progress_callback=None,
+                                      max_concurrency: Optional[int] = None,
+                                      dry_run: bool = False,
+                                      source_folder: Optional[str] = None) -> Dict[str, Any]:
+        """
+        异步处理所有文件
+
+        固定数量的协程依次领取分组，不为每个条目创建任务，条目数量很大时内存占用也保持稳定。
+
+        Args:
+            classification_rules: 分类规则
+            progress_callback: 进度回调函数（在事件循环线程中调用）
+            max_concurrency: 同时进行的最大条目数，默认读取配置
+            dry_run: 只分类不创建目录、不移动文件
+            source_folder: 指定时边扫描该文件夹边处理（见process_all_files），扫描和分组在线程池中进行
+
+        Returns:
+            处理结果统计（与process_all_files格式一致）
+        """
+        self._loop = asyncio.get_running_loop()
+        app_config = config_manager.load_config()
+        try:
+            batches, first_batch = await self._run_io(self._start_scan, source_folder, app_config)
+        except OSError as e:
+            logger.error(f"扫描文件夹失败 - 源文件夹: {source_folder}, 错误: {e}")
+            return {"success": False, "error": f"扫描文件夹失败: {e}"}
+        run = await self._run_io(self._begin_run, classification_rules, dry_run, first_batch)
+        if run is None:
+            return {"success": False, "error": self._begin_error}
+        pending_items, groups = run
+        total_files = len(pending_items)
+        max_concurrency = self._preflight_workers(max(1, max_concurrency or app_config.async_concurrency))
+        logger.info(f"开始异步处理 {total_files} 个文件，分为 {len(groups)} 组，并发数: {max_concurrency}"
+                    + ("（边扫描边处理，以上为第一批）" if batches is not None else ""))
+        self._enter_stage("classify")
+
+        group_count = len(groups)
+        pending_groups = iter(groups)
+        del groups
+        scan_lock = asyncio.Lock()
+        submitted = 0
+
+        async def next_group() -> Optional[List[FileItem]]:
+            nonlocal pending_groups
+            group = next(pending_groups, None)
+            if group is not None or batches is None:
+                return group
+            # 当前批领完后由一个协程扫描下一批，其余协程等待
+            async with scan_lock:
+                group = next(pending_groups, None)
+                while group is None:
+                    batch_groups = await self._run_io(self._next_batch_groups, batches, app_config)
+                    if batch_groups is None:
+                        return None
+                    pending_groups = iter(batch_groups)
+                    group = next(pending_groups, None)
+                return group
+
+        async def worker():
+            nonlocal submitted
+            while True:
+                await self._wait_while_paused()
+                if self._cancel_event.is_set():
+                    return
+                group = await next_group()
+                if group is None:
+                    return
+                submitted += len(group)
+
+                try:
+                    # 条目开始处理时确定规则版本，处理过程中规则更新不影响本组
+                    results = await self._process_group_async(group, self._current_rules())
+                except Exception as e:
+                    for file_item in group:
+                        if not file_item.completed and not file_item.error:
+                            file_item.error = str(e)
+                    logger.error(f"处理异常: {group[0].name}, 错误: {e}")
+                    results = [file_item.completed for file_item in group]
+
+                self._record_group(group, results, progress_callback)
+                await self._wait_for_consumer()
+
+        # 边扫描边处理时后续批次的条目数未知，按并发数启动协程
+        workers = max_concurrency if batches is not None else min(max_concurrency, group_count)
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        await self._run_quarantine_async(progress_callback)
+
+        return await self._run_io(self._finish_run, pending_items, submitted, dry_run)
+
+    async def aiter_results(self, classification_rules: str, max_concurrency: Optional[int] = None,
+                            dry_run: bool = False, snapshot_interval: float = STREAM_SNAPSHOT_INTERVAL,
+                            buffer_size: int = STREAM_BUFFER_SIZE,
+                            source_folder: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式异步处理所有文件，条目得出最终结果时逐个产出（事件格式与iter_results一致）
+
+        使用方处理较慢时工作协程等待，事件不在队列中积压；提前停止迭代会取消本次运行。
+        与iter_results相同，指定source_folder时边扫描边处理，峰值内存与文件夹大小无关。
+
+        Args:
+            classification_rules: 分类规则
+            max_concurrency: 同时进行的最大条目数，默认读取配置
+            dry_run: 只分类不创建目录、不移动文件
+            snapshot_interval: 汇总快照的间隔(秒)
+            buffer_size: 等待取走的最大事件数
+            source_folder: 边扫描边处理的源文件夹（见process_all_files）
+
+        Returns:
+            事件异步迭代器
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        self._stream_events = events
+        self._stream_buffer = max(1, buffer_size)
+        # 收尾时的条目在线程池中登记，统一转到事件循环线程入队
+        self._result_sink = lambda item: loop.call_soon_threadsafe(
+            events.put_nowait, {"event": "item", "item": item})
+        task = asyncio.ensure_future(self.process_all_files_async(
+            classification_rules, max_concurrency=max_concurrency, dry_run=dry_run,
+            source_folder=source_folder))
+        task.add_done_callback(lambda _: loop.call_soon(events.put_nowait, None))
+        completed = False
+        try:
+            next_snapshot = loop.time() + snapshot_interval
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), max(0.0, next_snapshot - loop.time()))
+                except asyncio.TimeoutError:
+                    event = self.stream_snapshot()
+                if event is None:
+                    completed = True
+                    break
+                if event["event"] == "snapshot":
+                    next_snapshot = loop.time() + snapshot_interval
+                yield event
+        finally:
+            if not completed:
+                self.cancel()
+            self._stream_events = None
+            await asyncio.wait([task])
+            self._result_sink = None
+
+        result = dict(task.result())
+        result.pop("file_items", None)
+        yield self.stream_snapshot()
+        yield {"event": "done", "result": result}
@@ -0,0 +1,117 @@
+"""
+归档目录数据库查询基准
+在临时数据库中批量写入模拟条目，测量写入速度以及名称检索、部门统计和到期查询的耗时
+
+用法:
+    python benchmarks/catalog_queries.py                 # 默认100万条
+    python benchmarks/catalog_queries.py -n 3000000      # 指定条目数
+    python benchmarks/catalog_queries.py --budget-ms 50  # 任一查询超出预算时返回非零退出码
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Any, Iterator, List
+
+# 仓库根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from catalog import ArchiveCatalog, expires_at  # noqa: E402
+
+DEPARTMENTS = ("办公室", "财务部", "审计部", "人力资源部", "经营管理部", "安全生产部", "党群工作部", "信息中心")
+PERIODS = ("永久", "长期", "短期")
+WORDS = ("审计报告", "会议纪要", "通知", "合同", "请示", "批复", "工作总结", "预算", "培训记录", "检查表")
+
+
+def generate(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    生成模拟的目录记录
+
+    Args:
+        count: 条目数
+        seed: 随机种子
+
+    Returns:
+        目录记录迭代器
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    for i in range(count):
+        period = rng.choice(PERIODS)
+        department = rng.choice(DEPARTMENTS)
+        mtime = now - rng.uniform(0, 40 * 365 * 86400)
+        year = time.localtime(mtime).tm_year
+        name = f"{year}年{department}{rng.choice(WORDS)}_{i:07d}.pdf"
+        yield {
+            "name": name, "entry_type": "文件", "source_path": f"/共享/待分类/{name}",
+            "target_path": f"/共享/{period}/{department}/{name}", "period": period, "department": department,
+            "size": rng.randint(1_000, 10_000_000), "mtime": mtime, "hash": f"{i:032x}", "run_id": "benchmark",
+            "rules_version": None, "archived_at": now, "expires_at": expires_at(period, mtime)
+        }
+
+
+def measure(func: Callable[[], Any], runs: int) -> float:
+    """
+    多次执行查询并返回耗时中位数
+
+    Returns:
+        毫秒
+    """
+    timings: List[float] = []
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> int:
+    """运行基准"""
+    parser = argparse.ArgumentParser(description="归档目录数据库查询基准")
+    parser.add_argument("-n", "--count", type=int, default=1_000_000, help="模拟条目数")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="每个查询的测量次数（取中位数）")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每个写入事务包含的条目数")
+    parser.add_argument("--budget-ms", type=float, default=0, help="单个查询的耗时预算(毫秒)，0表示不检查")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    catalog = ArchiveCatalog(os.path.join(temp_dir, "catalog.db"), args.batch_size)
+    try:
+        start = time.perf_counter()
+        catalog.record(generate(args.count))
+        elapsed = time.perf_counter() - start
+        print(f"写入 {args.count:,} 条: {elapsed:.1f} 秒（{args.count / elapsed:,.0f} 条/秒，"
+              f"每事务 {args.batch_size} 条）")
+
+        queries = {
+            "名称检索“2022 审计报告”": lambda: catalog.search("2022 审计报告"),
+            "名称检索“_0012345”": lambda: catalog.search("_0012345"),
+            "按来源路径查询": lambda: catalog.find("/共享/待分类/不存在.pdf"),
+            "到期条目（前1000条）": lambda: catalog.expired(limit=1000),
+            "各部门条目数": lambda: catalog.department_counts(),
+            "短期各部门条目数": lambda: catalog.department_counts("短期"),
+        }
+        failed = False
+        print(f"\n查询耗时（{args.runs} 次中位数）:")
+        for label, query in queries.items():
+            median_ms = measure(query, args.runs)
+            over = args.budget_ms and median_ms > args.budget_ms
+            failed = failed or bool(over)
+            print(f"  {median_ms:9.2f} ms  {label}{'  ❌ 超出预算' if over else ''}")
+    finally:
+        catalog.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.budget_ms and not failed:
+        print("\n✅ 查询耗时检查通过")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
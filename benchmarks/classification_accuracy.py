@@ -0,0 +1,416 @@
+"""
+分类准确率基准
+用标注语料（benchmarks/gold_corpus.tsv，部门和保管期限取自默认分类规则）逐一运行APIService的各分类策略，
+比较准确率、吞吐（条目/秒）、P95延迟和每个条目的token用量；任一策略准确率低于下限时返回非零退出码
+
+后端:
+    offline  离线模拟模型（默认）：错误、置信度和延迟由模型名称和文件名的哈希确定，不访问网络，结果可复现
+    live     当前配置的服务商，可用--record保存每次响应
+    replay   回放--record保存的响应（按模型和文件名匹配），不访问网络
+
+用法:
+    python benchmarks/classification_accuracy.py                            # 离线模拟，所有策略
+    python benchmarks/classification_accuracy.py -s llm,similarity,rule      # 指定策略
+    python benchmarks/classification_accuracy.py --min-accuracy 0.9          # 所有策略使用统一的准确率下限
+    python benchmarks/classification_accuracy.py --backend live --small-model deepseek-chat --record rec.jsonl
+    python benchmarks/classification_accuracy.py --backend replay --recording rec.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Tuple
+
+# 仓库根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from loguru import logger  # noqa: E402
+from config import config_manager, APIConfig, ProviderProfile  # noqa: E402
+from api_service import APIService  # noqa: E402
+from compiled_rules import compile_rules  # noqa: E402
+from name_grouping import group_items  # noqa: E402
+from token_budget import token_budget  # noqa: E402
+
+# 标注语料：名称<TAB>条目类型<TAB>保管期限-部门，#开头为注释
+CORPUS_FILE = os.path.join(ROOT_DIR, "benchmarks", "gold_corpus.tsv")
+
+# 离线模拟的服务商配置名称和模型（错误率、平均延迟(秒)）
+OFFLINE_API_TYPE = "offline"
+OFFLINE_MODELS = {
+    "offline-large": {"error_rate": 0.06, "latency": 0.08},
+    "offline-small": {"error_rate": 0.18, "latency": 0.025},
+}
+
+# 从分类请求的提示词中取出文件名（与APIService._build_messages的措辞一致）
+_NAME_PATTERN = re.compile(r"名称'(.+?)'的保管期限")
+
+# 各策略共用的基准配置：关闭所有加速和降级手段，策略只打开自己的部分（None表示配置的默认值）
+NEUTRAL = {
+    "group_similar_names": False,
+    "similarity_cache_enabled": False,
+    "similarity_audit_rate": 0.0,
+    "coalesce_requests": False,
+    "escalation_threshold": 0.0,
+    "escalation_api_type": "",
+    "escalation_model": "",
+    "run_token_budget": 0,
+    "run_cost_budget": 0.0,
+    "budget_economy_ratio": None,
+    "budget_sample_size": None,
+    "rate_limit_rpm": 0,
+}
+
+# 策略：名称 → (说明, 配置覆盖, 使用的模型(primary/small), 离线模拟下的准确率下限)
+# 打开escalation_threshold的策略以primary模型复查
+STRATEGIES: Dict[str, Tuple[str, Dict[str, Any], str, float]] = {
+    "llm": ("仅大模型", {}, "primary", 0.88),
+    "small": ("小模型", {}, "small", 0.78),
+    "escalation": ("小模型+低置信度复查", {"escalation_threshold": 0.6}, "small", 0.95),
+    "similarity": ("相似度复用", {"similarity_cache_enabled": True, "similarity_audit_rate": 0.05}, "primary", 0.86),
+    "grouped": ("系列合并", {"group_similar_names": True}, "primary", 0.90),
+    "rule": ("规则引擎优先（节约模式）",
+             {"run_token_budget": 10 ** 12, "budget_economy_ratio": 0.0, "budget_sample_size": 1}, "primary", 0.94),
+    "default": ("默认配置", {key: None for key in NEUTRAL}, "primary", 0.90),
+}
+
+
+def load_corpus(path: str) -> List[SimpleNamespace]:
+    """
+    读取标注语料
+
+    Args:
+        path: 语料文件路径
+
+    Returns:
+        条目列表（name、entry_type、label）
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            name, entry_type, label = line.split("\t")
+            items.append(SimpleNamespace(name=name, entry_type=entry_type, label=label))
+    return items
+
+
+def normalize_label(label: str) -> str:
+    """去掉部门名称中括号内的别名（大模型常只返回主名称）"""
+    return re.sub(r"[（(][^）)]*[）)]", "", label).replace(" ", "")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数（最近秩法）"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def _unit(*parts: str) -> float:
+    """由字符串确定的[0, 1)伪随机数"""
+    digest = hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def _completion(content: str, confidence: Optional[float], prompt_tokens: int, completion_tokens: int):
+    """构造与OpenAI响应结构一致的对象"""
+    logprobs = SimpleNamespace(content=[SimpleNamespace(logprob=math.log(confidence))]) if confidence else None
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), logprobs=logprobs)],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    )
+
+
+def _request_name(messages: list) -> str:
+    """从请求消息中取出文件名"""
+    match = _NAME_PATTERN.search(messages[0]["content"])
+    if match is None:
+        raise ValueError("无法从请求中识别文件名")
+    return match.group(1)
+
+
+class _Client:
+    """OpenAI兼容客户端的最小接口（chat.completions.create、with_options）"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **options):
+        return self
+
+    def create(self, model: str, messages: list, **options):
+        raise NotImplementedError
+
+
+class OfflineClient(_Client):
+    """离线模拟模型：按语料标注作答，按模型的错误率给出错误答案并降低置信度"""
+
+    def __init__(self, corpus: List[SimpleNamespace], vocabulary: Dict[str, List[str]], latency_scale: float):
+        super().__init__()
+        self.labels = {item.name: item.label for item in corpus}
+        self.periods = vocabulary["periods"]
+        self.departments = vocabulary["departments"]
+        self.latency_scale = latency_scale
+
+    def _wrong_answer(self, label: str, seed: str) -> str:
+        """换成另一个保管期限或部门"""
+        period, department = label.split("-", 1)
+        if _unit(seed, "field") < 0.5:
+            choices = [p for p in self.periods if p != period]
+            period = choices[int(_unit(seed, "period") * len(choices))]
+        else:
+            choices = [d for d in self.departments if d != department]
+            department = choices[int(_unit(seed, "department") * len(choices))]
+        return f"{period}-{department}"
+
+    def create(self, model: str, messages: list, **options):
+        profile = OFFLINE_MODELS.get(model)
+        if profile is None:
+            raise ValueError(f"离线模拟没有模型: {model}（可用: {', '.join(OFFLINE_MODELS)}）")
+        name = _request_name(messages)
+        seed = f"{model}\0{name}"
+
+        answer = self.labels.get(name, f"短期-{self.departments[-1]}")
+        if _unit(seed, "error") < profile["error_rate"]:
+            answer = self._wrong_answer(answer, seed)
+            confidence = 0.3 + 0.35 * _unit(seed, "confidence")
+        else:
+            confidence = 0.85 + 0.14 * _unit(seed, "confidence")
+
+        # 延迟在均值的0.5~1.5倍之间，5%的请求为长尾
+        latency = profile["latency"] * (0.5 + _unit(seed, "latency"))
+        if _unit(seed, "tail") > 0.95:
+            latency *= 4
+        if self.latency_scale > 0:
+            time.sleep(latency * self.latency_scale)
+
+        prompt_tokens = sum(len(message["content"]) for message in messages) * 2 // 3
+        return _completion(answer, confidence if options.get("logprobs") else None,
+                           prompt_tokens, len(answer) * 2 // 3 + 1)
+
+
+class RecordingClient(_Client):
+    """包装真实客户端，记录每次响应供回放"""
+
+    def __init__(self, client, records: List[Dict[str, Any]], lock: threading.Lock):
+        super().__init__()
+        self.client = client
+        self.records = records
+        self.lock = lock
+
+    def with_options(self, **options):
+        return RecordingClient(self.client.with_options(**options), self.records, self.lock)
+
+    def create(self, model: str, messages: list, **options):
+        start = time.perf_counter()
+        completion = self.client.chat.completions.create(model=model, messages=messages, **options)
+        latency = time.perf_counter() - start
+
+        tokens = getattr(getattr(completion.choices[0], "logprobs", None), "content", None)
+        usage = getattr(completion, "usage", None)
+        record = {
+            "model": model,
+            "name": _request_name(messages),
+            "content": completion.choices[0].message.content,
+            "logprob": min(token.logprob for token in tokens) if tokens else None,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+            "completion_tokens": getattr(usage, "completion_tokens", 0),
+            "latency": latency
+        }
+        with self.lock:
+            self.records.append(record)
+        return completion
+
+
+class ReplayClient(_Client):
+    """回放录制的响应"""
+
+    def __init__(self, records: List[Dict[str, Any]], latency_scale: float):
+        super().__init__()
+        self.responses = {(record["model"], record["name"]): record for record in records}
+        self.latency_scale = latency_scale
+
+    def create(self, model: str, messages: list, **options):
+        name = _request_name(messages)
+        record = self.responses.get((model, name))
+        if record is None:
+            raise LookupError(f"录制中没有模型 {model} 对“{name}”的响应")
+        if self.latency_scale > 0:
+            time.sleep(record["latency"] * self.latency_scale)
+        confidence = math.exp(record["logprob"]) if record["logprob"] is not None and options.get("logprobs") else None
+        return _completion(record["content"], confidence, record["prompt_tokens"], record["completion_tokens"])
+
+
+def run_strategy(name: str, corpus: List[SimpleNamespace], classification_rules: str, api_config: APIConfig,
+                 models: Dict[str, str], client: Optional[_Client], concurrency: int,
+                 seed: int) -> Dict[str, Any]:
+    """
+    运行单个策略
+
+    Args:
+        name: 策略名称
+        corpus: 标注语料
+        classification_rules: 分类规则
+        api_config: 服务商配置（当前服务商的模型按策略替换）
+        models: primary/small对应的模型名称
+        client: 替换服务商客户端的模拟或回放客户端，None表示使用真实客户端
+        concurrency: 并发数
+        seed: 随机种子（相似度复用的抽样复核）
+
+    Returns:
+        准确率、吞吐、P95延迟和token用量
+    """
+    _, overrides, role, _ = STRATEGIES[name]
+    app_config = config_manager.load_config()
+    defaults = type(app_config)()
+    for key, value in {**NEUTRAL, **overrides}.items():
+        setattr(app_config, key, getattr(defaults, key) if value is None else value)
+    if overrides.get("escalation_threshold"):
+        app_config.escalation_model = models["primary"]
+
+    api_config = api_config.model_copy(deep=True)
+    profile = api_config.get_profile()
+    api_config.profiles[api_config.api_type] = profile.model_copy(update={"model": models[role]})
+    app_config.api_config = api_config
+    config_manager.save_config()
+
+    service = APIService()
+    service.update_config(api_config)
+    # 使用固定的截止时间，避免自适应截止时间把长尾请求转入隔离队列
+    service.set_request_deadline(app_config.timeout)
+    if client is not None:
+        service._clients[api_config.api_type] = client
+
+    random.seed(seed)
+    groups = group_items(corpus) if app_config.group_similar_names else [[item] for item in corpus]
+    token_budget.start(app_config, len(groups))
+
+    def classify(group: list) -> List[Tuple[bool, float]]:
+        start = time.perf_counter()
+        success, result, _ = service.classify_file(group[0].name, group[0].entry_type, classification_rules)
+        duration = time.perf_counter() - start
+        return [(success and normalize_label(result) == normalize_label(item.label), duration) for item in group]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = [outcome for outcomes in executor.map(classify, groups) for outcome in outcomes]
+    elapsed = time.perf_counter() - start
+
+    usage = token_budget.get_stats()
+    return {
+        "accuracy": sum(correct for correct, _ in outcomes) / len(outcomes),
+        "throughput": len(outcomes) / elapsed if elapsed else 0.0,
+        "p95": percentile([duration for _, duration in outcomes], 0.95),
+        "tokens_per_item": usage["total_tokens"] / len(outcomes),
+        "calls_per_item": usage["requests"] / len(outcomes)
+    }
+
+
+def main() -> int:
+    """运行基准"""
+    parser = argparse.ArgumentParser(description="分类准确率基准")
+    parser.add_argument("-s", "--strategies", default="", help=f"逗号分隔的策略（{', '.join(STRATEGIES)}），默认全部")
+    parser.add_argument("--backend", choices=("offline", "live", "replay"), default="offline", help="分类后端")
+    parser.add_argument("--model", default="", help="live/replay时的主模型，默认当前服务商配置的模型")
+    parser.add_argument("--small-model", default="", help="live/replay时的小模型，未指定时跳过使用小模型的策略")
+    parser.add_argument("--record", default="", help="live时把每次响应保存到此文件（JSON Lines）")
+    parser.add_argument("--recording", default="", help="replay时读取的录制文件")
+    parser.add_argument("--corpus", default=CORPUS_FILE, help="标注语料文件")
+    parser.add_argument("--rules", default="", help="分类规则文件，默认使用默认规则（语料按其标注）")
+    parser.add_argument("--min-accuracy", type=float, default=None,
+                        help="所有策略统一的准确率下限，默认使用各策略在离线模拟下的下限（live/replay时不检查）")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="模拟和回放延迟的倍数，0表示不等待")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="并发数")
+    parser.add_argument("--seed", type=int, default=49, help="随机种子")
+    args = parser.parse_args()
+
+    # 复核不一致、预算降级等警告是被测策略的正常行为，只输出错误
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    names = [name.strip() for name in args.strategies.split(",") if name.strip()] or list(STRATEGIES)
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        print(f"❌ 未知的策略: {', '.join(unknown)}（可用: {', '.join(STRATEGIES)}）")
+        return 1
+    if args.backend == "replay" and not args.recording:
+        print("❌ replay需要--recording指定录制文件")
+        return 1
+
+    corpus = load_corpus(args.corpus)
+    user_api_config = config_manager.load_config().api_config if args.backend != "offline" else None
+
+    # 各策略的配置写入临时目录，不修改程序目录中的配置
+    work_dir = tempfile.mkdtemp(prefix="accuracy_bench_")
+    config_manager.set_config_dir(work_dir)
+    records: List[Dict[str, Any]] = []
+    try:
+        if args.rules:
+            with open(args.rules, "r", encoding="utf-8") as f:
+                classification_rules = f.read().strip()
+        else:
+            classification_rules = config_manager.load_classification_rules()
+
+        if args.backend == "offline":
+            api_config = APIConfig(api_type=OFFLINE_API_TYPE, profiles={OFFLINE_API_TYPE: ProviderProfile(
+                name="离线模拟", base_url="http://127.0.0.1/offline", model="offline-large")})
+            models = {"primary": "offline-large", "small": "offline-small"}
+            client = OfflineClient(corpus, compile_rules(classification_rules).vocabulary, args.latency_scale)
+        else:
+            api_config = user_api_config
+            models = {"primary": args.model or api_config.get_profile().model, "small": args.small_model}
+            client = None
+            if args.backend == "replay":
+                with open(args.recording, "r", encoding="utf-8") as f:
+                    client = ReplayClient([json.loads(line) for line in f if line.strip()], args.latency_scale)
+            elif args.record:
+                service = APIService()
+                service.update_config(api_config)
+                client = RecordingClient(service._get_client(api_config.api_type), records, threading.Lock())
+
+        print(f"{len(corpus)} 个标注条目，后端 {args.backend}（主模型 {models['primary']}，"
+              f"小模型 {models['small'] or '未指定'}），并发 {args.concurrency}\n")
+        print(f"{'策略':<20}{'准确率':>8}{'条目/秒':>10}{'P95(毫秒)':>12}{'token/条目':>12}{'调用/条目':>10}")
+        failed = False
+        for name in names:
+            description, _, role, floor = STRATEGIES[name]
+            if not models[role]:
+                print(f"{description:<20}跳过（未指定--small-model）")
+                continue
+            stats = run_strategy(name, corpus, classification_rules, api_config, models, client,
+                                 args.concurrency, args.seed)
+            minimum = args.min_accuracy if args.min_accuracy is not None else (
+                floor if args.backend == "offline" else 0.0)
+            below = stats["accuracy"] < minimum
+            failed = failed or below
+            print(f"{description:<20}{stats['accuracy']:>8.1%}{stats['throughput']:>10.1f}"
+                  f"{stats['p95'] * 1000:>12.1f}{stats['tokens_per_item']:>12.1f}{stats['calls_per_item']:>10.2f}"
+                  f"{f'  ❌ 低于下限 {minimum:.0%}' if below else ''}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if records:
+        with open(args.record, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"\n已录制 {len(records)} 次响应: {args.record}")
+    if not failed:
+        print("\n✅ 准确率检查通过")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+启动导入耗时基准
+使用 python -X importtime 测量导入主程序模块的耗时，并检查启动阶段不应导入的重型依赖
+
+用法:
+    python benchmarks/import_time.py                     # 默认测量 main_optimized
+    python benchmarks/import_time.py -m run -n 5         # 测量其他模块，取5次中位数
+    python benchmarks/import_time.py --budget-ms 400     # 超出预算时返回非零退出码
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# 仓库根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动阶段不应导入的重型依赖（应在首次使用时再导入）
+DEFERRED_MODULES = ("openai", "numpy", "httpx")
+
+_LINE_PATTERN = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def measure_imports(module: str) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    """
+    在新进程中导入模块并解析 -X importtime 输出
+
+    Args:
+        module: 要导入的模块名
+
+    Returns:
+        (总耗时微秒, {模块名: (自身耗时微秒, 累计耗时微秒)})
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, encoding="utf-8", errors="replace"
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{completed.stderr}")
+
+    modules: Dict[str, Tuple[int, int]] = {}
+    total = 0
+    for line in completed.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        modules[name] = (self_us, cumulative_us)
+        # 缩进为一个空格的是顶层导入
+        if len(indent) <= 1:
+            total += cumulative_us
+    return total, modules
+
+
+def find_deferred(modules: Dict[str, Tuple[int, int]]) -> List[str]:
+    """
+    找出启动阶段被导入的重型依赖
+
+    Args:
+        modules: measure_imports返回的模块耗时
+
+    Returns:
+        被提前导入的依赖名称
+    """
+    return [name for name in DEFERRED_MODULES
+            if any(module == name or module.startswith(name + ".") for module in modules)]
+
+
+def main() -> int:
+    """运行基准"""
+    parser = argparse.ArgumentParser(description="启动导入耗时基准")
+    parser.add_argument("-m", "--module", default="main_optimized", help="要测量的模块")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="测量次数（取中位数）")
+    parser.add_argument("--top", type=int, default=15, help="显示累计耗时最高的模块数")
+    parser.add_argument("--budget-ms", type=float, default=0, help="导入耗时预算(毫秒)，0表示不检查")
+    args = parser.parse_args()
+
+    totals = []
+    modules: Dict[str, Tuple[int, int]] = {}
+    for _ in range(max(1, args.runs)):
+        total, modules = measure_imports(args.module)
+        totals.append(total)
+    median_ms = statistics.median(totals) / 1000
+
+    print(f"导入 {args.module}: 中位数 {median_ms:.1f} ms（{len(totals)} 次: "
+          f"{', '.join(f'{t / 1000:.1f}' for t in totals)}）")
+    print(f"\n累计耗时最高的 {args.top} 个模块:")
+    for name, (self_us, cumulative_us) in sorted(modules.items(), key=lambda item: item[1][1],
+                                                 reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (自身 {self_us / 1000:6.1f} ms)  {name}")
+
+    failed = False
+    deferred = find_deferred(modules)
+    if deferred:
+        print(f"\n❌ 启动阶段导入了应延迟加载的依赖: {', '.join(deferred)}")
+        failed = True
+    if args.budget_ms and median_ms > args.budget_ms:
+        print(f"\n❌ 导入耗时 {median_ms:.1f} ms 超出预算 {args.budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print("\n✅ 导入耗时检查通过")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+移动引擎基准
+在指定目录（可以是SMB/NFS挂载点）下的深层路径中创建模拟条目，
+分别用完整路径的shutil.move和目录句柄移动引擎移入各目标目录，比较每个条目的耗时
+
+用法:
+    python benchmarks/move_engine.py                        # 本地临时目录，2万个条目
+    python benchmarks/move_engine.py --root /mnt/nas/tmp    # 在网络文件系统上测量
+    python benchmarks/move_engine.py -n 5000 --depth 12 --targets 40
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+# 仓库根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from loguru import logger  # noqa: E402
+from move_engine import MoveEngine, SUPPORTS_DIR_FD  # noqa: E402
+
+
+def prepare(base: str, count: int, depth: int, targets: int) -> List[Tuple[str, str]]:
+    """
+    创建源条目和目标目录
+
+    Args:
+        base: 工作目录
+        count: 条目数
+        depth: 源文件夹的目录层级（模拟共享盘上的深层路径）
+        targets: 目标目录数
+
+    Returns:
+        (源路径, 目标路径)列表，按目标目录分组排列
+    """
+    source_folder = os.path.join(base, *[f"层级{level}" for level in range(depth)])
+    os.makedirs(source_folder, exist_ok=True)
+    target_dirs = [os.path.join(source_folder, "短期", f"部门{index}") for index in range(targets)]
+    for directory in target_dirs:
+        os.makedirs(directory, exist_ok=True)
+
+    moves = []
+    for index in range(count):
+        name = f"文件_{index:06d}.txt"
+        path = os.path.join(source_folder, name)
+        with open(path, "w") as f:
+            f.write("x")
+        moves.append((path, os.path.join(target_dirs[index % targets], name)))
+    moves.sort(key=lambda move: os.path.dirname(move[1]))
+    return moves
+
+
+def measure(base: str, args, move: Callable[[str, str], None], finish: Callable[[], None]) -> float:
+    """
+    执行一轮移动
+
+    Returns:
+        每个条目的耗时(微秒)
+    """
+    shutil.rmtree(base, ignore_errors=True)
+    moves = prepare(base, args.count, args.depth, args.targets)
+    start = time.perf_counter()
+    for source, target in moves:
+        move(source, target)
+    finish()
+    return (time.perf_counter() - start) / len(moves) * 1_000_000
+
+
+def main() -> int:
+    """运行基准"""
+    parser = argparse.ArgumentParser(description="移动引擎基准")
+    parser.add_argument("-n", "--count", type=int, default=20000, help="条目数")
+    parser.add_argument("--depth", type=int, default=8, help="源文件夹的目录层级")
+    parser.add_argument("--targets", type=int, default=20, help="目标目录数")
+    parser.add_argument("--root", default="", help="在此目录下测量（默认系统临时目录）")
+    parser.add_argument("-r", "--rounds", type=int, default=3, help="测量轮数（取最好成绩）")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    if not SUPPORTS_DIR_FD:
+        print("⚠️ 当前平台不支持dir_fd，移动引擎将回退到shutil.move")
+
+    work_dir = tempfile.mkdtemp(prefix="move_bench_", dir=args.root or None)
+    base = os.path.join(work_dir, "共享")
+    engine = MoveEngine()
+    try:
+        full_path = min(measure(base, args, shutil.move, lambda: None) for _ in range(args.rounds))
+        dir_fd = min(measure(base, args, engine.move, engine.close) for _ in range(args.rounds))
+    finally:
+        engine.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{args.count} 个条目，源路径 {args.depth} 层，{args.targets} 个目标目录（{args.rounds} 轮最好成绩）")
+    print(f"  shutil.move（完整路径）: {full_path:8.1f} 微秒/条目")
+    print(f"  目录句柄移动引擎:        {dir_fd:8.1f} 微秒/条目（{full_path / dir_fd:.2f}倍）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+服务商延迟与吞吐基准
+使用当前分类规则向各服务商配置发送相同的分类请求，比较单次请求延迟（P50/P95）和并发吞吐
+
+用法:
+    python benchmarks/provider_latency.py                         # 测量所有已配置密钥或本地的服务商
+    python benchmarks/provider_latency.py -p local,deepseek -n 50  # 指定服务商和请求数
+    python benchmarks/provider_latency.py -c 8                     # 并发数（本地CPU服务建议与其并行槽位数一致）
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+# 仓库根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from loguru import logger  # noqa: E402
+from config import config_manager  # noqa: E402
+from api_service import APIService  # noqa: E402
+
+# 模拟的待分类文件名
+SAMPLE_NAMES = (
+    "2023年度财务审计报告.pdf", "关于召开安全生产工作会议的通知.docx", "员工培训签到表_0315.xlsx",
+    "XX项目施工合同（盖章版）.pdf", "党支部换届选举请示.doc", "信息系统等保测评报告.pdf",
+    "办公用品采购清单.xlsx", "年度预算编制说明.docx", "劳动合同续签名单.xlsx", "会议纪要_第12期.docx",
+)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数（最近秩法）"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def run_profile(api_type: str, classification_rules: str, requests: int, concurrency: int,
+                warmup: int) -> Dict[str, Any]:
+    """
+    测量单个服务商
+
+    Args:
+        api_type: 服务商配置名称
+        classification_rules: 分类规则
+        requests: 请求数
+        concurrency: 并发数
+        warmup: 预热请求数（建立连接、加载模型，不计入结果）
+
+    Returns:
+        延迟和吞吐统计
+    """
+    service = APIService()
+    service.update_config(config_manager.load_config().api_config)
+    # 关闭自适应截止时间，避免超时条目影响延迟分布
+    service.set_request_deadline(config_manager.load_config().timeout)
+
+    def request(index: int):
+        start = time.perf_counter()
+        success, _, details = service._request_classification(
+            SAMPLE_NAMES[index % len(SAMPLE_NAMES)], "文件", classification_rules, api_type=api_type)
+        return success, time.perf_counter() - start, details.get("completion_tokens", 0)
+
+    for i in range(warmup):
+        request(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [duration for success, duration, _ in results if success]
+    completion_tokens = sum(tokens for success, _, tokens in results if success)
+    return {
+        "ok": len(latencies),
+        "failed": len(results) - len(latencies),
+        "p50": statistics.median(latencies) if latencies else None,
+        "p95": percentile(latencies, 0.95) if latencies else None,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "tokens_per_second": completion_tokens / elapsed if elapsed else 0.0
+    }
+
+
+def main() -> int:
+    """运行基准"""
+    parser = argparse.ArgumentParser(description="服务商延迟与吞吐基准")
+    parser.add_argument("-p", "--profiles", default="", help="逗号分隔的服务商配置名称，默认测量所有可用的")
+    parser.add_argument("-n", "--requests", type=int, default=20, help="每个服务商的请求数")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="并发数")
+    parser.add_argument("--warmup", type=int, default=2, help="预热请求数")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    api_config = config_manager.load_config().api_config
+    classification_rules = config_manager.load_classification_rules()
+
+    names = [name.strip() for name in args.profiles.split(",") if name.strip()] or [
+        name for name in api_config.profile_names()
+        if api_config.get_profile(name).api_key or api_config.get_profile(name).is_local
+    ]
+    if not names:
+        print("❌ 没有可测量的服务商（请配置API密钥或本地服务）")
+        return 1
+
+    print(f"每个服务商 {args.requests} 次请求，并发 {args.concurrency}，预热 {args.warmup} 次\n")
+    print(f"{'服务商':<12}{'模型':<28}{'成功':>6}{'失败':>6}{'P50(秒)':>10}{'P95(秒)':>10}"
+          f"{'请求/秒':>10}{'token/秒':>10}")
+    failed = False
+    for name in names:
+        profile = api_config.get_profile(name)
+        if profile is None:
+            print(f"{name:<12}未配置")
+            failed = True
+            continue
+        stats = run_profile(name, classification_rules, args.requests, args.concurrency, args.warmup)
+        failed = failed or stats["ok"] == 0
+        p50 = f"{stats['p50']:.2f}" if stats["p50"] is not None else "-"
+        p95 = f"{stats['p95']:.2f}" if stats["p95"] is not None else "-"
+        print(f"{name:<12}{profile.model:<28}{stats['ok']:>6}{stats['failed']:>6}{p50:>10}{p95:>10}"
+              f"{stats['throughput']:>10.2f}{stats['tokens_per_second']:>10.1f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
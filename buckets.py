@@ -0,0 +1,141 @@
+"""
+子目录分桶模块
+部门目录条目过多时，按文件名中的年份/年月（没有时取修改时间）或名称哈希前缀放入下一级子目录，
+使共享盘上单个目录的条目数保持在可浏览的范围内
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+# 分桶方式
+BUCKET_YEAR = "year"
+BUCKET_MONTH = "month"
+BUCKET_HASH = "hash"
+BUCKET_MODES = (BUCKET_YEAR, BUCKET_MONTH, BUCKET_HASH)
+
+# 文件名中的年份和可选的月份（2023年3月、2023-03-15、20230315等，前后不能紧接数字）
+_DATE_PATTERN = re.compile(
+    r"(?<!\d)((?:19|20)\d{2})(?:年|[-_.])?(?:(0?[1-9]|1[0-2])(?:月|[-_.]?(?:[0-2]\d|3[01]))?)?(?!\d)")
+
+# 分桶子目录名称（扫描归档目录时据此区分子目录和归档条目）
+_BUCKET_NAME_PATTERN = re.compile(r"^(?:(?:19|20)\d{2}年(?:\d{2}月)?|#[0-9a-f]{1,8})$")
+
+
+def parse_year_month(name: str) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    从文件名中解析年份和月份
+
+    Args:
+        name: 文件名
+
+    Returns:
+        (年份, 月份或None)，没有合理的年份时返回None
+    """
+    latest = time.localtime().tm_year + 1
+    for match in _DATE_PATTERN.finditer(name):
+        year = int(match.group(1))
+        if year <= latest:
+            return year, int(match.group(2)) if match.group(2) else None
+    return None
+
+
+def is_bucket_name(name: str) -> bool:
+    """判断目录名称是否为分桶子目录"""
+    return bool(_BUCKET_NAME_PATTERN.match(name))
+
+
+def bucket_name(mode: str, name: str, path: str, hash_chars: int = 2) -> Optional[str]:
+    """
+    计算条目所属的分桶子目录名称
+
+    Args:
+        mode: 分桶方式
+        name: 条目名称
+        path: 条目当前路径（文件名中没有日期时读取修改时间）
+        hash_chars: 哈希前缀的字符数
+
+    Returns:
+        子目录名称（如“2023年”、“2023年03月”、“#a7”），无法确定时返回None
+    """
+    if mode == BUCKET_HASH:
+        return "#" + hashlib.blake2b(name.encode("utf-8"), digest_size=4).hexdigest()[:hash_chars]
+
+    parsed = parse_year_month(name)
+    if parsed is None or (mode == BUCKET_MONTH and parsed[1] is None):
+        try:
+            mtime = time.localtime(os.stat(path).st_mtime)
+        except OSError:
+            return None
+        parsed = (mtime.tm_year, mtime.tm_mon)
+    year, month = parsed
+    return f"{year}年{month:02d}月" if mode == BUCKET_MONTH else f"{year}年"
+
+
+class BucketPlanner:
+    """计算条目在部门目录下的分桶子目录"""
+
+    def __init__(self, mode: str = "", threshold: int = 0, hash_chars: int = 2):
+        """
+        初始化分桶规划
+
+        Args:
+            mode: 分桶方式（year、month、hash），为空表示不分桶
+            threshold: 部门目录条目数达到此值后新条目才放入子目录，0表示始终分桶
+            hash_chars: 哈希前缀的字符数
+        """
+        if mode and mode not in BUCKET_MODES:
+            logger.warning(f"未知的分桶方式: {mode}（可用: {', '.join(BUCKET_MODES)}），不分桶")
+            mode = ""
+        self.mode = mode
+        self.threshold = threshold
+        self.hash_chars = hash_chars
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def touches_disk(self) -> bool:
+        """计算目标目录时是否可能读取磁盘（统计部门目录条目数或读取修改时间）"""
+        return bool(self.mode) and (bool(self.threshold) or self.mode != BUCKET_HASH)
+
+    def _reserve(self, directory: str) -> bool:
+        """
+        登记一个放入部门目录的条目
+
+        Returns:
+            部门目录是否已达到分桶阈值
+        """
+        with self._lock:
+            count = self._counts.get(directory)
+            if count is None:
+                # 每个部门目录只在首次使用时统计一次，之后按本次运行放入的条目累加
+                try:
+                    with os.scandir(directory) as entries:
+                        count = sum(1 for _ in entries)
+                except OSError:
+                    count = 0
+            self._counts[directory] = count + 1
+            return count >= self.threshold
+
+    def target_dir(self, directory: str, name: str, path: str) -> str:
+        """
+        计算条目的目标目录
+
+        Args:
+            directory: 部门目录
+            name: 条目名称
+            path: 条目当前路径
+
+        Returns:
+            目标目录（部门目录或其下的分桶子目录）
+        """
+        if not self.mode:
+            return directory
+        if self.threshold and not self._reserve(directory):
+            return directory
+        bucket = bucket_name(self.mode, name, path, self.hash_chars)
+        return os.path.join(directory, bucket) if bucket else directory
@@ -0,0 +1,352 @@
+"""
+归档目录数据库模块
+在本地SQLite数据库中记录每个已归档条目的来源、去向、保管期限、部门、大小、修改时间和内容摘要，
+按名称全文检索、按部门统计和查询到期条目都不再需要遍历共享目录
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable
+from loguru import logger
+from scheduler import folder_size
+
+# 数据库结构版本
+SCHEMA_VERSION = 1
+
+# 保管期限对应的保管年限（永久不到期）
+RETENTION_YEARS = {"长期": 30, "短期": 10}
+
+# 计算内容摘要时从文件头尾各读取的字节数
+HASH_SAMPLE_BYTES = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    entry_type TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    target_path TEXT NOT NULL UNIQUE,
+    period TEXT NOT NULL,
+    department TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT,
+    run_id TEXT,
+    rules_version TEXT,
+    archived_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS department_counts (
+    period TEXT NOT NULL,
+    department TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (period, department)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_source ON entries(source_path);
+CREATE INDEX IF NOT EXISTS idx_entries_expires ON entries(expires_at) WHERE expires_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_entries_run ON entries(run_id);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, name) VALUES (new.id, new.name);
+    INSERT INTO department_counts VALUES (new.period, new.department, 1)
+        ON CONFLICT(period, department) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    UPDATE department_counts SET count = count - 1 WHERE period = old.period AND department = old.department;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_au_department AFTER UPDATE OF period, department ON entries BEGIN
+    UPDATE department_counts SET count = count - 1 WHERE period = old.period AND department = old.department;
+    INSERT INTO department_counts VALUES (new.period, new.department, 1)
+        ON CONFLICT(period, department) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE OF name ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO entries_fts(rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+_COLUMNS = ("name", "entry_type", "source_path", "target_path", "period", "department", "size", "mtime",
+            "hash", "run_id", "rules_version", "archived_at", "expires_at")
+
+
+def new_run_id() -> str:
+    """生成运行编号（时间戳加随机后缀）"""
+    return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def expires_at(period: str, mtime: Optional[float]) -> Optional[float]:
+    """
+    计算到期时间（保管期限从形成年度的次年1月1日起算）
+
+    Args:
+        period: 保管期限
+        mtime: 修改时间（作为形成时间）
+
+    Returns:
+        到期时间戳，永久保管或未知时返回None
+    """
+    years = RETENTION_YEARS.get(period)
+    if years is None or mtime is None:
+        return None
+    return datetime(datetime.fromtimestamp(mtime).year + 1 + years, 1, 1).timestamp()
+
+
+def quick_hash(path: str) -> Optional[str]:
+    """
+    计算文件的内容摘要（大小加头尾各64KB，避免在共享目录上读取整个大文件）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        十六进制摘要，读取失败时返回None
+    """
+    try:
+        size = os.path.getsize(path)
+        digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+        with open(path, "rb") as f:
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+            if size > HASH_SAMPLE_BYTES * 2:
+                f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+
+def _escape_like(term: str) -> str:
+    """转义LIKE模式中的通配符"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ArchiveCatalog:
+    """归档目录数据库"""
+
+    def __init__(self, db_path: str, batch_size: int = 1000):
+        """
+        初始化目录数据库（首次使用时创建）
+
+        Args:
+            db_path: 数据库文件路径（应位于本地磁盘，WAL模式不支持网络共享目录）
+            batch_size: 每个写入事务包含的条目数
+        """
+        self.db_path = str(db_path)
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # 分词器不支持trigram时（SQLite早于3.34）名称检索退化为LIKE
+        self.trigram = True
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接并建立表结构（调用方持有锁）"""
+        if self._conn is not None:
+            return self._conn
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+
+        with conn:
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+                             "name, content='entries', content_rowid='id', tokenize='trigram')")
+            except sqlite3.OperationalError:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+                             "name, content='entries', content_rowid='id')")
+            sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'entries_fts'").fetchone()[0]
+            self.trigram = "trigram" in sql
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+        self._conn = conn
+        return conn
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def describe(item, run_id: str, content_hash: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        读取已归档条目的元数据
+
+        Args:
+            item: 已完成移动的文件项
+            run_id: 运行编号
+            content_hash: 是否计算文件内容摘要（读取头尾各64KB）
+
+        Returns:
+            目录记录，分类结果格式不正确时返回None
+        """
+        if "-" not in (item.classification_result or ""):
+            return None
+        period, department = item.classification_result.split("-", 1)
+        try:
+            stat = os.stat(item.target_path)
+            mtime = stat.st_mtime
+            if item.entry_type != "文件夹":
+                size = stat.st_size
+            else:
+                # 排序时已统计过的文件夹大小直接复用，不再遍历
+                size = getattr(item, "size", None)
+                if size is None:
+                    size = folder_size(item.target_path)
+        except OSError:
+            mtime, size = None, None
+
+        return {
+            "name": item.name,
+            "entry_type": item.entry_type,
+            "source_path": item.path,
+            "target_path": item.target_path,
+            "period": period,
+            "department": department,
+            "size": size,
+            "mtime": mtime,
+            "hash": quick_hash(item.target_path) if content_hash and item.entry_type == "文件" else None,
+            "run_id": run_id,
+            "rules_version": item.rules_version,
+            "archived_at": time.time(),
+            "expires_at": expires_at(period, mtime)
+        }
+
+    def record(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        批量写入目录记录（每batch_size条一个事务）
+
+        重新分类移动的条目沿用原记录的来源路径，并删除原位置的记录。
+
+        Args:
+            records: describe生成的目录记录
+
+        Returns:
+            写入的条目数
+        """
+        insert_sql = (f"INSERT INTO entries ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+                      f"ON CONFLICT(target_path) DO UPDATE SET "
+                      f"{', '.join(f'{column} = excluded.{column}' for column in _COLUMNS if column != 'target_path')}")
+        written = 0
+        batch: List[Dict[str, Any]] = []
+
+        def flush():
+            with conn:
+                for record in batch:
+                    if record["source_path"] != record["target_path"]:
+                        previous = conn.execute("SELECT source_path FROM entries WHERE target_path = ?",
+                                                (record["source_path"],)).fetchone()
+                        if previous is not None:
+                            conn.execute("DELETE FROM entries WHERE target_path = ?", (record["source_path"],))
+                            record = dict(record, source_path=previous["source_path"])
+                    conn.execute(insert_sql, [record[column] for column in _COLUMNS])
+
+        with self._lock:
+            conn = self._connect()
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    flush()
+                    written += len(batch)
+                    batch.clear()
+            if batch:
+                flush()
+                written += len(batch)
+        logger.info(f"已写入归档目录数据库: {written} 个条目")
+        return written
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        """执行查询"""
+        with self._lock:
+            return self._connect().execute(sql, tuple(params)).fetchall()
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        按名称检索条目（空格分隔的多个关键词需同时匹配）
+
+        三个字符及以上的关键词使用全文索引；更短的关键词只在其他关键词命中的条目中筛选，
+        全部关键词都很短时退化为逐行匹配。
+
+        Args:
+            query: 关键词，例如“2022 审计报告”
+            limit: 最多返回的条目数
+
+        Returns:
+            匹配的目录记录（最近归档的在前）
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        indexed = [term for term in terms if len(term) >= 3] if self.trigram else []
+        clauses, params = [], []
+        if indexed:
+            clauses.append("id IN (SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?)")
+            params.append(" AND ".join('"' + term.replace('"', '""') + '"' for term in indexed))
+        for term in terms:
+            if term not in indexed:
+                clauses.append("name LIKE ? ESCAPE '\\'")
+                params.append(f"%{_escape_like(term)}%")
+        params.append(limit)
+        rows = self._query(f"SELECT * FROM entries WHERE {' AND '.join(clauses)} "
+                           f"ORDER BY archived_at DESC LIMIT ?", params)
+        return [dict(row) for row in rows]
+
+    def find(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        按来源路径或归档路径查询条目
+
+        Args:
+            path: 条目路径
+
+        Returns:
+            目录记录，不存在时返回None
+        """
+        rows = self._query("SELECT * FROM entries WHERE target_path = ? UNION ALL "
+                           "SELECT * FROM entries WHERE source_path = ? LIMIT 1", (path, path))
+        return dict(rows[0]) if rows else None
+
+    def department_counts(self, period: Optional[str] = None) -> Dict[str, int]:
+        """
+        按部门统计条目数（读取写入时由触发器维护的计数表，与条目总数无关）
+
+        Args:
+            period: 只统计某个保管期限，None表示全部
+
+        Returns:
+            {部门: 条目数}
+        """
+        if period:
+            rows = self._query("SELECT department, SUM(count) AS count FROM department_counts WHERE period = ? "
+                               "GROUP BY department", (period,))
+        else:
+            rows = self._query("SELECT department, SUM(count) AS count FROM department_counts GROUP BY department")
+        return {row["department"]: row["count"] for row in rows if row["count"] > 0}
+
+    def expired(self, as_of: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        查询保管期限已到期的条目
+
+        Args:
+            as_of: 截止时间戳，默认当前时间
+            limit: 最多返回的条目数，None表示不限
+
+        Returns:
+            到期的目录记录（最早到期的在前）
+        """
+        as_of = time.time() if as_of is None else as_of
+        rows = self._query("SELECT * FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ? "
+                           "ORDER BY expires_at LIMIT ?", (as_of, -1 if limit is None else limit))
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        """获取条目总数"""
+        return self._query("SELECT COUNT(*) AS count FROM entries")[0]["count"]
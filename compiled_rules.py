@@ -0,0 +1,361 @@
+"""
+规则编译模块
+将分类规则文本解析为带内容哈希的编译结果，并在规则文件变化时热更新
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+from loguru import logger
+
+
+# 部门规则：含A、B、C等关键词或相关内容的归X部门
+_DEPARTMENT_PATTERN = re.compile(r"含(?P<keywords>.+?)等关键词(?:或相关内容)?的?归(?P<department>.+)")
+# 保管期限规则：满足A、B等条件的永久/30年/10年保管
+_PERIOD_PATTERN = re.compile(r"满足(?P<keywords>.+?)等条件的?(?P<period>永久|\d+\s*年)保管")
+# 兜底部门：未命中部门专属关键词……的归X
+_FALLBACK_PATTERN = re.compile(r"未命中.*?的?归(?P<department>.+)")
+
+# 保管期限优先级：优先匹配永久，其次长期，最后短期
+PERIOD_ORDER = {"永久": 0, "长期": 1, "短期": 2}
+
+
+def rules_hash(classification_rules: str) -> str:
+    """
+    计算分类规则的内容哈希（规则版本标识）
+
+    Args:
+        classification_rules: 分类规则文本
+
+    Returns:
+        16位十六进制哈希
+    """
+    return hashlib.sha1(classification_rules.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_period(period: str) -> str:
+    """
+    将规则中的保管期限转换为目录名称
+
+    Args:
+        period: 规则中的保管期限（永久、30年、10年等）
+
+    Returns:
+        永久、长期或短期
+    """
+    if "永久" in period:
+        return "永久"
+    years = re.search(r"\d+", period)
+    if years and int(years.group()) >= 30:
+        return "长期"
+    return "短期"
+
+
+def _split_keywords(text: str) -> List[str]:
+    """拆分顿号分隔的关键词"""
+    text = re.sub(r"^(文件内容或标题)?(含|满足)", "", text.strip())
+    return [keyword.strip() for keyword in re.split(r"[、,，/]", text) if keyword.strip()]
+
+
+def _keyword_pattern(keywords: List[str]) -> Optional["re.Pattern"]:
+    """将关键词编译为一个正则（长关键词优先）"""
+    if not keywords:
+        return None
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    return re.compile("|".join(re.escape(keyword) for keyword in ordered), re.IGNORECASE)
+
+
+class CompiledRules:
+    """编译后的分类规则"""
+
+    def __init__(self, text: str):
+        """
+        解析分类规则
+
+        Args:
+            text: 分类规则文本
+        """
+        self.text = text
+        self.hash = rules_hash(text)
+        self.departments: List[Tuple[str, List[str]]] = []
+        self.periods: List[Tuple[str, List[str]]] = []
+        self.fallback_department: Optional[str] = None
+
+        for clause in re.split(r"[；;。\n]", text):
+            clause = clause.strip()
+            if not clause:
+                continue
+
+            fallback = _FALLBACK_PATTERN.search(clause)
+            if fallback:
+                self.fallback_department = fallback.group("department").strip()
+                continue
+
+            match = _DEPARTMENT_PATTERN.search(clause)
+            if match:
+                self.departments.append((match.group("department").strip(),
+                                         _split_keywords(match.group("keywords"))))
+                continue
+
+            for match in _PERIOD_PATTERN.finditer(clause):
+                self.periods.append((normalize_period(match.group("period")),
+                                     _split_keywords(match.group("keywords"))))
+
+        self.periods.sort(key=lambda item: PERIOD_ORDER[item[0]])
+
+        # 关键词索引：关键词(小写) → 部门/保管期限
+        self.department_keywords: Dict[str, str] = {}
+        for department, keywords in self.departments:
+            for keyword in keywords:
+                self.department_keywords.setdefault(keyword.lower(), department)
+        self.period_keywords: Dict[str, str] = {}
+        for period, keywords in self.periods:
+            for keyword in keywords:
+                self.period_keywords.setdefault(keyword.lower(), period)
+
+        self.department_pattern = _keyword_pattern(list(self.department_keywords))
+        self.period_pattern = _keyword_pattern(list(self.period_keywords))
+
+        # 提示词前缀按条目类型缓存，避免每次请求重新拼接整段规则
+        self._prompt_prefixes: Dict[str, str] = {}
+
+    @property
+    def vocabulary(self) -> Dict[str, List[str]]:
+        """规则中出现的部门和保管期限"""
+        departments = [department for department, _ in self.departments]
+        if self.fallback_department:
+            departments.append(self.fallback_department)
+        return {
+            "departments": departments,
+            "periods": sorted({period for period, _ in self.periods}, key=PERIOD_ORDER.get)
+        }
+
+    @property
+    def problems(self) -> List[str]:
+        """规则中可能存在的问题（为空表示未发现问题）"""
+        problems = []
+        if not self.text.strip():
+            problems.append("分类规则为空")
+        if not self.departments:
+            problems.append("未识别到“含……等关键词的归……”格式的部门规则，本地规则引擎将不参与判断")
+        if not self.periods:
+            problems.append("未识别到“满足……等条件的……保管”格式的保管期限规则")
+        return problems
+
+    def prompt_prefix(self, entry_type: str) -> str:
+        """
+        获取系统提示词中与文件名无关的部分
+
+        Args:
+            entry_type: 条目类型（文件/文件夹）
+
+        Returns:
+            提示词前缀
+        """
+        prefix = self._prompt_prefixes.get(entry_type)
+        if prefix is None:
+            prefix = (f"你是文件分类助手，需严格根据以下规则判断{entry_type}的保管期限和所属部门：\n"
+                      f"----- 分类规则 -----\n"
+                      f"{self.text}\n")
+            self._prompt_prefixes[entry_type] = prefix
+        return prefix
+
+
+_compiled_cache: Dict[str, CompiledRules] = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_rules(classification_rules: str) -> CompiledRules:
+    """
+    编译分类规则（按内容哈希缓存）
+
+    Args:
+        classification_rules: 分类规则文本
+
+    Returns:
+        编译后的分类规则
+    """
+    key = rules_hash(classification_rules)
+    with _compiled_lock:
+        compiled = _compiled_cache.get(key)
+        if compiled is None:
+            compiled = CompiledRules(classification_rules)
+            # 规则版本通常很少，只保留最近的若干个
+            if len(_compiled_cache) >= 16:
+                _compiled_cache.pop(next(iter(_compiled_cache)))
+            _compiled_cache[key] = compiled
+        return compiled
+
+
+class RulesWatcher:
+    """规则文件监视器（文件变化时重新编译）"""
+
+    def __init__(self, rules_file, classification_rules: str, check_interval: float = 1.0):
+        """
+        初始化规则文件监视器
+
+        Args:
+            rules_file: 规则文件路径
+            classification_rules: 当前使用的分类规则
+            check_interval: 检查文件变化的最小间隔(秒)
+        """
+        self.rules_file = str(rules_file)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._current = compile_rules(classification_rules)
+        self._signature = self._stat()
+        self._last_check = time.monotonic()
+        self.reload_count = 0
+
+    def _stat(self) -> Optional[Tuple[float, int]]:
+        """获取规则文件的修改时间和大小"""
+        try:
+            stat = os.stat(self.rules_file)
+            return stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+
+    def current(self) -> CompiledRules:
+        """
+        获取当前规则（规则文件变化时重新加载）
+
+        Returns:
+            编译后的分类规则
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_check < self.check_interval:
+                return self._current
+            self._last_check = now
+
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return self._current
+            self._signature = signature
+
+            try:
+                with open(self.rules_file, "r", encoding="utf-8") as f:
+                    text = f.read().strip()
+            except OSError as e:
+                logger.warning(f"读取规则文件失败，继续使用当前规则: {e}")
+                return self._current
+
+            compiled = compile_rules(text)
+            if not text or compiled.hash == self._current.hash:
+                return self._current
+
+            for problem in compiled.problems:
+                logger.warning(f"新规则: {problem}")
+            logger.info(f"分类规则已热更新: {self._current.hash} → {compiled.hash}，"
+                        f"进行中的条目仍按原规则完成")
+            self._current = compiled
+            self.reload_count += 1
+            return self._current
+
+
+class RulesDiff:
+    """两个规则版本之间的差异"""
+
+    def __init__(self, old: CompiledRules, new: CompiledRules):
+        """
+        比较两个规则版本
+
+        Args:
+            old: 旧规则
+            new: 新规则
+        """
+        self.old_hash = old.hash
+        self.new_hash = new.hash
+
+        old_departments = set(old.vocabulary["departments"])
+        self.new_departments = set(new.vocabulary["departments"])
+        self.removed_departments = old_departments - self.new_departments
+        self.added_departments = self.new_departments - old_departments
+
+        # 归属发生变化（新增、删除或改归其他部门/期限）的关键词
+        old_pairs = set(old.department_keywords.items()) | set(old.period_keywords.items())
+        new_pairs = set(new.department_keywords.items()) | set(new.period_keywords.items())
+        self.changed_keywords = {keyword for keyword, _ in old_pairs ^ new_pairs}
+
+        # 结构化内容相同但文本不同（例如只改了措辞），无法判断影响范围
+        self.text_only = (old.hash != new.hash and not self.removed_departments
+                          and not self.added_departments and not self.changed_keywords)
+
+    @property
+    def changed(self) -> bool:
+        """规则是否有变化"""
+        return self.old_hash != self.new_hash
+
+    def affects(self, name: str, department: str) -> bool:
+        """
+        判断已归档条目是否受规则变化影响
+
+        Args:
+            name: 文件名
+            department: 当前所在部门
+
+        Returns:
+            是否需要重新分类
+        """
+        if not self.changed:
+            return False
+        if department in self.removed_departments or department not in self.new_departments:
+            return True
+        if self.text_only:
+            # 只改了措辞：部门和关键词归属都没有变化，不重新分类
+            return False
+        lowered = name.lower()
+        return any(keyword in lowered for keyword in self.changed_keywords)
+
+
+class RulesHistory:
+    """规则版本历史（按内容哈希保存每个用过的规则版本）"""
+
+    def __init__(self, directory):
+        """
+        初始化规则版本历史
+
+        Args:
+            directory: 保存目录
+        """
+        self.directory = str(directory)
+
+    def save(self, classification_rules: str) -> str:
+        """
+        保存规则版本（已保存的版本不重复写入）
+
+        Args:
+            classification_rules: 分类规则文本
+
+        Returns:
+            规则版本哈希
+        """
+        version = rules_hash(classification_rules)
+        path = os.path.join(self.directory, f"{version}.txt")
+        if not os.path.exists(path):
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(classification_rules)
+            except OSError as e:
+                logger.warning(f"保存规则版本失败: {version}, 错误: {e}")
+        return version
+
+    def load(self, version: str) -> Optional[str]:
+        """
+        读取规则版本
+
+        Args:
+            version: 规则版本哈希
+
+        Returns:
+            分类规则文本，不存在时返回None
+        """
+        try:
+            with open(os.path.join(self.directory, f"{version}.txt"), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
@@ -5,16 +5,74 @@
 
 import os
 import json
-from typing import Optional
+from typing import Optional, List, Dict
+from urllib.parse import urlparse
 from pydantic import BaseModel, Field
 from pathlib import Path
 
+# 本地服务的主机名（不经过代理，无需密钥）
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "0.0.0.0")
+
+
+class ProviderProfile(BaseModel):
+    """服务商配置（任意OpenAI兼容接口）"""
+    name: str = Field(default="", description="显示名称")
+    base_url: str = Field(description="接口地址，例如 http://127.0.0.1:11434/v1")
+    model: str = Field(description="模型名称")
+    api_key: str = Field(default="", description="API密钥，豆包/DeepSeek留空时使用旧版密钥字段，本地服务可留空")
+    
+    @property
+    def is_local(self) -> bool:
+        """是否为本机服务（llama.cpp、Ollama等）"""
+        return (urlparse(self.base_url).hostname or "") in LOCAL_HOSTS
+
+
+# 内置服务商配置，配置文件中同名的配置会覆盖
+DEFAULT_PROFILES: Dict[str, ProviderProfile] = {
+    "doubao": ProviderProfile(name="豆包API", base_url="https://ark.cn-beijing.volces.com/api/v3",
+                              model="doubao-pro-32k-241215"),
+    "deepseek": ProviderProfile(name="DeepSeek API", base_url="https://api.deepseek.com", model="deepseek-chat"),
+    "local": ProviderProfile(name="本地模型（Ollama/llama.cpp）", base_url="http://127.0.0.1:11434/v1",
+                             model="qwen2.5:7b-instruct")
+}
+
 
 class APIConfig(BaseModel):
     """API配置模型"""
     doubao_api_key: str = Field(default="", description="豆包API密钥")
     deepseek_api_key: str = Field(default="", description="DeepSeek API密钥")
-    api_type: str = Field(default="doubao", description="当前使用的API类型")
+    api_type: str = Field(default="doubao", description="当前使用的API类型（服务商配置名称）")
+    profiles: Dict[str, ProviderProfile] = Field(
+        default_factory=lambda: {name: profile.model_copy() for name, profile in DEFAULT_PROFILES.items()},
+        description="服务商配置：名称 → 接口地址、模型和密钥"
+    )
+    
+    def get_profile(self, api_type: Optional[str] = None) -> Optional[ProviderProfile]:
+        """
+        获取服务商配置
+        
+        Args:
+            api_type: 服务商配置名称，默认为当前使用的API类型
+            
+        Returns:
+            服务商配置（已填入密钥），未配置时返回None
+        """
+        api_type = api_type or self.api_type
+        profile = self.profiles.get(api_type) or DEFAULT_PROFILES.get(api_type)
+        if profile is None:
+            return None
+        if not profile.api_key and getattr(self, f"{api_type}_api_key", ""):
+            profile = profile.model_copy(update={"api_key": getattr(self, f"{api_type}_api_key")})
+        return profile
+    
+    def profile_names(self) -> List[str]:
+        """获取所有服务商配置名称（内置的在前）"""
+        return list(DEFAULT_PROFILES) + [name for name in self.profiles if name not in DEFAULT_PROFILES]
+    
+    def has_credentials(self) -> bool:
+        """当前服务商是否可用（已配置密钥或为本地服务）"""
+        profile = self.get_profile()
+        return profile is not None and (bool(profile.api_key) or profile.is_local)
 
 
 class AppConfig(BaseModel):
@@ -25,6 +83,52 @@ class AppConfig(BaseModel):
     log_level: str = Field(default="INFO", description="日志级别")
     max_retries: int = Field(default=3, description="API调用最大重试次数")
     timeout: int = Field(default=30, description="API调用超时时间(秒)")
+    adaptive_timeout: bool = Field(default=True, description="按近期请求耗时分位数设置单次请求的截止时间")
+    deadline_percentile: float = Field(default=0.95, gt=0.0, le=1.0, description="计算截止时间使用的耗时分位数")
+    deadline_multiplier: float = Field(default=3.0, ge=1.0, description="截止时间为分位数耗时的倍数")
+    min_deadline: float = Field(default=5.0, gt=0.0, description="单次请求截止时间的下限(秒)")
+    deadline_min_samples: int = Field(default=20, ge=1, description="收集到多少次请求耗时后启用自适应截止时间")
+    preflight_connections: int = Field(default=4, ge=0, description="运行前向每个服务商并行预热的连接数（同时测量基线延迟、检查密钥和模型），0表示不预检")
+    quarantine_workers: int = Field(default=1, ge=1, description="运行末尾重试超时条目的并发数")
+    http_connect_timeout: float = Field(default=10.0, description="建立连接超时时间(秒)")
+    http_max_connections: int = Field(default=32, ge=1, description="共享连接池的最大连接数，应不小于并发数")
+    http_keepalive_connections: int = Field(default=32, ge=0, description="连接池保持的空闲连接数")
+    http_keepalive_expiry: float = Field(default=60.0, description="空闲连接保持时间(秒)")
+    http2: bool = Field(default=True, description="服务商支持且已安装h2时使用HTTP/2")
+    max_workers: int = Field(default=4, description="并发处理的最大条目数")
+    async_concurrency: int = Field(default=64, ge=1, description="异步处理时同时进行的最大条目数")
+    io_workers: int = Field(default=8, ge=1, description="异步处理时执行文件系统操作的线程数")
+    rate_limit_rpm: int = Field(default=0, ge=0, description="全局API调用限速(次/分钟)，0表示不限速")
+    shard_workers: int = Field(default=0, ge=0, description="分片处理的进程数，0或1表示单进程")
+    shard_by: str = Field(default="hash", description="分片方式：hash(按名称主干哈希)或size(按组大小均衡)")
+    priority_keys: List[str] = Field(default_factory=list, description="处理顺序的优先级键，如[\"pattern:*紧急*\", \"mtime\", \"-size\"]，为空时按文件夹列表顺序")
+    group_similar_names: bool = Field(default=True, description="是否合并名称主干相同的系列文件，只分类一次")
+    stream_batch_size: int = Field(default=1000, ge=1, description="边扫描边处理时每批的条目数（按批分组、排序并写入归档记录，内存占用与文件夹大小无关）")
+    similarity_cache_enabled: bool = Field(default=True, description="是否复用近重复文件名的分类结果")
+    similarity_threshold: float = Field(default=0.92, ge=0.0, le=1.0, description="复用分类结果的最低相似度")
+    similarity_audit_rate: float = Field(default=0.05, ge=0.0, le=1.0, description="相似度复用的抽样复核比例")
+    coalesce_requests: bool = Field(default=True, description="相同名称的并发请求只调用一次大模型，其余等待并共享结果")
+    confidence_logprobs: bool = Field(default=True, description="请求logprobs计算置信度（服务商不支持时自动关闭）")
+    escalation_threshold: float = Field(default=0.6, ge=0.0, le=1.0, description="置信度低于此值时请求第二意见，0表示不复查")
+    escalation_api_type: str = Field(default="", description="第二意见使用的API类型，留空表示同一服务商重新请求")
+    escalation_model: str = Field(default="", description="第二意见使用的模型名称，留空表示该服务商的默认模型")
+    rules_hot_reload: bool = Field(default=True, description="运行期间规则文件修改后，新领取的条目立即使用新规则")
+    bucket_by: str = Field(default="", description="部门目录下的分桶子目录：year(按年份)、month(按年月)、hash(按名称哈希前缀)，为空不分桶")
+    bucket_threshold: int = Field(default=0, ge=0, description="部门目录条目数达到此值后新条目才放入分桶子目录，0表示始终分桶")
+    bucket_hash_chars: int = Field(default=2, ge=1, le=8, description="按哈希分桶时子目录名称的前缀字符数（2个字符为256个子目录）")
+    dir_fd_moves: bool = Field(default=True, description="移动时缓存源目录和目标目录的句柄，只按名称重命名（不支持的平台自动回退）")
+    catalog_enabled: bool = Field(default=True, description="是否将已归档条目写入本地目录数据库（catalog.db），供检索和统计")
+    catalog_content_hash: bool = Field(default=False, description="写入目录数据库时是否计算文件内容摘要（每个文件读取头尾各64KB，共享盘上较慢）")
+    catalog_batch_size: int = Field(default=1000, ge=1, description="写入目录数据库时每个事务包含的条目数")
+    run_token_budget: int = Field(default=0, ge=0, description="每次运行的token上限，0表示不限")
+    run_cost_budget: float = Field(default=0.0, ge=0.0, description="每次运行的费用上限(元)，0表示不限")
+    prompt_price_per_million: float = Field(default=0.8, ge=0.0, description="输入token单价(元/百万token)")
+    completion_price_per_million: float = Field(default=2.0, ge=0.0, description="输出token单价(元/百万token)")
+    budget_economy_ratio: float = Field(default=0.8, ge=0.0, le=1.0, description="预算用量达到此比例后改用节约模式")
+    budget_sample_size: int = Field(default=20, ge=1, description="按前N次请求的用量估算整次运行的费用")
+    ui_refresh_fps: int = Field(default=20, description="进度界面刷新帧率(次/秒)")
+    event_batch_interval: float = Field(default=0.25, gt=0.0, description="事件订阅者批量接收事件的默认间隔(秒)")
+    file_list_page_size: int = Field(default=500, description="文件列表最多同时渲染的行数（只渲染可见部分）")
 
 
 class ConfigManager:
@@ -37,19 +141,24 @@ class ConfigManager:
         Args:
             config_dir: 配置文件目录，默认为程序所在目录
         """
-        self.config_dir = Path(config_dir) if config_dir else Path(__file__).parent
-        self.config_file = self.config_dir / "config.json"
-        self.rules_file = self.config_dir / "rules.txt"
-        self.logs_dir = self.config_dir / "logs"
-        
-        # 确保目录存在
-        self.config_dir.mkdir(exist_ok=True)
-        self.logs_dir.mkdir(exist_ok=True)
+        self.set_config_dir(config_dir or Path(__file__).parent)
         
         # 默认配置
         self._default_config = AppConfig()
         self._config = self._default_config.copy()
     
+    def set_config_dir(self, config_dir):
+        """
+        切换配置目录（基准测试等在临时目录中修改配置，不影响程序目录中的配置）
+        
+        Args:
+            config_dir: 配置文件目录
+        """
+        self.config_dir = Path(config_dir)
+        self.config_file = self.config_dir / "config.json"
+        self.rules_file = self.config_dir / "rules.txt"
+        self.logs_dir = self.config_dir / "logs"
+    
     def load_config(self) -> AppConfig:
         """
         加载配置文件
@@ -79,6 +188,7 @@ class ConfigManager:
             保存是否成功
         """
         try:
+            self.config_dir.mkdir(exist_ok=True)
             with open(self.config_file, "w", encoding="utf-8") as f:
                 json.dump(self._config.dict(), f, ensure_ascii=False, indent=4)
             return True
@@ -144,6 +254,7 @@ class ConfigManager:
             保存是否成功
         """
         try:
+            self.config_dir.mkdir(exist_ok=True)
             with open(self.rules_file, "w", encoding="utf-8") as f:
                 f.write(rules)
             return True
@@ -153,7 +264,7 @@ class ConfigManager:
     
     def get_log_file_path(self, filename: str = "classification.log") -> Path:
         """
-        获取日志文件路径
+        获取日志文件路径（首次使用时创建日志目录）
         
         Args:
             filename: 日志文件名
@@ -161,6 +272,7 @@ class ConfigManager:
         Returns:
             日志文件完整路径
         """
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
         return self.logs_dir / filename
     
     def get_config_dir(self) -> Path:
@@ -0,0 +1,231 @@
+"""
+事件总线模块
+处理过程中发布带类型的事件（条目开始、分类完成、移动完成、失败、阶段耗时、限流），
+订阅者按各自的间隔在分发线程中批量接收；处理线程只做一次追加，不直接调用订阅者
+"""
+
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Callable, Iterable, Optional
+from loguru import logger
+
+# 事件类型
+ITEM_STARTED = "item_started"
+CLASSIFIED = "classified"
+MOVED = "moved"
+FAILED = "failed"
+STAGE = "stage"
+THROTTLED = "throttled"
+
+EVENT_TYPES = (ITEM_STARTED, CLASSIFIED, MOVED, FAILED, STAGE, THROTTLED)
+
+
+class Event:
+    """处理事件"""
+
+    __slots__ = ("type", "time", "item", "data")
+
+    def __init__(self, event_type: str, item=None, data: Optional[Dict[str, Any]] = None):
+        """
+        初始化事件
+
+        Args:
+            event_type: 事件类型
+            item: 相关的文件项（阶段和部分限流事件没有）
+            data: 附加数据
+        """
+        self.type = event_type
+        self.time = time.time()
+        self.item = item
+        self.data = data or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为可序列化的字典
+
+        Returns:
+            事件字典
+        """
+        result = {"type": self.type, "time": self.time}
+        if self.item is not None:
+            result["name"] = self.item.name
+            result["path"] = self.item.path
+        result.update(self.data)
+        return result
+
+
+class Subscription:
+    """事件订阅"""
+
+    def __init__(self, handler: Callable[[List[Event]], None], types: Optional[Iterable[str]], interval: float):
+        """
+        初始化订阅
+
+        Args:
+            handler: 批量事件处理函数（在分发线程中调用）
+            types: 订阅的事件类型，None表示全部
+            interval: 批量投递间隔(秒)
+        """
+        self.handler = handler
+        self.types = frozenset(types) if types is not None else None
+        self.interval = interval
+        self.delivered = 0
+        self._buffer: deque = deque()
+        self._next_delivery = time.monotonic() + interval
+        self._deliver_lock = threading.Lock()
+
+    def wants(self, event_type: str) -> bool:
+        """是否订阅了该类型的事件"""
+        return self.types is None or event_type in self.types
+
+    def deliver(self, force: bool = False):
+        """
+        投递积压的事件
+
+        Args:
+            force: 未到投递时间也立即投递
+        """
+        now = time.monotonic()
+        if not force and now < self._next_delivery:
+            return
+        with self._deliver_lock:
+            self._next_delivery = now + self.interval
+            batch = []
+            while self._buffer:
+                batch.append(self._buffer.popleft())
+            if not batch:
+                return
+            try:
+                self.handler(batch)
+            except Exception as e:
+                logger.error(f"事件订阅者处理失败: {e}")
+            self.delivered += len(batch)
+
+
+class EventBus:
+    """事件总线"""
+
+    def __init__(self, batch_interval: Optional[float] = None):
+        """
+        初始化事件总线
+
+        Args:
+            batch_interval: 订阅者默认的批量投递间隔(秒)，默认读取配置
+        """
+        self.batch_interval = batch_interval
+        self._subscriptions: List[Subscription] = []
+        self._wanted: Optional[frozenset] = frozenset()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def subscribe(self, handler: Callable[[List[Event]], None], types: Optional[Iterable[str]] = None,
+                  interval: Optional[float] = None) -> Subscription:
+        """
+        订阅事件
+
+        Args:
+            handler: 批量事件处理函数，参数为按发布顺序排列的事件列表（在分发线程中调用，
+                     界面订阅者需自行转到界面线程）
+            types: 订阅的事件类型，None表示全部
+            interval: 批量投递间隔(秒)，默认使用总线的间隔
+
+        Returns:
+            订阅（用于取消订阅）
+        """
+        if interval is None:
+            interval = self.batch_interval
+        if interval is None:
+            from config import config_manager
+            interval = config_manager.load_config().event_batch_interval
+        subscription = Subscription(handler, types, max(0.001, interval))
+
+        with self._lock:
+            # 复制后替换订阅列表，发布端无需加锁即可遍历
+            self._subscriptions = self._subscriptions + [subscription]
+            self._update_wanted()
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._wake.clear()
+                self._dispatcher = threading.Thread(target=self._run, name="event-bus", daemon=True)
+                self._dispatcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription, flush: bool = True):
+        """
+        取消订阅
+
+        Args:
+            subscription: 订阅
+            flush: 是否先投递积压的事件
+        """
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+            self._update_wanted()
+            if not self._subscriptions:
+                self._wake.set()
+        if flush:
+            subscription.deliver(force=True)
+
+    def _update_wanted(self):
+        """汇总所有订阅者关心的事件类型（None表示全部）"""
+        wanted = set()
+        for subscription in self._subscriptions:
+            if subscription.types is None:
+                self._wanted = None
+                return
+            wanted.update(subscription.types)
+        self._wanted = frozenset(wanted)
+
+    def wants(self, event_type: str) -> bool:
+        """
+        是否有订阅者关心该类型的事件（发布前可先判断，避免无人订阅时准备事件数据）
+
+        Args:
+            event_type: 事件类型
+
+        Returns:
+            是否有订阅者
+        """
+        wanted = self._wanted
+        return wanted is None or event_type in wanted
+
+    def publish(self, event_type: str, item=None, **data):
+        """
+        发布事件（线程安全，无人订阅时立即返回）
+
+        Args:
+            event_type: 事件类型
+            item: 相关的文件项
+            **data: 附加数据
+        """
+        if not self.wants(event_type):
+            return
+        event = Event(event_type, item, data)
+        for subscription in self._subscriptions:
+            if subscription.wants(event_type):
+                subscription._buffer.append(event)
+
+    def flush(self):
+        """立即投递所有积压的事件（例如一次运行结束时）"""
+        for subscription in self._subscriptions:
+            subscription.deliver(force=True)
+
+    def _run(self):
+        """分发线程：按各订阅的间隔投递，没有订阅者时退出"""
+        while True:
+            subscriptions = self._subscriptions
+            if not subscriptions:
+                with self._lock:
+                    if not self._subscriptions:
+                        self._dispatcher = None
+                        return
+                continue
+            for subscription in subscriptions:
+                subscription.deliver()
+            self._wake.wait(min(subscription.interval for subscription in subscriptions))
+            self._wake.clear()
+
+
+# 全局事件总线实例
+event_bus = EventBus()
@@ -3,14 +3,35 @@
 负责文件分类和移动的核心逻辑
 """
 
+import itertools
+import json
 import os
-import shutil
+import queue
+import sqlite3
+import threading
 import time
-from typing import List, Dict, Tuple, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Any, Iterator, Callable
 from pathlib import Path
 from loguru import logger
 from api_service import api_service
 from config import config_manager
+from name_grouping import group_items
+from compiled_rules import RulesWatcher, RulesHistory, compile_rules, rules_hash
+from archive_index import ArchiveIndex, INDEX_FILE_NAME
+from catalog import ArchiveCatalog, new_run_id
+from scheduler import PriorityScheduler
+from move_engine import MoveEngine
+from buckets import BucketPlanner
+from token_budget import token_budget, format_spend, BUDGET_EXHAUSTED
+from profiler import run_profiler
+from events import event_bus, ITEM_STARTED, CLASSIFIED, MOVED, FAILED, STAGE, THROTTLED
+
+# 结果流中等待使用方取走的最大事件数（使用方处理较慢时处理线程在此等待）
+STREAM_BUFFER_SIZE = 256
+
+# 结果流中汇总快照的间隔(秒)
+STREAM_SNAPSHOT_INTERVAL = 1.0
 
 
 class FileItem:
@@ -32,9 +53,54 @@ class FileItem:
         self.target_path: Optional[str] = None
         self.error: Optional[str] = None
         self.processing_time: float = 0.0
+        self.completed = False
+        self.engine: Optional[str] = None
+        self.confidence: Optional[float] = None
+        self.rules_version: Optional[str] = None
+        # 本次运行中超过截止时间、等待在运行末尾重试（只在进程内使用，不序列化）
+        self.timed_out = False
+        # 排序时已统计的大小（字节，文件夹为估算值），写入目录数据库时复用（只在进程内使用，不序列化）
+        self.size: Optional[int] = None
     
     def __str__(self) -> str:
         return f"{self.entry_type}: {self.name}"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为可序列化的字典
+        
+        Returns:
+            文件项字典
+        """
+        return {
+            "name": self.name,
+            "path": self.path,
+            "entry_type": self.entry_type,
+            "classification_result": self.classification_result,
+            "target_path": self.target_path,
+            "error": self.error,
+            "processing_time": self.processing_time,
+            "completed": self.completed,
+            "engine": self.engine,
+            "confidence": self.confidence,
+            "rules_version": self.rules_version
+        }
+    
+    def update_from_dict(self, data: Dict[str, Any]):
+        """
+        从字典更新处理结果
+        
+        Args:
+            data: to_dict生成的文件项字典
+        """
+        self.classification_result = data.get("classification_result")
+        self.target_path = data.get("target_path")
+        self.error = data.get("error")
+        self.processing_time = data.get("processing_time", 0.0)
+        self.completed = data.get("completed", False)
+        self.engine = data.get("engine")
+        self.confidence = data.get("confidence")
+        self.rules_version = data.get("rules_version")
 
 
 class FileProcessor:
@@ -47,7 +113,82 @@ class FileProcessor:
         self.file_items: List[FileItem] = []
         self.success_count = 0
         self.error_count = 0
+        self.collapsed_calls = 0
+        self.coalesced_calls = 0
+        self.similarity_stats: Dict[str, Any] = {}
+        self.escalation_stats: Dict[str, Any] = {}
+        self.connection_stats: Dict[str, Any] = {}
+        self.budget_stats: Dict[str, Any] = {}
+        self.quarantine_stats: Dict[str, Any] = {}
+        # 本次运行的预检结果（未预检时为None）
+        self.preflight: Optional[Dict[str, Any]] = None
+        self._begin_error: Optional[str] = None
         self.start_time = 0.0
+        self._known_dirs: set = set()
+        self._dry_run = False
+        self._budget_exhausted = False
+        self._finished = 0
+        self._quarantine: List[FileItem] = []
+        self._quarantined_total = 0
+        self._recovered = 0
+        self._rules_watcher: Optional[RulesWatcher] = None
+        # 分片工作进程不写归档索引，由协调者汇总后统一写入
+        self.record_archive_index = True
+        # 本次运行的编号（写入目录数据库）
+        self.run_id: Optional[str] = None
+        # 处理顺序的优先级键，None表示使用配置
+        self.priority_keys: Optional[List[str]] = None
+        # 进度信息中附带已用token和费用（分片工作进程由协调者汇总后显示）
+        self.show_spend = True
+        # 结果流的接收函数（iter_results期间设置，每个条目得出最终结果时调用）
+        self._result_sink: Optional[Callable[[FileItem], None]] = None
+        self._run_total = 0
+        # 边扫描边处理（指定source_folder运行）：不保留已完成的条目，归档记录按批写入
+        self._streaming = False
+        self._stream_index: Optional[ArchiveIndex] = None
+        self._archive_buffer: List[FileItem] = []
+        self._streamed_time = 0.0
+        # 处理事件发布到的事件总线（界面、统计等订阅者按批接收）
+        self.events = event_bus
+        self._stage: Optional[str] = None
+        self._stage_start = 0.0
+        # 移动引擎（缓存源目录和目标目录的句柄，一次运行结束后关闭）
+        self.mover = MoveEngine()
+        # 部门目录下的分桶子目录（每次运行按配置重建）
+        self.buckets = BucketPlanner()
+        
+        # 运行控制：暂停事件置位表示运行中，取消事件置位表示已请求取消
+        self._pause_event = threading.Event()
+        self._pause_event.set()
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+    
+    def pause(self):
+        """暂停处理（不再领取新条目，进行中的条目继续完成）"""
+        if self._pause_event.is_set():
+            self._pause_event.clear()
+            logger.info("处理已暂停，等待进行中的条目完成")
+    
+    def resume(self):
+        """继续处理"""
+        if not self._pause_event.is_set():
+            self._pause_event.set()
+            logger.info("处理已继续")
+    
+    def cancel(self):
+        """取消处理（进行中的条目完成后停止）"""
+        self._cancel_event.set()
+        # 唤醒暂停中的调度循环，使其尽快退出
+        self._pause_event.set()
+        logger.info("已请求取消处理，等待进行中的条目完成")
+    
+    def is_paused(self) -> bool:
+        """是否处于暂停状态"""
+        return not self._pause_event.is_set()
+    
+    def is_cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._cancel_event.is_set()
     
     def load_files(self, source_folder: str) -> List[FileItem]:
         """
@@ -61,19 +202,10 @@ class FileProcessor:
         """
         self.source_folder = source_folder
         self.file_items = []
+        self._streaming = False
         
         try:
-            # 获取所有文件和子文件夹（排除分类目标文件夹）
-            entries = [f for f in os.listdir(source_folder) 
-                      if f not in ["永久", "长期", "短期"]]
-            
-            for entry in entries:
-                entry_path = os.path.join(source_folder, entry)
-                entry_type = "文件" if os.path.isfile(entry_path) else "文件夹"
-                
-                file_item = FileItem(entry, entry_path, entry_type)
-                self.file_items.append(file_item)
-            
+            self.file_items = list(self.iter_files(source_folder))
             logger.info(f"加载文件完成 - 源文件夹: {source_folder}, 文件数量: {len(self.file_items)}")
             return self.file_items
             
@@ -81,6 +213,41 @@ class FileProcessor:
             logger.error(f"加载文件失败 - 源文件夹: {source_folder}, 错误: {e}")
             return []
     
+    @staticmethod
+    def iter_files(source_folder: str) -> Iterator[FileItem]:
+        """
+        逐个扫描源文件夹中的文件和子文件夹（排除分类目标文件夹和归档索引）
+        
+        Args:
+            source_folder: 源文件夹路径
+            
+        Returns:
+            文件项迭代器（目录项类型来自扫描结果，不再逐个stat）
+        """
+        with os.scandir(source_folder) as entries:
+            for entry in entries:
+                if entry.name in ("永久", "长期", "短期") or entry.name.startswith(INDEX_FILE_NAME):
+                    continue
+                yield FileItem(entry.name, entry.path, "文件" if entry.is_file() else "文件夹")
+    
+    def _scan_batches(self, source_folder: str, batch_size: int) -> Iterator[List[FileItem]]:
+        """
+        按批扫描源文件夹（边扫描边处理时使用）
+        
+        Args:
+            source_folder: 源文件夹路径
+            batch_size: 每批的条目数
+            
+        Returns:
+            文件项批次迭代器
+        """
+        items = self.iter_files(source_folder)
+        while True:
+            batch = list(itertools.islice(items, batch_size))
+            if not batch:
+                return
+            yield batch
+    
     def create_classification_directories(self) -> bool:
         """
         创建分类目录结构
@@ -102,53 +269,28 @@ class FileProcessor:
             logger.error(f"创建分类目录失败: {e}")
             return False
     
-    def classify_file(self, file_item: FileItem) -> bool:
+    def classify_file(self, file_item: FileItem, classification_rules: Optional[str] = None) -> bool:
         """
         分类单个文件
         
         Args:
             file_item: 文件项
+            classification_rules: 分类规则，默认使用当前规则
             
         Returns:
             是否成功
         """
         start_time = time.time()
+        classification_rules = classification_rules or self.classification_rules
         
         try:
             # 调用API进行分类
-            success, result, details = api_service.classify_file(
+            outcome = api_service.classify_file(
                 file_item.name, 
                 file_item.entry_type, 
-                self.classification_rules
+                classification_rules
             )
-            
-            file_item.processing_time = time.time() - start_time
-            
-            if success:
-                file_item.classification_result = result
-                
-                # 解析分类结果
-                if "-" in result:
-                    period, dept = result.split("-", 1)
-                    
-                    # 创建目标目录
-                    target_dir = os.path.join(self.source_folder, period, dept)
-                    if not os.path.exists(target_dir):
-                        os.makedirs(target_dir)
-                    
-                    # 设置目标路径
-                    file_item.target_path = os.path.join(target_dir, file_item.name)
-                    
-                    logger.info(f"分类成功: {file_item.name} → {period}/{dept}")
-                    return True
-                else:
-                    file_item.error = "分类结果格式错误"
-                    logger.error(f"分类结果格式错误: {file_item.name}, 结果: {result}")
-                    return False
-            else:
-                file_item.error = details.get("error", "API调用失败")
-                logger.error(f"分类失败: {file_item.name}, 错误: {file_item.error}")
-                return False
+            return self._handle_classification(file_item, classification_rules, start_time, outcome)
                 
         except Exception as e:
             file_item.processing_time = time.time() - start_time
@@ -156,6 +298,77 @@ class FileProcessor:
             logger.error(f"分类异常: {file_item.name}, 错误: {e}")
             return False
     
+    def _handle_classification(self, file_item: FileItem, classification_rules: str, start_time: float,
+                               outcome: Tuple[bool, str, Dict[str, Any]]) -> bool:
+        """
+        记录分类结果到文件项
+        
+        Args:
+            file_item: 文件项
+            classification_rules: 使用的分类规则
+            start_time: 开始分类的时间
+            outcome: (是否成功, 分类结果, 详细信息)
+            
+        Returns:
+            是否成功
+        """
+        success, result, details = outcome
+        file_item.processing_time = time.time() - start_time
+        file_item.rules_version = rules_hash(classification_rules)
+        file_item.engine = details.get("engine")
+        file_item.confidence = details.get("confidence", details.get("similarity"))
+        file_item.timed_out = bool(details.get("timed_out"))
+        
+        if success:
+            return self.apply_classification(file_item, result)
+        
+        file_item.error = details.get("error", "API调用失败")
+        logger.error(f"分类失败: {file_item.name}, 错误: {file_item.error}")
+        return False
+    
+    def apply_classification(self, file_item: FileItem, result: str) -> bool:
+        """
+        应用分类结果（只计算目标路径，目录在移动时创建）
+        
+        Args:
+            file_item: 文件项
+            result: 分类结果（保管期限-部门）
+            
+        Returns:
+            是否成功
+        """
+        file_item.classification_result = result
+        
+        # 解析分类结果
+        if "-" not in result:
+            file_item.error = "分类结果格式错误"
+            logger.error(f"分类结果格式错误: {file_item.name}, 结果: {result}")
+            return False
+        
+        period, dept = result.split("-", 1)
+        
+        # 设置目标路径（部门目录条目过多时放入分桶子目录）
+        target_dir = self.buckets.target_dir(os.path.join(self.source_folder, period, dept),
+                                             file_item.name, file_item.path)
+        file_item.target_path = os.path.join(target_dir, file_item.name)
+        
+        logger.info(f"分类成功: {file_item.name} → {period}/{dept}")
+        self.events.publish(CLASSIFIED, file_item, result=result, engine=file_item.engine,
+                            confidence=file_item.confidence)
+        return True
+    
+    def _ensure_directory(self, directory: str):
+        """
+        确保目录存在（带已存在目录缓存）
+        
+        Args:
+            directory: 目录路径
+        """
+        if directory in self._known_dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._known_dirs.add(directory)
+    
     def move_file(self, file_item: FileItem) -> bool:
         """
         移动文件到目标位置
@@ -170,10 +383,18 @@ class FileProcessor:
             file_item.error = "目标路径未设置"
             return False
         
+        if os.path.normcase(os.path.abspath(file_item.path)) == os.path.normcase(os.path.abspath(file_item.target_path)):
+            # 重新分类时结果未变，条目已在目标位置
+            return True
+        
         try:
-            # 移动文件/文件夹
-            shutil.move(file_item.path, file_item.target_path)
+            # 创建目标目录（已确认存在的目录不再重复检查）
+            self._ensure_directory(os.path.dirname(file_item.target_path))
+            
+            # 移动文件/文件夹（以缓存的目录句柄为基准，只解析最后一级名称）
+            self.mover.move(file_item.path, file_item.target_path)
             logger.info(f"移动成功: {file_item.name} → {file_item.target_path}")
+            self.events.publish(MOVED, file_item, target_path=file_item.target_path)
             return True
             
         except Exception as e:
@@ -181,44 +402,517 @@ class FileProcessor:
             logger.error(f"移动失败: {file_item.name}, 错误: {e}")
             return False
     
-    def process_all_files(self, classification_rules: str, progress_callback=None) -> Dict[str, Any]:
+    def _acquire_slot(self, slots: threading.Semaphore) -> bool:
         """
-        处理所有文件
+        获取并发槽位（暂停期间不占用任何槽位）
+        
+        Args:
+            slots: 并发槽位信号量
+            
+        Returns:
+            是否获取成功（已取消时返回False）
+        """
+        while not self._cancel_event.is_set():
+            if not self._pause_event.wait(timeout=0.2):
+                continue
+            if slots.acquire(timeout=0.2):
+                # 等待期间可能发生了暂停或取消，此时立即归还槽位
+                if self._pause_event.is_set() and not self._cancel_event.is_set():
+                    return True
+                slots.release()
+        return False
+    
+    def _current_rules(self) -> str:
+        """
+        获取当前分类规则（启用热更新时规则文件变化后返回新规则）
+        
+        Returns:
+            分类规则文本
+        """
+        if self._rules_watcher is not None:
+            text = self._rules_watcher.current().text
+            if text != self.classification_rules:
+                self.rules_history().save(text)
+                self.classification_rules = text
+        return self.classification_rules
+    
+    @staticmethod
+    def rules_history() -> RulesHistory:
+        """获取规则版本历史（保存在配置目录中）"""
+        return RulesHistory(config_manager.get_config_dir() / "rules_history")
+    
+    def update_archive_index(self, items: List[FileItem], index: Optional[ArchiveIndex] = None):
+        """
+        将本次完成归档的条目写入归档索引和目录数据库
+        
+        Args:
+            items: 本次处理的文件项
+            index: 已加载的归档索引（由调用方保存），默认加载后立即保存
+        """
+        completed = [item for item in items if item.completed and item.target_path]
+        if not completed or not self.source_folder:
+            return
+        
+        loaded = index or ArchiveIndex(self.source_folder).load()
+        for item in completed:
+            # 重新分类移动的条目删除原位置的记录
+            loaded.remove(item.path)
+            loaded.record(item.target_path, item.classification_result, item.rules_version,
+                          item.confidence, item.engine)
+        if index is None:
+            loaded.save()
+        self.update_catalog(completed)
+    
+    def _flush_archive(self):
+        """写入边扫描边处理时已完成条目的归档记录（归档索引在运行结束时保存）"""
+        with self._lock:
+            items, self._archive_buffer = self._archive_buffer, []
+        if not items or self._dry_run or not self.record_archive_index:
+            return
+        if self._stream_index is None:
+            self._stream_index = ArchiveIndex(self.source_folder).load()
+        self.update_archive_index(items, self._stream_index)
+    
+    @staticmethod
+    def catalog() -> ArchiveCatalog:
+        """获取归档目录数据库（保存在配置目录中，WAL模式要求位于本地磁盘）"""
+        return ArchiveCatalog(config_manager.get_config_dir() / "catalog.db",
+                              config_manager.load_config().catalog_batch_size)
+    
+    def update_catalog(self, items: List[FileItem]):
+        """
+        将已完成归档的条目写入目录数据库
+        
+        Args:
+            items: 已完成移动的文件项
+        """
+        app_config = config_manager.load_config()
+        if not app_config.catalog_enabled:
+            return
+        run_id = self.run_id or new_run_id()
+        content_hash = app_config.catalog_content_hash
+        catalog = self.catalog()
+        try:
+            # 读取元数据（文件夹大小、可选的内容摘要）涉及磁盘I/O，在线程池中并行进行
+            with ThreadPoolExecutor(max_workers=max(1, app_config.max_workers)) as executor:
+                records = executor.map(lambda item: ArchiveCatalog.describe(item, run_id, content_hash), items)
+                catalog.record(record for record in records if record is not None)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"写入归档目录数据库失败: {catalog.db_path}, 错误: {e}")
+        finally:
+            catalog.close()
+    
+    def _process_item(self, file_item: FileItem, classification_rules: Optional[str] = None) -> bool:
+        """
+        处理单个条目（分类并移动）
+        
+        Args:
+            file_item: 文件项
+            classification_rules: 分类规则，默认使用当前规则
+            
+        Returns:
+            是否成功
+        """
+        if not self.classify_file(file_item, classification_rules):
+            return False
+        if self._dry_run:
+            return True
+        if self.move_file(file_item):
+            file_item.completed = True
+            return True
+        return False
+    
+    def _process_group(self, group: List[FileItem], classification_rules: Optional[str] = None) -> List[bool]:
+        """
+        处理一组名称主干相同的条目（只分类代表条目，结果应用到全组）
+        
+        Args:
+            group: 文件项分组，第一个为代表条目
+            classification_rules: 分类规则，整组使用同一版本
+            
+        Returns:
+            各条目是否成功
+        """
+        for file_item in group:
+            self.events.publish(ITEM_STARTED, file_item)
+        representative = group[0]
+        results = [self._process_item(representative, classification_rules)]
+        
+        for member in group[1:]:
+            if representative.classification_result and representative.target_path:
+                # 代表条目分类成功，直接复用其结果
+                member.engine = "group"
+                member.confidence = representative.confidence
+                member.rules_version = representative.rules_version
+                success = self.apply_classification(member, representative.classification_result)
+                if success and not self._dry_run:
+                    success = self.move_file(member)
+                    member.completed = success
+                with self._lock:
+                    self.collapsed_calls += 1
+            else:
+                # 代表条目分类失败时逐个处理，避免整组一起失败
+                success = self._process_item(member, classification_rules)
+            results.append(success)
+        
+        return results
+    
+    def _begin_run(self, classification_rules: str, dry_run: bool,
+                   items: Optional[List[FileItem]] = None) -> Optional[Tuple[List[FileItem], List[List[FileItem]]]]:
+        """
+        开始一次处理：重置统计、预检服务商、创建分类目录、编译规则并分组
         
         Args:
             classification_rules: 分类规则
-            progress_callback: 进度回调函数
+            dry_run: 只分类不创建目录、不移动文件
+            items: 待处理条目（边扫描边处理时为第一批），默认为已加载条目中未完成的
             
         Returns:
-            处理结果统计
+            (待处理条目, 分组)，预检或创建分类目录失败时返回None（原因见_begin_error）
         """
+        self._enter_stage("prepare")
         self.classification_rules = classification_rules
         self.start_time = time.time()
+        self.run_id = new_run_id()
         self.success_count = 0
         self.error_count = 0
+        self._dry_run = dry_run
+        self._budget_exhausted = False
+        self._finished = 0
+        self._quarantine = []
+        self._quarantined_total = 0
+        self._recovered = 0
+        self._archive_buffer = []
+        self._stream_index = None
+        self._streamed_time = 0.0
+        self._known_dirs.clear()
+        self._cancel_event.clear()
+        self._pause_event.set()
+        api_service.reset_similarity_stats()
+        api_service.reset_escalation_stats()
+        api_service.reset_connection_stats()
+        api_service.reset_deadline_stats()
+        api_service.reset_coalescing_stats()
+        
+        # 已完成的条目（例如上次取消前已移动的）不再重复处理
+        pending_items = items if items is not None else [item for item in self.file_items if not item.completed]
+        app_config = config_manager.load_config()
+        
+        # 预检：预热连接并以第一个条目校准截止时间，密钥或模型配置错误时在创建任何目录之前结束
+        self.preflight = None
+        if pending_items and app_config.preflight_connections > 0:
+            self._enter_stage("preflight")
+            sample = (pending_items[0].name, pending_items[0].entry_type, classification_rules)
+            self.preflight = self._run_preflight(app_config, sample)
+            self._enter_stage("prepare")
+            if not self.preflight["ok"]:
+                self._begin_error = f"预检失败: {self.preflight['error']}"
+                return None
         
         # 创建分类目录
-        if not self.create_classification_directories():
-            return {"success": False, "error": "创建分类目录失败"}
-        
-        total_files = len(self.file_items)
-        logger.info(f"开始处理 {total_files} 个文件")
-        
-        for i, file_item in enumerate(self.file_items):
-            # 更新进度
-            if progress_callback:
-                progress = (i + 1) / total_files * 100
-                progress_callback(progress, f"处理中: {file_item.name}")
-            
-            # 分类文件
-            if self.classify_file(file_item):
-                # 移动文件
-                if self.move_file(file_item):
-                    self.success_count += 1
-                else:
-                    self.error_count += 1
+        if not dry_run and not self.create_classification_directories():
+            self._begin_error = "创建分类目录失败"
+            return None
+        
+        # 编译规则并在运行期间监视规则文件，修改后新领取的条目使用新规则
+        for problem in compile_rules(classification_rules).problems:
+            logger.warning(f"分类规则: {problem}")
+        self.rules_history().save(classification_rules)
+        self._rules_watcher = (RulesWatcher(config_manager.rules_file, classification_rules)
+                               if app_config.rules_hot_reload else None)
+        
+        groups = self._plan_groups(pending_items, app_config)
+        self.collapsed_calls = 0
+        self._run_total = len(pending_items)
+        self.mover.enabled = app_config.dir_fd_moves
+        self.buckets = BucketPlanner(app_config.bucket_by, app_config.bucket_threshold, app_config.bucket_hash_chars)
+        # 边扫描边处理时总请求数未知，按第一批估算预算用量
+        token_budget.start(app_config, len(groups))
+        return pending_items, groups
+    
+    def _plan_groups(self, items: List[FileItem], app_config) -> List[List[FileItem]]:
+        """
+        将条目分组并按优先级排序
+        
+        Args:
+            items: 待处理条目
+            app_config: 应用配置
+            
+        Returns:
+            分组列表，每组第一个为代表条目
+        """
+        # 名称主干相同的条目合并为一组，每组只调用一次大模型
+        if app_config.group_similar_names:
+            groups = group_items(items)
+        else:
+            groups = [[item] for item in items]
+        
+        # 按优先级排序，最重要的条目最先占用API吞吐
+        priority_keys = self.priority_keys if self.priority_keys is not None else app_config.priority_keys
+        if priority_keys:
+            groups = PriorityScheduler(priority_keys, self.source_folder).order(groups)
+        return groups
+    
+    def _next_batch_groups(self, batches: Iterator[List[FileItem]], app_config) -> Optional[List[List[FileItem]]]:
+        """
+        边扫描边处理时领取下一批：先写入已完成条目的归档记录，再扫描并分组下一批
+        
+        Args:
+            batches: 文件项批次迭代器
+            app_config: 应用配置
+            
+        Returns:
+            下一批的分组，扫描完毕时返回None
+        """
+        self._flush_archive()
+        batch = next(batches, None)
+        if batch is None:
+            return None
+        with self._lock:
+            self._run_total += len(batch)
+        return self._plan_groups(batch, app_config)
+    
+    def _stream_groups(self, groups: List[List[FileItem]], batches: Iterator[List[FileItem]],
+                       app_config) -> Iterator[List[FileItem]]:
+        """
+        依次产出第一批和之后各批的分组（调度循环领取到哪一批才扫描到哪一批）
+        
+        Returns:
+            分组迭代器
+        """
+        yield from groups
+        while True:
+            batch_groups = self._next_batch_groups(batches, app_config)
+            if batch_groups is None:
+                return
+            yield from batch_groups
+    
+    def _run_preflight(self, app_config, sample: Tuple[str, str, str]) -> Dict[str, Any]:
+        """
+        运行前预检（异步处理器改用异步客户端预热）
+        
+        Args:
+            app_config: 应用配置
+            sample: 校准请求的(文件名, 条目类型, 分类规则)
+        
+        Returns:
+            预检结果
+        """
+        return api_service.preflight(app_config, sample)
+    
+    def _preflight_workers(self, max_workers: int) -> int:
+        """
+        按预检估计的服务商并行能力确定起始并发数
+        
+        Args:
+            max_workers: 配置或指定的并发数
+            
+        Returns:
+            起始并发数
+        """
+        limit = self.preflight.get("concurrency") if self.preflight else None
+        if limit and limit < max_workers:
+            logger.info(f"预检估计服务商并行能力约为 {limit}，并发数 {max_workers} → {limit}")
+            return limit
+        return max_workers
+    
+    def _enter_stage(self, name: Optional[str]):
+        """
+        进入处理阶段：发布上一阶段的耗时，并标记性能剖析的阶段
+        
+        Args:
+            name: 阶段名称，None表示本次运行结束
+        """
+        now = time.time()
+        if self._stage:
+            self.events.publish(STAGE, stage=self._stage, seconds=now - self._stage_start, next=name)
+        self._stage, self._stage_start = name, now
+        if name:
+            run_profiler.stage(name)
+    
+    def _emit(self, items: List[FileItem]):
+        """
+        登记得出最终结果的条目：交给结果流（流式处理时），失败的发布失败事件
+        
+        Args:
+            items: 文件项
+        """
+        sink = self._result_sink
+        if self._streaming:
+            # 不保留已完成的条目，只累计耗时并暂存待写入归档记录的条目
+            with self._lock:
+                self._streamed_time += sum(item.processing_time for item in items)
+                self._archive_buffer.extend(item for item in items if item.completed and item.target_path)
+        for item in items:
+            if item.error:
+                self.events.publish(FAILED, item, error=item.error)
+            if sink is not None:
+                sink(item)
+    
+    def _record_group(self, group: List[FileItem], results: List[bool], progress_callback=None):
+        """
+        登记一组条目的处理结果，预算用完时停止领取新条目，并更新进度
+        
+        Args:
+            group: 文件项分组
+            results: 各条目是否成功
+            progress_callback: 进度回调函数（边扫描边处理时总数为已扫描的条目数）
+        """
+        # 超过截止时间的条目进入隔离队列，在运行末尾重试，暂不计入失败和进度
+        quarantined = [item for item, success in zip(group, results) if not success and item.timed_out]
+        with self._lock:
+            self.success_count += sum(1 for success in results if success)
+            self.error_count += sum(1 for success in results if not success) - len(quarantined)
+            self._quarantine.extend(quarantined)
+            self._quarantined_total += len(quarantined)
+            self._finished += len(group) - len(quarantined)
+            done, total_files = self._finished, self._run_total
+        for item in quarantined:
+            self.events.publish(THROTTLED, item, reason="deadline")
+        self._emit([item for item in group if item not in quarantined])
+        
+        # 预算用完后不再领取新条目
+        spend = token_budget.get_stats()
+        if spend["state"] == BUDGET_EXHAUSTED and not self._cancel_event.is_set():
+            self._budget_exhausted = True
+            logger.warning("本次运行的token/费用预算已用完，停止处理剩余条目")
+            self.events.publish(THROTTLED, reason="budget", tokens=spend["total_tokens"], cost=spend["cost"])
+            self.cancel()
+        
+        # 更新进度
+        if progress_callback:
+            progress = done / total_files * 100
+            status = f"处理中: {group[-1].name}"
+            if self.show_spend and spend["total_tokens"]:
+                status += f"（{format_spend(spend['total_tokens'], spend['cost'])}）"
+            progress_callback(progress, status)
+    
+    def _take_quarantine(self) -> List[FileItem]:
+        """
+        取出隔离队列中的条目，准备以完整的全局超时重试
+        
+        Returns:
+            待重试的条目，已取消或队列为空时返回空列表
+        """
+        if self._cancel_event.is_set() or not self._quarantine:
+            return []
+        
+        self._enter_stage("quarantine")
+        items, self._quarantine = self._quarantine, []
+        timeout = config_manager.load_config().timeout
+        api_service.set_request_deadline(timeout)
+        logger.info(f"隔离队列: {len(items)} 个超时条目以完整超时时间({timeout}秒)重试")
+        for item in items:
+            item.error = None
+            item.timed_out = False
+        return items
+    
+    def _settle_quarantined(self, file_item: FileItem, success: bool, progress_callback=None):
+        """
+        登记隔离队列中条目的重试结果
+        
+        Args:
+            file_item: 文件项
+            success: 是否成功
+            progress_callback: 进度回调函数
+        """
+        with self._lock:
+            if success:
+                self.success_count += 1
+                self._recovered += 1
             else:
                 self.error_count += 1
+            self._finished += 1
+            done, total_files = self._finished, self._run_total
+        self._emit([file_item])
+        
+        if progress_callback:
+            progress_callback(done / total_files * 100, f"重试超时条目: {file_item.name}")
+    
+    def _run_quarantine(self, progress_callback=None):
+        """
+        以低并发重试隔离队列中的超时条目（主队列处理完后执行）
+        
+        Args:
+            progress_callback: 进度回调函数
+        """
+        items = self._take_quarantine()
+        if not items:
+            return
+        
+        workers = config_manager.load_config().quarantine_workers
+        slots = threading.Semaphore(workers)
+        
+        def retry(file_item: FileItem):
+            try:
+                success = self._process_item(file_item, self._current_rules())
+            except Exception as e:
+                file_item.error = str(e)
+                success = False
+            finally:
+                slots.release()
+            self._settle_quarantined(file_item, success, progress_callback)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for file_item in items:
+                    if not self._acquire_slot(slots):
+                        # 取消后未重试的条目按失败计
+                        self._quarantine.append(file_item)
+                        file_item.error = "请求超时，已取消重试"
+                        continue
+                    executor.submit(retry, file_item)
+        finally:
+            api_service.set_request_deadline(None)
+    
+    def _finish_run(self, pending_items: List[FileItem], submitted: int, dry_run: bool) -> Dict[str, Any]:
+        """
+        结束一次处理：汇总统计、写入归档索引，取消时落盘处理报告
+        
+        Args:
+            pending_items: 本次处理的条目（边扫描边处理时为第一批）
+            submitted: 已开始处理的条目数
+            dry_run: 只分类不创建目录、不移动文件
+            
+        Returns:
+            处理结果统计
+        """
+        self._enter_stage("finish")
+        total_files = self._run_total if self._streaming else len(pending_items)
+        cancelled = self._cancel_event.is_set()
+        cancelled_count = total_files - submitted
+        
+        # 取消时仍在隔离队列中的条目按失败计
+        for file_item in self._quarantine:
+            file_item.timed_out = False
+            file_item.error = file_item.error or "请求超时"
+        self.error_count += len(self._quarantine)
+        self._emit(self._quarantine)
+        self._quarantine = []
+        deadline_stats = api_service.get_deadline_stats()
+        self.quarantine_stats = {
+            "quarantined": self._quarantined_total,
+            "recovered": self._recovered,
+            "failed": self._quarantined_total - self._recovered,
+            "timeouts": deadline_stats.get("timeouts", 0),
+            "p95": deadline_stats.get("p95"),
+            "deadline": deadline_stats.get("deadline")
+        }
+        self.similarity_stats = api_service.get_similarity_stats()
+        self.coalesced_calls = api_service.get_coalescing_stats().get("coalesced_calls", 0)
+        self.escalation_stats = api_service.get_escalation_stats()
+        self.connection_stats = api_service.get_connection_stats()
+        self.budget_stats = token_budget.get_stats()
+        rules_reloads = self._rules_watcher.reload_count if self._rules_watcher else 0
+        self._rules_watcher = None
+        if self._streaming:
+            self._flush_archive()
+            if self._stream_index is not None:
+                self._stream_index.save()
+                self._stream_index = None
+        elif not dry_run and self.record_archive_index:
+            self.update_archive_index(pending_items)
+        self._dry_run = False
         
         # 完成处理
         duration = time.time() - self.start_time
@@ -227,11 +921,432 @@ class FileProcessor:
             "total_files": total_files,
             "success_count": self.success_count,
             "error_count": self.error_count,
+            "cancelled": cancelled,
+            "cancelled_count": cancelled_count,
+            "duration": duration,
+            "dry_run": dry_run,
+            "collapsed_calls": self.collapsed_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "similarity_stats": self.similarity_stats,
+            "escalation_stats": self.escalation_stats,
+            "connection_stats": self.connection_stats,
+            "preflight": self.preflight,
+            "budget_stats": self.budget_stats,
+            "budget_exhausted": self._budget_exhausted,
+            "quarantine_stats": self.quarantine_stats,
+            "rules_version": rules_hash(self.classification_rules),
+            "rules_reloads": rules_reloads,
+            "run_id": self.run_id,
+            "file_items": [] if self._streaming else self.file_items
+        }
+        
+        if cancelled:
+            # 取消时立即落盘处理报告，便于稍后继续
+            report_file = config_manager.get_log_file_path(
+                f"report_{time.strftime('%Y%m%d_%H%M%S')}.txt")
+            if self.export_results(str(report_file)):
+                result["report_file"] = str(report_file)
+            logger.info(f"处理已取消 - 成功: {self.success_count}, 失败: {self.error_count}, "
+                        f"未处理: {cancelled_count}, 耗时: {duration:.2f}秒")
+        else:
+            logger.info(f"处理完成 - 成功: {self.success_count}, 失败: {self.error_count}, 耗时: {duration:.2f}秒")
+        
+        self.mover.close()
+        
+        # 返回结果前投递积压的事件，订阅者在运行结束时已收到全部事件
+        self._enter_stage(None)
+        self.events.flush()
+        return result
+    
+    def _start_scan(self, source_folder: Optional[str], app_config) -> Tuple[Optional[Iterator[List[FileItem]]],
+                                                                             Optional[List[FileItem]]]:
+        """
+        准备边扫描边处理：不使用已加载的条目，扫描出第一批
+        
+        Args:
+            source_folder: 源文件夹路径，None表示处理已加载的条目
+            app_config: 应用配置
+            
+        Returns:
+            (之后各批的迭代器, 第一批)，处理已加载的条目时均为None
+        """
+        self._streaming = source_folder is not None
+        if source_folder is None:
+            return None, None
+        self.source_folder = source_folder
+        self.file_items = []
+        batches = self._scan_batches(source_folder, app_config.stream_batch_size)
+        return batches, next(batches, [])
+    
+    def process_all_files(self, classification_rules: str, progress_callback=None,
+                          max_workers: Optional[int] = None, dry_run: bool = False,
+                          source_folder: Optional[str] = None) -> Dict[str, Any]:
+        """
+        处理所有文件
+        
+        Args:
+            classification_rules: 分类规则
+            progress_callback: 进度回调函数
+            max_workers: 并发处理数，默认读取配置
+            dry_run: 只分类不创建目录、不移动文件
+            source_folder: 指定时边扫描该文件夹边处理：按批（stream_batch_size）扫描、分组和排序，
+                已完成的条目交给结果流后不再保留，归档记录按批写入，内存占用与文件夹大小无关
+            
+        Returns:
+            处理结果统计（边扫描边处理时file_items为空）
+        """
+        app_config = config_manager.load_config()
+        try:
+            batches, first_batch = self._start_scan(source_folder, app_config)
+        except OSError as e:
+            logger.error(f"扫描文件夹失败 - 源文件夹: {source_folder}, 错误: {e}")
+            return {"success": False, "error": f"扫描文件夹失败: {e}"}
+        run = self._begin_run(classification_rules, dry_run, first_batch)
+        if run is None:
+            return {"success": False, "error": self._begin_error}
+        pending_items, groups = run
+        total_files = len(pending_items)
+        max_workers = self._preflight_workers(max(1, max_workers or app_config.max_workers))
+        logger.info(f"开始处理 {total_files} 个文件，分为 {len(groups)} 组，并发数: {max_workers}"
+                    + ("（边扫描边处理，以上为第一批）" if batches is not None else ""))
+        if batches is not None:
+            groups = self._stream_groups(groups, batches, app_config)
+        self._enter_stage("classify")
+        
+        slots = threading.Semaphore(max_workers)
+        submitted = 0
+        
+        def run_group(group: List[FileItem]):
+            try:
+                # 条目开始处理时确定规则版本，处理过程中规则更新不影响本组
+                results = self._process_group(group, self._current_rules())
+            except Exception as e:
+                for file_item in group:
+                    if not file_item.completed and not file_item.error:
+                        file_item.error = str(e)
+                logger.error(f"处理异常: {group[0].name}, 错误: {e}")
+                results = [file_item.completed for file_item in group]
+            finally:
+                slots.release()
+            
+            self._record_group(group, results, progress_callback)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for group in groups:
+                if not self._acquire_slot(slots):
+                    break
+                executor.submit(run_group, group)
+                submitted += len(group)
+            # 退出with时等待进行中的API调用和移动完成
+        
+        self._run_quarantine(progress_callback)
+        return self._finish_run(pending_items, submitted, dry_run)
+    
+    def stream_snapshot(self) -> Dict[str, Any]:
+        """
+        获取进行中运行的汇总快照
+        
+        Returns:
+            已完成数、总数、成功数、失败数、隔离中的条目数和已用时间
+        """
+        with self._lock:
+            return {
+                "event": "snapshot",
+                "done": self._finished,
+                "total": self._run_total,
+                "success_count": self.success_count,
+                "error_count": self.error_count,
+                "quarantined": len(self._quarantine),
+                "elapsed": time.time() - self.start_time if self.start_time else 0.0
+            }
+    
+    def iter_results(self, classification_rules: str, max_workers: Optional[int] = None, dry_run: bool = False,
+                     snapshot_interval: float = STREAM_SNAPSHOT_INTERVAL,
+                     buffer_size: int = STREAM_BUFFER_SIZE,
+                     source_folder: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式处理所有文件：在后台线程中运行process_all_files，条目得出最终结果时逐个产出
+        
+        结果经有界队列传递，使用方处理较慢时处理线程等待，事件不在队列中积压；
+        提前停止迭代会取消本次运行（已开始的条目照常完成）。
+        
+        指定source_folder时边扫描边处理，处理器不保留已完成的条目，峰值内存与文件夹大小无关；
+        否则处理load_files加载的条目（保存在file_items中）。
+        
+        Args:
+            classification_rules: 分类规则
+            max_workers: 并发处理数，默认读取配置
+            dry_run: 只分类不创建目录、不移动文件
+            snapshot_interval: 汇总快照的间隔(秒)
+            buffer_size: 等待取走的最大事件数
+            source_folder: 边扫描边处理的源文件夹（见process_all_files）
+            
+        Returns:
+            事件迭代器：{"event": "item", "item": 文件项}、
+            {"event": "snapshot", ...}（见stream_snapshot）、
+            最后一个为{"event": "done", "result": 处理结果统计（不含file_items）}
+        """
+        events: queue.Queue = queue.Queue(maxsize=max(1, buffer_size))
+        abandoned = threading.Event()
+        outcome: Dict[str, Any] = {}
+        
+        def put(event: Dict[str, Any]):
+            while not abandoned.is_set():
+                try:
+                    events.put(event, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def run():
+            try:
+                outcome["result"] = self.process_all_files(classification_rules, max_workers=max_workers,
+                                                           dry_run=dry_run, source_folder=source_folder)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                put(None)
+        
+        self._result_sink = lambda item: put({"event": "item", "item": item})
+        worker = threading.Thread(target=run, name="file-processor-stream", daemon=True)
+        worker.start()
+        completed = False
+        try:
+            next_snapshot = time.time() + snapshot_interval
+            while True:
+                try:
+                    event = events.get(timeout=max(0.0, next_snapshot - time.time()))
+                except queue.Empty:
+                    event = self.stream_snapshot()
+                if event is None:
+                    completed = True
+                    break
+                if event["event"] == "snapshot":
+                    next_snapshot = time.time() + snapshot_interval
+                yield event
+        finally:
+            if not completed:
+                self.cancel()
+            abandoned.set()
+            worker.join()
+            self._result_sink = None
+        
+        if "error" in outcome:
+            raise outcome["error"]
+        result = dict(outcome["result"])
+        result.pop("file_items", None)
+        yield self.stream_snapshot()
+        yield {"event": "done", "result": result}
+    
+    def create_plan(self, classification_rules: str, plan_file: str, progress_callback=None,
+                    max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        生成移动计划（执行完整分类，但不创建目录、不移动文件）
+        
+        Args:
+            classification_rules: 分类规则
+            plan_file: 计划文件路径
+            progress_callback: 进度回调函数
+            max_workers: 并发处理数，默认读取配置
+            
+        Returns:
+            处理结果统计（含plan_file）
+        """
+        result = self.process_all_files(classification_rules, progress_callback,
+                                        max_workers=max_workers, dry_run=True)
+        if not result.get("success"):
+            return result
+        
+        if not self.write_plan(plan_file):
+            return {"success": False, "error": "移动计划写入失败"}
+        
+        result["plan_file"] = plan_file
+        return result
+    
+    def write_plan(self, plan_file: str) -> bool:
+        """
+        将当前条目的分类结果写入计划文件（JSON Lines，首行为计划信息）
+        
+        Args:
+            plan_file: 计划文件路径
+            
+        Returns:
+            是否成功
+        """
+        # 已在目标位置的条目（重新分类结果未变）无需写入计划
+        entries = [item for item in self.file_items
+                   if not item.completed and item.target_path != item.path]
+        try:
+            with open(plan_file, "w", encoding="utf-8") as f:
+                header = {
+                    "type": "plan",
+                    "version": 1,
+                    "source_folder": self.source_folder,
+                    "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "total": len(entries)
+                }
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                for item in entries:
+                    f.write(json.dumps({
+                        "source": item.path,
+                        "target": item.target_path,
+                        "entry_type": item.entry_type,
+                        "result": item.classification_result,
+                        "confidence": item.confidence,
+                        "engine": item.engine,
+                        "rules_version": item.rules_version,
+                        "error": item.error
+                    }, ensure_ascii=False) + "\n")
+            
+            logger.info(f"移动计划已生成: {plan_file}, 条目数: {len(entries)}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"移动计划写入失败: {e}")
+            return False
+    
+    @staticmethod
+    def load_plan(plan_file: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        读取计划文件
+        
+        Args:
+            plan_file: 计划文件路径
+            
+        Returns:
+            (计划信息, 计划条目列表)
+        """
+        with open(plan_file, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        
+        if not lines or lines[0].get("type") != "plan":
+            raise ValueError("不是有效的移动计划文件")
+        return lines[0], lines[1:]
+    
+    def apply_plan(self, plan_file: str, progress_callback=None,
+                   max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        执行移动计划（按目标目录分组并行移动）
+        
+        Args:
+            plan_file: 计划文件路径
+            progress_callback: 进度回调函数
+            max_workers: 并发移动数，默认读取配置
+            
+        Returns:
+            处理结果统计
+        """
+        self.start_time = time.time()
+        self.run_id = new_run_id()
+        self.success_count = 0
+        self.error_count = 0
+        self.collapsed_calls = 0
+        self.coalesced_calls = 0
+        self.similarity_stats = {}
+        self.escalation_stats = {}
+        self.connection_stats = {}
+        self.budget_stats = {}
+        self.quarantine_stats = {}
+        self._known_dirs.clear()
+        self._cancel_event.clear()
+        self._pause_event.set()
+        self.mover.enabled = config_manager.load_config().dir_fd_moves
+        
+        try:
+            header, entries = self.load_plan(plan_file)
+        except Exception as e:
+            logger.error(f"读取移动计划失败: {plan_file}, 错误: {e}")
+            return {"success": False, "error": f"读取移动计划失败: {e}"}
+        
+        # 根据计划重建条目
+        self.source_folder = header.get("source_folder", "")
+        self.file_items = []
+        for entry in entries:
+            file_item = FileItem(os.path.basename(entry["source"]), entry["source"], entry.get("entry_type", "文件"))
+            file_item.classification_result = entry.get("result")
+            file_item.target_path = entry.get("target")
+            file_item.engine = entry.get("engine")
+            file_item.confidence = entry.get("confidence")
+            file_item.rules_version = entry.get("rules_version")
+            file_item.error = entry.get("error")
+            self.file_items.append(file_item)
+        
+        # 按目标目录分组并排序，同一目录的移动集中执行
+        by_directory: Dict[str, List[FileItem]] = {}
+        for file_item in self.file_items:
+            if file_item.target_path:
+                by_directory.setdefault(os.path.dirname(file_item.target_path), []).append(file_item)
+        skipped_count = len(self.file_items) - sum(len(group) for group in by_directory.values())
+        
+        total_files = len(self.file_items) - skipped_count
+        max_workers = max(1, max_workers or config_manager.load_config().max_workers)
+        logger.info(f"开始执行移动计划 - 条目: {total_files}, 目标目录: {len(by_directory)}, "
+                    f"跳过: {skipped_count}, 并发数: {max_workers}")
+        
+        slots = threading.Semaphore(max_workers)
+        finished = 0
+        submitted = 0
+        
+        def move_group(directory: str, group: List[FileItem]):
+            nonlocal finished
+            try:
+                self._ensure_directory(directory)
+                for file_item in group:
+                    if not self.mover.exists(file_item.path):
+                        file_item.error = "源文件不存在"
+                        success = False
+                    elif self.mover.exists(file_item.target_path):
+                        file_item.error = "目标已存在"
+                        success = False
+                    else:
+                        success = self.move_file(file_item)
+                        file_item.completed = success
+                    
+                    with self._lock:
+                        if success:
+                            self.success_count += 1
+                        else:
+                            self.error_count += 1
+                        finished += 1
+                        done = finished
+                    
+                    if progress_callback:
+                        progress_callback(done / total_files * 100, f"移动中: {file_item.name}")
+            except Exception as e:
+                logger.error(f"移动目录组失败: {directory}, 错误: {e}")
+                with self._lock:
+                    for file_item in group:
+                        if not file_item.completed:
+                            file_item.error = file_item.error or str(e)
+                    remaining = sum(1 for file_item in group if not file_item.completed)
+                    self.error_count += remaining
+            finally:
+                slots.release()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for directory in sorted(by_directory):
+                if not self._acquire_slot(slots):
+                    break
+                executor.submit(move_group, directory, by_directory[directory])
+                submitted += len(by_directory[directory])
+        self.mover.close()
+        
+        self.update_archive_index(self.file_items)
+        duration = time.time() - self.start_time
+        result = {
+            "success": True,
+            "total_files": total_files,
+            "success_count": self.success_count,
+            "error_count": self.error_count,
+            "skipped_count": skipped_count,
+            "cancelled": self._cancel_event.is_set(),
+            "cancelled_count": total_files - submitted,
             "duration": duration,
             "file_items": self.file_items
         }
         
-        logger.info(f"处理完成 - 成功: {self.success_count}, 失败: {self.error_count}, 耗时: {duration:.2f}秒")
+        logger.info(f"移动计划执行完成 - 成功: {self.success_count}, 失败: {self.error_count}, "
+                    f"跳过: {skipped_count}, 耗时: {duration:.2f}秒")
         return result
     
     def get_file_list_display(self) -> str:
@@ -257,22 +1372,153 @@ class FileProcessor:
         Returns:
             处理摘要文本
         """
-        if not self.file_items:
+        total_files = self._run_total if self._streaming else len(self.file_items)
+        if not total_files:
             return "未处理文件"
         
-        total_time = sum(item.processing_time for item in self.file_items)
-        avg_time = total_time / len(self.file_items) if self.file_items else 0
+        if self._streaming:
+            total_time = self._streamed_time
+        else:
+            total_time = sum(item.processing_time for item in self.file_items)
+        avg_time = total_time / total_files
         
         summary = f"""
 处理摘要:
-- 总文件数: {len(self.file_items)}
+- 总文件数: {total_files}
 - 成功处理: {self.success_count}
 - 处理失败: {self.error_count}
 - 总耗时: {total_time:.2f}秒
 - 平均耗时: {avg_time:.2f}秒/文件
         """
         
-        return summary.strip()
+        summary = summary.strip()
+        
+        if self.collapsed_calls:
+            summary += f"\n- 合并调用: {self.collapsed_calls} 次（同名系列文件只分类一次）"
+        if self.coalesced_calls:
+            summary += f"\n- 共享并发请求: {self.coalesced_calls} 次（相同名称的并发请求只调用一次）"
+        
+        stats = self.similarity_stats
+        if stats.get("lookups"):
+            summary += (f"\n- 相似度复用: {stats['hits']}/{stats['lookups']} ({stats['hit_rate']:.1%})，"
+                        f"抽样复核 {stats['audits']} 次，不一致 {stats['audit_mismatches']} 次")
+        
+        if self.escalation_stats.get("escalations"):
+            summary += (f"\n- 低置信度复查: {self.escalation_stats['escalations']} 次，"
+                        f"改判 {self.escalation_stats['escalation_changes']} 次")
+        
+        if self.connection_stats.get("requests"):
+            summary += (f"\n- HTTP连接: 请求 {self.connection_stats['requests']} 次，"
+                        f"新建连接 {self.connection_stats['new_connections']} 次，"
+                        f"TLS握手 {self.connection_stats['tls_handshakes']} 次"
+                        f"（复用率 {self.connection_stats['reuse_rate']:.1%}）")
+        
+        if self.preflight and self.preflight["ok"]:
+            for api_type, probe in self.preflight["providers"].items():
+                summary += (f"\n- 预检 {api_type}: 预热连接 {probe['connections']} 条，"
+                            f"连接延迟 {probe['latency']:.2f}秒"
+                            + (f"，分类请求 {probe['calibration']:.2f}秒" if probe.get("calibration") else "")
+                            + f"（{self.preflight['duration']:.2f}秒内完成）")
+        
+        summary += self._budget_summary("\n- ")
+        summary += self._quarantine_summary("\n- ")
+        
+        return summary
+    
+    def _budget_summary(self, prefix: str) -> str:
+        """
+        获取token用量与费用的摘要行
+        
+        Args:
+            prefix: 每行的前缀
+            
+        Returns:
+            摘要文本，没有用量时返回空字符串
+        """
+        stats = self.budget_stats
+        if not stats.get("total_tokens") and not stats.get("rule_only") and not stats.get("refused"):
+            return ""
+        
+        text = (f"{prefix}Token用量: 输入 {stats['prompt_tokens']:,}，输出 {stats['completion_tokens']:,}，"
+                f"约¥{stats['cost']:.2f}")
+        if stats.get("projected_tokens"):
+            text += f"（运行初期估算 {stats['projected_tokens']:,}）"
+        if stats.get("rule_only") or stats.get("refused"):
+            text += (f"{prefix}预算降级: 规则引擎分类 {stats['rule_only']} 个，"
+                     f"预算用完未分类 {stats['refused']} 个")
+        return text
+    
+    def report_lines(self) -> Iterator[str]:
+        """
+        逐行生成处理报告
+        
+        Returns:
+            报告文本行（含换行符）
+        """
+        yield "文件分类处理结果\n"
+        yield "=" * 50 + "\n\n"
+        
+        yield f"源文件夹: {self.source_folder}\n"
+        yield f"处理时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        yield f"总文件数: {self._run_total if self._streaming else len(self.file_items)}\n"
+        yield f"成功处理: {self.success_count}\n"
+        yield f"处理失败: {self.error_count}\n"
+        if self.collapsed_calls:
+            yield f"合并调用: {self.collapsed_calls} 次\n"
+        if self.coalesced_calls:
+            yield f"共享并发请求: {self.coalesced_calls} 次\n"
+        
+        stats = self.similarity_stats
+        if stats.get("lookups"):
+            yield f"相似度复用: {stats['hits']}/{stats['lookups']} ({stats['hit_rate']:.1%})\n"
+            yield f"抽样复核: {stats['audits']} 次，不一致 {stats['audit_mismatches']} 次\n"
+            for sample in stats["mismatch_samples"]:
+                yield (f"  复核不一致: {sample['name']} (参照 {sample['matched_name']}) "
+                       f"复用 {sample['reused']} → 实际 {sample['actual']}\n")
+        if self.escalation_stats.get("escalations"):
+            yield (f"低置信度复查: {self.escalation_stats['escalations']} 次，"
+                   f"改判 {self.escalation_stats['escalation_changes']} 次\n")
+        for extra in (self._budget_summary("\n"), self._quarantine_summary("\n")):
+            if extra:
+                yield extra.lstrip("\n") + "\n"
+        yield "\n"
+        
+        yield "详细结果:\n"
+        yield "-" * 30 + "\n"
+        if self._streaming:
+            yield "边扫描边处理，各条目的结果已通过结果流逐条输出\n"
+        
+        for item in self.file_items:
+            yield f"文件名: {item.name}\n"
+            yield f"类型: {item.entry_type}\n"
+            yield f"分类结果: {item.classification_result or '未分类'}\n"
+            yield f"目标路径: {item.target_path or '无'}\n"
+            if item.confidence is not None:
+                yield f"置信度: {item.confidence:.2f} ({item.engine})\n"
+            yield f"处理时间: {item.processing_time:.2f}秒\n"
+            if item.error:
+                yield f"错误信息: {item.error}\n"
+            yield "\n"
+    
+    def _quarantine_summary(self, prefix: str) -> str:
+        """
+        获取超时隔离的摘要行
+        
+        Args:
+            prefix: 每行的前缀
+            
+        Returns:
+            摘要文本，没有超时条目时返回空字符串
+        """
+        stats = self.quarantine_stats
+        if not stats.get("quarantined"):
+            return ""
+        
+        text = (f"{prefix}超时隔离: {stats['quarantined']} 个条目超过截止时间，"
+                f"运行末尾重试成功 {stats['recovered']} 个，仍失败 {stats['failed']} 个")
+        if stats.get("p95") is not None:
+            text += f"（请求耗时P95 {stats['p95']:.1f}秒，截止时间 {stats['deadline']:.1f}秒）"
+        return text
     
     def export_results(self, output_file: str) -> bool:
         """
@@ -286,27 +1532,7 @@ class FileProcessor:
         """
         try:
             with open(output_file, "w", encoding="utf-8") as f:
-                f.write("文件分类处理结果\n")
-                f.write("=" * 50 + "\n\n")
-                
-                f.write(f"源文件夹: {self.source_folder}\n")
-                f.write(f"处理时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"总文件数: {len(self.file_items)}\n")
-                f.write(f"成功处理: {self.success_count}\n")
-                f.write(f"处理失败: {self.error_count}\n\n")
-                
-                f.write("详细结果:\n")
-                f.write("-" * 30 + "\n")
-                
-                for item in self.file_items:
-                    f.write(f"文件名: {item.name}\n")
-                    f.write(f"类型: {item.entry_type}\n")
-                    f.write(f"分类结果: {item.classification_result or '未分类'}\n")
-                    f.write(f"目标路径: {item.target_path or '无'}\n")
-                    f.write(f"处理时间: {item.processing_time:.2f}秒\n")
-                    if item.error:
-                        f.write(f"错误信息: {item.error}\n")
-                    f.write("\n")
+                f.writelines(self.report_lines())
             
             logger.info(f"结果导出成功: {output_file}")
             return True
@@ -0,0 +1,174 @@
+"""
+HTTP连接池模块
+为所有大模型客户端提供共享的HTTP连接池，切换API配置时保留已建立的连接
+"""
+
+import importlib.util
+import threading
+from typing import Optional, Dict, Any, Tuple
+from loguru import logger
+
+# httpx在首次创建客户端时才导入
+httpx = None
+_httpx_loaded = False
+
+
+def _load_httpx():
+    """
+    导入httpx
+
+    Returns:
+        httpx模块，缺失时返回None（由openai使用默认客户端）
+    """
+    global httpx, _httpx_loaded
+    if not _httpx_loaded:
+        _httpx_loaded = True
+        try:
+            import httpx as module
+            httpx = module
+        except ImportError:
+            httpx = None
+    return httpx
+
+
+class HttpPool:
+    """共享HTTP连接池"""
+
+    def __init__(self):
+        """初始化连接池（客户端在首次使用时创建）"""
+        self._lock = threading.Lock()
+        self._settings: Optional[Tuple] = None
+        self._client = None
+        self._async_client = None
+        self._local_client = None
+        self._local_async_client = None
+
+        # 统计信息
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+
+    @staticmethod
+    def _http2_available() -> bool:
+        """是否安装了HTTP/2支持（h2）"""
+        return importlib.util.find_spec("h2") is not None
+
+    def _settings_from(self, app_config) -> Tuple:
+        """提取影响连接池的配置项"""
+        return (
+            app_config.http_max_connections,
+            app_config.http_keepalive_connections,
+            app_config.http_keepalive_expiry,
+            app_config.http2 and self._http2_available(),
+            app_config.http_connect_timeout,
+            app_config.timeout
+        )
+
+    def _trace(self, event_name: str, info: Dict[str, Any]):
+        """底层连接事件回调，统计新建连接和TLS握手"""
+        if event_name == "connection.connect_tcp.started":
+            with self._lock:
+                self.new_connections += 1
+        elif event_name == "connection.start_tls.started":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def _on_request(self, request):
+        """请求事件钩子，登记请求并挂载连接事件回调"""
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _on_request_async(self, request):
+        """异步请求事件钩子"""
+        self._on_request(request)
+
+    def _build(self, settings: Tuple):
+        """按配置创建同步和异步客户端（调用方持有锁）"""
+        max_connections, keepalive_connections, keepalive_expiry, http2, connect_timeout, read_timeout = settings
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+        # 旧客户端上可能仍有进行中的请求，交给垃圾回收关闭
+        self._client = httpx.Client(limits=limits, timeout=timeout, http2=http2,
+                                    event_hooks={"request": [self._on_request]})
+        self._async_client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2,
+                                               event_hooks={"request": [self._on_request_async]})
+        # 本机服务不读取代理环境变量，请求不会绕到代理服务器
+        self._local_client = httpx.Client(limits=limits, timeout=timeout, trust_env=False,
+                                          event_hooks={"request": [self._on_request]})
+        self._local_async_client = httpx.AsyncClient(limits=limits, timeout=timeout, trust_env=False,
+                                                     event_hooks={"request": [self._on_request_async]})
+        self._settings = settings
+        logger.info(f"HTTP连接池已创建 - 最大连接: {max_connections}, 保活连接: {keepalive_connections}, "
+                    f"保活时间: {keepalive_expiry}秒, HTTP/2: {'是' if http2 else '否'}")
+
+    def _ensure(self, app_config):
+        """确保客户端与当前配置一致"""
+        settings = self._settings_from(app_config)
+        with self._lock:
+            if self._settings != settings:
+                self._build(settings)
+
+    def client(self, app_config, local: bool = False):
+        """
+        获取共享的同步HTTP客户端
+
+        Args:
+            app_config: 应用配置
+            local: 是否用于本机服务（不经过代理）
+
+        Returns:
+            httpx.Client，httpx不可用时返回None
+        """
+        if _load_httpx() is None:
+            return None
+        self._ensure(app_config)
+        return self._local_client if local else self._client
+
+    def async_client(self, app_config, local: bool = False):
+        """
+        获取共享的异步HTTP客户端
+
+        Args:
+            app_config: 应用配置
+            local: 是否用于本机服务（不经过代理）
+
+        Returns:
+            httpx.AsyncClient，httpx不可用时返回None
+        """
+        if _load_httpx() is None:
+            return None
+        self._ensure(app_config)
+        return self._local_async_client if local else self._async_client
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取连接复用统计
+
+        Returns:
+            请求数、新建连接数、TLS握手数和连接复用率
+        """
+        with self._lock:
+            reused = max(0, self.requests - self.new_connections)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reuse_rate": reused / self.requests if self.requests else 0.0
+            }
+
+    def reset_stats(self):
+        """重置统计信息"""
+        with self._lock:
+            self.requests = 0
+            self.new_connections = 0
+            self.tls_handshakes = 0
+
+
+# 全局HTTP连接池实例
+http_pool = HttpPool()
@@ -41,7 +41,8 @@ class LogManager:
             rotation="10 MB",  # 日志文件大小超过10MB时轮转
             retention="30 days",  # 保留30天的日志
             compression="zip",  # 压缩旧日志文件
-            encoding="utf-8"
+            encoding="utf-8",
+            delay=True  # 首次写入时才创建日志文件，不拖慢启动
         )
         
         # 添加错误日志文件处理器
@@ -53,7 +54,8 @@ class LogManager:
             rotation="5 MB",
             retention="60 days",
             compression="zip",
-            encoding="utf-8"
+            encoding="utf-8",
+            delay=True  # 首次写入时才创建日志文件，不拖慢启动
         )
     
     def get_logger(self):
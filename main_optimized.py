@@ -14,9 +14,11 @@ from config import config_manager
 from logger import log_manager
 from api_service import api_service
 from file_processor import file_processor
+from profiler import run_profiler
+from events import CLASSIFIED, MOVED, FAILED
 from ui_components import (
     ModernButton, APIConfigDialog, ClassificationRulesDialog, 
-    ProgressDialog, HelpDialog
+    ProgressDialog, HelpDialog, ProgressThrottler, VirtualFileList
 )
 
 # 获取日志记录器
@@ -40,8 +42,8 @@ class FileClassifierApp:
         self.create_main_ui()
         self.create_status_bar()
         
-        # 加载配置
-        self.load_configuration()
+        # 窗口绘制完成后再加载配置和规则，大模型客户端在首次调用时创建
+        self.root.after_idle(self.load_configuration)
         
         logger.info("应用程序初始化完成")
     
@@ -67,6 +69,10 @@ class FileClassifierApp:
         self.source_folder = ""
         self.classification_rules = ""
         self.progress_dialog: Optional[ProgressDialog] = None
+        self.progress_throttler: Optional[ProgressThrottler] = None
+        self.event_subscription = None
+        # 当前运行的处理器（单进程为file_processor，分片时为ShardedRunner）
+        self.active_runner = file_processor
         
         # 版本信息
         self.version_info = {
@@ -98,6 +104,9 @@ class FileClassifierApp:
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="打开文件夹", command=self.choose_folder)
         file_menu.add_command(label="开始分类", command=self.start_classification)
+        file_menu.add_command(label="生成移动计划", command=self.create_move_plan)
+        file_menu.add_command(label="执行移动计划", command=self.apply_move_plan)
+        file_menu.add_command(label="重新分类归档", command=self.reclassify_archive)
         file_menu.add_separator()
         file_menu.add_command(label="导出结果", command=self.export_results)
         file_menu.add_separator()
@@ -177,20 +186,10 @@ class FileClassifierApp:
         list_frame = ttk.LabelFrame(parent, text="文件列表", padding="5")
         list_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
         
-        # 滚动条
-        scrollbar = ttk.Scrollbar(list_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # 文件显示区域
-        self.file_display = tk.Text(list_frame, yscrollcommand=scrollbar.set, 
-                                   wrap=tk.WORD, font=("微软雅黑", 10))
-        self.file_display.pack(fill=tk.BOTH, expand=True)
-        scrollbar.config(command=self.file_display.yview)
-        
-        # 配置文本标签
-        self.file_display.tag_configure("success", foreground="green")
-        self.file_display.tag_configure("error", foreground="red")
-        self.file_display.tag_configure("info", foreground="blue")
+        # 虚拟化文件列表（分页渲染，避免大量条目时界面卡顿）
+        config = config_manager.load_config()
+        self.file_list = VirtualFileList(list_frame, page_size=config.file_list_page_size)
+        self.file_list.pack(fill=tk.BOTH, expand=True)
     
     def create_progress_bar(self, parent):
         """创建进度条"""
@@ -213,6 +212,7 @@ class FileClassifierApp:
         try:
             # 加载应用配置
             config = config_manager.load_config()
+            api_service.update_config(config.api_config)
             
             # 加载分类规则
             self.classification_rules = config_manager.load_classification_rules()
@@ -242,17 +242,15 @@ class FileClassifierApp:
     
     def update_file_display(self):
         """更新文件列表显示"""
-        self.file_display.delete(1.0, tk.END)
-        
-        if not file_processor.file_items:
-            self.file_display.insert(tk.END, "未加载文件")
-            return
-        
-        for item in file_processor.file_items:
-            self.file_display.insert(tk.END, f"{item.entry_type}: {item.name}\n")
+        self.file_list.set_items(file_processor.file_items)
     
-    def start_classification(self):
-        """开始分类"""
+    def start_classification(self, plan_file: str = ""):
+        """
+        开始分类
+        
+        Args:
+            plan_file: 计划文件路径，提供时只生成移动计划，不移动文件
+        """
         if not self.source_folder:
             messagebox.showwarning("提示", "请先选择需要分类的文件夹")
             return
@@ -263,28 +261,124 @@ class FileClassifierApp:
         
         # 检查API配置
         api_config = config_manager.get_api_config()
-        if not api_config.doubao_api_key and not api_config.deepseek_api_key:
+        if not api_config.has_credentials():
             messagebox.showerror("配置错误", "请先配置API密钥")
             return
         
+        self._start_progress("生成移动计划中" if plan_file else "文件分类中")
+        
         # 在新线程中执行分类
-        threading.Thread(target=self._run_classification, daemon=True).start()
+        threading.Thread(target=self._run_classification, args=(plan_file,), daemon=True).start()
+    
+    def create_move_plan(self):
+        """生成移动计划"""
+        plan_file = filedialog.asksaveasfilename(
+            title="保存移动计划",
+            defaultextension=".jsonl",
+            filetypes=[("移动计划", "*.jsonl"), ("所有文件", "*.*")]
+        )
+        if plan_file:
+            self.start_classification(plan_file)
+    
+    def apply_move_plan(self):
+        """执行已确认的移动计划"""
+        plan_file = filedialog.askopenfilename(
+            title="选择移动计划",
+            filetypes=[("移动计划", "*.jsonl"), ("所有文件", "*.*")]
+        )
+        if not plan_file:
+            return
+        
+        self._start_progress("执行移动计划中")
+        
+        def run():
+            try:
+                self.active_runner = file_processor
+                result = file_processor.apply_plan(plan_file, self.progress_throttler.push)
+                self.root.after(0, lambda: self._classification_complete(result))
+            except Exception as e:
+                logger.error(f"执行移动计划发生错误: {e}")
+                self.root.after(0, lambda: self._classification_error(str(e)))
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def reclassify_archive(self):
+        """规则变化后重新分类已归档的文件夹（只处理受影响的条目）"""
+        archive_folder = filedialog.askdirectory(title="选择已归档的文件夹")
+        if not archive_folder:
+            return
+        
+        api_config = config_manager.get_api_config()
+        if not api_config.has_credentials():
+            messagebox.showerror("配置错误", "请先配置API密钥")
+            return
+        
+        self._start_progress("重新分类归档中")
+        
+        def run():
+            try:
+                from reclassifier import ArchiveReclassifier
+                
+                self.active_runner = file_processor
+                result = ArchiveReclassifier(file_processor).run(
+                    archive_folder,
+                    self.classification_rules,
+                    self.progress_throttler.push
+                )
+                self.root.after(0, lambda: self._classification_complete(result))
+            except Exception as e:
+                logger.error(f"重新分类归档发生错误: {e}")
+                self.root.after(0, lambda: self._classification_error(str(e)))
+        
+        threading.Thread(target=run, daemon=True).start()
     
-    def _run_classification(self):
-        """执行分类任务"""
+    def _start_progress(self, title: str):
+        """在界面线程中创建进度对话框和进度合并通道"""
+        self.progress_dialog = ProgressDialog(self.root, title,
+                                              on_pause=self._toggle_pause,
+                                              on_cancel=self._cancel_classification)
+        config = config_manager.load_config()
+        self.progress_throttler = ProgressThrottler(self.root, self._update_progress,
+                                                    fps=config.ui_refresh_fps)
+        self.progress_throttler.start()
+        # 条目结果按批转到界面线程，每批只调度一次界面更新
+        self.event_subscription = file_processor.events.subscribe(
+            lambda events: self.root.after(0, self.file_list.update_items, [event.item for event in events]),
+            types=(CLASSIFIED, MOVED, FAILED))
+    
+    def _run_classification(self, plan_file: str = ""):
+        """
+        执行分类任务
+        
+        Args:
+            plan_file: 计划文件路径，提供时只生成移动计划
+        """
         try:
-            # 创建进度对话框
-            self.progress_dialog = ProgressDialog(self.root, "文件分类中")
-            
-            def progress_callback(progress: float, status: str):
-                """进度回调函数"""
-                self.root.after(0, lambda: self._update_progress(progress, status))
-            
-            # 执行分类
-            result = file_processor.process_all_files(
-                self.classification_rules, 
-                progress_callback
-            )
+            # 执行分类（进度只写入合并通道，由界面线程按固定帧率读取）
+            config = config_manager.load_config()
+            with run_profiler.session("gui"):
+                if plan_file:
+                    self.active_runner = file_processor
+                    result = file_processor.create_plan(
+                        self.classification_rules,
+                        plan_file,
+                        self.progress_throttler.push
+                    )
+                elif config.shard_workers > 1:
+                    from sharded_runner import ShardedRunner
+                    
+                    self.active_runner = ShardedRunner(config.shard_workers, config.shard_by)
+                    result = self.active_runner.run(
+                        file_processor,
+                        self.classification_rules,
+                        self.progress_throttler.push
+                    )
+                else:
+                    self.active_runner = file_processor
+                    result = file_processor.process_all_files(
+                        self.classification_rules, 
+                        self.progress_throttler.push
+                    )
             
             # 完成处理
             self.root.after(0, lambda: self._classification_complete(result))
@@ -293,6 +387,22 @@ class FileClassifierApp:
             logger.error(f"分类过程发生错误: {e}")
             self.root.after(0, lambda: self._classification_error(str(e)))
     
+    def _toggle_pause(self) -> bool:
+        """暂停/继续分类，返回切换后是否处于暂停状态"""
+        if self.active_runner.is_paused():
+            self.active_runner.resume()
+            self.update_status("分类已继续")
+            return False
+        
+        self.active_runner.pause()
+        self.update_status("分类已暂停")
+        return True
+    
+    def _cancel_classification(self):
+        """取消分类"""
+        self.active_runner.cancel()
+        self.update_status("正在取消分类...")
+    
     def _update_progress(self, progress: float, status: str):
         """更新进度"""
         if self.progress_dialog:
@@ -301,8 +411,21 @@ class FileClassifierApp:
         self.progress_var.set(progress)
         self.update_status(status)
     
+    def _stop_progress_throttler(self):
+        """停止进度合并通道"""
+        if self.progress_throttler:
+            self.progress_throttler.stop()
+            self.progress_throttler = None
+        if self.event_subscription:
+            file_processor.events.unsubscribe(self.event_subscription, flush=False)
+            self.event_subscription = None
+    
     def _classification_complete(self, result: dict):
         """分类完成处理"""
+        self._stop_progress_throttler()
+        # 执行计划和重新分类会替换处理器的条目列表，各类运行结束后统一同步
+        self.file_list.sync(file_processor.file_items)
+        
         if self.progress_dialog:
             self.progress_dialog.close()
             self.progress_dialog = None
@@ -314,7 +437,23 @@ class FileClassifierApp:
             total_count = result["total_files"]
             duration = result["duration"]
             
-            message = f"分类完成！成功处理{success_count}个，{total_count-success_count}个失败，耗时{duration:.2f}秒"
+            if result.get("plan_file") and not result.get("cancelled"):
+                message = (f"移动计划已生成！{success_count}个已分类，{total_count-success_count}个失败，"
+                           f"耗时{duration:.2f}秒\n计划文件: {result['plan_file']}")
+            elif "affected_count" in result and not result.get("cancelled"):
+                message = (f"重新分类完成！已归档{result['scanned_count']}个，受规则变化影响{result['affected_count']}个，"
+                           f"移动{result['moved_count']}个，{result['error_count']}个失败，耗时{duration:.2f}秒")
+            elif "skipped_count" in result and not result.get("cancelled"):
+                message = (f"移动完成！成功移动{success_count}个，{result['error_count']}个失败，"
+                           f"{result['skipped_count']}个无分类结果已跳过，耗时{duration:.2f}秒")
+            elif result.get("cancelled"):
+                reason = "预算已用完" if result.get("budget_exhausted") else "分类已取消"
+                message = (f"{reason}！成功处理{success_count}个，{result['error_count']}个失败，"
+                           f"{result['cancelled_count']}个未处理，耗时{duration:.2f}秒")
+                if result.get("report_file"):
+                    message += f"\n处理报告: {result['report_file']}"
+            else:
+                message = f"分类完成！成功处理{success_count}个，{total_count-success_count}个失败，耗时{duration:.2f}秒"
             self.update_status(message)
             
             messagebox.showinfo("分类完成", message)
@@ -327,6 +466,9 @@ class FileClassifierApp:
     
     def _classification_error(self, error: str):
         """分类错误处理"""
+        self._stop_progress_throttler()
+        self.file_list.sync(file_processor.file_items)
+        
         if self.progress_dialog:
             self.progress_dialog.close()
             self.progress_dialog = None
@@ -421,7 +563,7 @@ Q: 支持哪些文件类型？
 A: 支持所有文件类型，分类基于文件名和内容关键词
 
 Q: 分类过程中可以中断吗？
-A: 可以，但建议等待当前文件处理完成后再中断"""
+A: 可以，在进度窗口中点击「暂停」或「取消」，进行中的文件处理完成后才会停止，不会中断移动；取消后未处理的文件保持原位，重新开始分类即可继续"""
         
         dialog = HelpDialog(self.root, "常见问题", faq_content)
         dialog.show()
@@ -0,0 +1,137 @@
+"""
+目录句柄移动模块
+源目录和目标目录各只打开一次并缓存句柄，之后每个条目以相对名称调用
+os.rename(src_dir_fd=, dst_dir_fd=)，网络文件系统（SMB/NFS）上不再为每个条目重新解析完整路径；
+平台不支持dir_fd（如Windows）、跨设备或目标已存在时回退到shutil.move，行为与之一致
+"""
+
+import errno
+import os
+import shutil
+import threading
+from typing import Dict, Optional
+from loguru import logger
+
+# 平台是否支持以目录句柄为基准的重命名
+SUPPORTS_DIR_FD = (os.rename in os.supports_dir_fd and os.stat in os.supports_dir_fd
+                   and hasattr(os, "O_DIRECTORY"))
+
+# 最多缓存的目录句柄数（超出后新目录不再缓存，每次移动临时打开）
+HANDLE_LIMIT = 256
+
+
+class MoveEngine:
+    """基于目录句柄的移动"""
+
+    def __init__(self, enabled: bool = True, handle_limit: int = HANDLE_LIMIT):
+        """
+        初始化移动引擎
+
+        Args:
+            enabled: 是否使用目录句柄（平台不支持时始终回退到shutil.move）
+            handle_limit: 最多缓存的目录句柄数
+        """
+        self.enabled = enabled
+        self.handle_limit = handle_limit
+        self.renames = 0
+        self.fallbacks = 0
+        self._handles: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否使用目录句柄"""
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool):
+        self._enabled = bool(value) and SUPPORTS_DIR_FD
+
+    def _open(self, directory: str) -> Optional[int]:
+        """
+        获取目录句柄（缓存中没有时打开）
+
+        Returns:
+            句柄，缓存已满时返回None（由调用方回退到完整路径）
+        """
+        handle = self._handles.get(directory)
+        if handle is not None:
+            return handle
+        with self._lock:
+            handle = self._handles.get(directory)
+            if handle is None and len(self._handles) < self.handle_limit:
+                handle = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                self._handles[directory] = handle
+        return handle
+
+    def _lexists(self, name: str, handle: int) -> bool:
+        """以目录句柄为基准判断条目是否存在（不跟随符号链接）"""
+        try:
+            os.stat(name, dir_fd=handle, follow_symlinks=False)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def exists(self, path: str) -> bool:
+        """
+        判断路径是否存在（目录句柄已缓存时只解析最后一级名称）
+
+        Args:
+            path: 路径
+
+        Returns:
+            是否存在
+        """
+        if self.enabled:
+            try:
+                handle = self._open(os.path.dirname(path))
+            except OSError:
+                return False
+            if handle is not None:
+                return self._lexists(os.path.basename(path), handle)
+        return os.path.exists(path)
+
+    def move(self, source: str, target: str):
+        """
+        移动文件或文件夹
+
+        Args:
+            source: 源路径
+            target: 目标路径
+
+        Raises:
+            OSError: 移动失败
+        """
+        if self.enabled:
+            source_handle = self._open(os.path.dirname(source))
+            target_handle = self._open(os.path.dirname(target))
+            target_name = os.path.basename(target)
+            # 目标已存在时保持shutil.move的语义（目标为文件夹时移入其中）
+            if (source_handle is not None and target_handle is not None
+                    and not self._lexists(target_name, target_handle)):
+                try:
+                    os.rename(os.path.basename(source), target_name,
+                              src_dir_fd=source_handle, dst_dir_fd=target_handle)
+                    self.renames += 1
+                    return
+                except OSError as e:
+                    # 跨设备需要复制，交给shutil.move
+                    if e.errno != errno.EXDEV:
+                        raise
+        self.fallbacks += 1
+        shutil.move(source, target)
+
+    def close(self):
+        """关闭缓存的目录句柄（一次运行结束后调用，下次使用时重新打开）"""
+        with self._lock:
+            handles, self._handles = self._handles, {}
+        for handle in handles.values():
+            try:
+                os.close(handle)
+            except OSError as e:
+                logger.debug(f"关闭目录句柄失败: {e}")
+        if self.renames or self.fallbacks:
+            logger.debug(f"目录句柄移动: {self.renames} 个，回退到完整路径: {self.fallbacks} 个，"
+                         f"目录句柄: {len(handles)} 个")
+        self.renames = 0
+        self.fallbacks = 0
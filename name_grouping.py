@@ -0,0 +1,71 @@
+"""
+文件名分组模块
+去除日期、序号、扩展名和副本标记后按名称主干分组，同组只需分类一次
+"""
+
+import os
+import re
+from typing import List, Dict, Tuple
+
+
+# 副本标记：“副本”“复件”“copy”以及结尾的“(1)”“（2）”等
+_COPY_PATTERN = re.compile(r"(\s*[-_－]?\s*(副本|复件|拷贝|copy)\s*)|([（(]\s*\d+\s*[)）])", re.IGNORECASE)
+# 日期：2024年3月5日、2024-03-05、2024.3、20240305 等
+_DATE_PATTERN = re.compile(
+    r"(19|20)\d{2}\s*[年./\-_]\s*\d{1,2}\s*(月\s*(\d{1,2}\s*[日号]?)?|[./\-_]\s*\d{1,2}(?!\d))?"
+    r"|(19|20)\d{2}(0[1-9]|1[0-2])([0-2]\d|3[01])?(?!\d)"
+    r"|(19|20)\d{2}\s*年度?"
+)
+# 序号：第3期、No.12、_001 等剩余数字
+_SERIAL_PATTERN = re.compile(r"第\s*\d+\s*[期号份册次批页卷]?|no\.?\s*\d+|\d+", re.IGNORECASE)
+# 分隔符
+_SEPARATOR_PATTERN = re.compile(r"[\s_\-－—.·,，、#]+")
+
+
+def normalize_stem(name: str, entry_type: str = "文件") -> str:
+    """
+    提取文件名主干
+
+    Args:
+        name: 文件名
+        entry_type: 条目类型（文件/文件夹）
+
+    Returns:
+        去除扩展名、副本标记、日期和序号后的名称主干
+    """
+    stem = os.path.splitext(name)[0] if entry_type == "文件" else name
+    stem = _COPY_PATTERN.sub(" ", stem)
+    stem = _DATE_PATTERN.sub(" ", stem)
+    stem = _SERIAL_PATTERN.sub(" ", stem)
+    stem = _SEPARATOR_PATTERN.sub(" ", stem)
+    stem = re.sub(r"[（(]\s*[)）]", " ", stem)
+    return " ".join(stem.lower().split())
+
+
+def group_items(items: list) -> List[list]:
+    """
+    按名称主干分组
+
+    Args:
+        items: 文件项列表（需具备name和entry_type属性）
+
+    Returns:
+        分组列表，保持首次出现的顺序，每组第一个条目为代表
+    """
+    groups: Dict[Tuple[str, str], list] = {}
+    ordered: List[list] = []
+
+    for item in items:
+        stem = normalize_stem(item.name, item.entry_type)
+        if not stem:
+            # 纯数字等无法提取主干的名称单独成组
+            ordered.append([item])
+            continue
+
+        key = (item.entry_type, stem)
+        if key not in groups:
+            groups[key] = []
+            ordered.append(groups[key])
+        groups[key].append(item)
+
+    return ordered
@@ -0,0 +1,235 @@
+"""
+性能剖析模块
+在一次运行期间以固定间隔采样所有线程的调用栈，并定时记录tracemalloc内存快照，
+每个样本和快照都标记所处的处理阶段；结束后在日志目录输出火焰图格式的调用栈文件和内存分配报告
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import List, Dict, Optional, Tuple, Iterator
+from loguru import logger
+
+# 调用栈采样间隔(秒)
+SAMPLE_INTERVAL = 0.005
+
+# 内存快照间隔(秒)，阶段切换时另外记录一次
+SNAPSHOT_INTERVAL = 10.0
+
+# 内存报告中列出的分配位置数
+TOP_ALLOCATIONS = 30
+
+# 单个调用栈最多保留的帧数
+MAX_STACK_DEPTH = 128
+
+# 内存报告中排除剖析器自身和tracemalloc的分配
+_OWN_FILES = (os.path.normcase(__file__), os.path.normcase(tracemalloc.__file__))
+
+
+def _frame_label(frame) -> str:
+    """调用栈帧的显示名称（火焰图格式中分号是分隔符，需要替换）"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _statistics(snapshot: tracemalloc.Snapshot) -> List[tracemalloc.Statistic]:
+    """按代码行统计快照中的分配（排除剖析器自身）"""
+    return [stat for stat in snapshot.statistics("lineno")
+            if os.path.normcase(stat.traceback[0].filename) not in _OWN_FILES]
+
+
+class RunProfiler:
+    """运行期间的CPU采样与内存快照"""
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL, snapshot_interval: float = SNAPSHOT_INTERVAL,
+                 top: int = TOP_ALLOCATIONS):
+        """
+        初始化剖析器（默认关闭，由 --profile 开启）
+
+        Args:
+            sample_interval: 调用栈采样间隔(秒)
+            snapshot_interval: 内存快照间隔(秒)
+            top: 内存报告中列出的分配位置数
+        """
+        self.enabled = False
+        self.sample_interval = sample_interval
+        self.snapshot_interval = snapshot_interval
+        self.top = top
+        self.outputs: List[str] = []
+        self._stage = "idle"
+        self._stop = threading.Event()
+        self._active = False
+        self._samples: Counter = Counter()
+        self._stage_samples: Counter = Counter()
+        self._stage_seconds: Counter = Counter()
+        self._stage_since = 0.0
+        self._timeline: List[Tuple[float, str, int, int]] = []
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._stage_snapshots: Dict[str, tracemalloc.Snapshot] = {}
+        self._start_time = 0.0
+
+    def stage(self, name: str):
+        """
+        标记当前所处的处理阶段（未在剖析时只记录名称）
+
+        Args:
+            name: 阶段名称
+        """
+        if name != self._stage:
+            if self._active:
+                # 在切换处记录即将结束的阶段的快照（每次运行只有几次阶段切换）
+                now = time.time()
+                self._stage_seconds[self._stage] += now - self._stage_since
+                self._stage_since = now
+                self._snapshot(self._stage)
+            self._stage = name
+
+    def _sample(self, own_ident: int):
+        """采样一次所有线程的调用栈"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stage = self._stage
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self._samples[(stage, names.get(ident, str(ident)), tuple(stack))] += 1
+        self._stage_samples[stage] += 1
+
+    def _snapshot(self, stage: str):
+        """记录一次内存快照"""
+        current, peak = tracemalloc.get_traced_memory()
+        self._timeline.append((time.time() - self._start_time, stage, current, peak))
+        # 每个阶段只保留最后一个快照，避免长时间运行时快照本身占用大量内存
+        self._stage_snapshots[stage] = tracemalloc.take_snapshot()
+
+    def _run(self):
+        """采样线程"""
+        own_ident = threading.get_ident()
+        next_snapshot = time.time() + self.snapshot_interval
+        while not self._stop.wait(self.sample_interval):
+            self._sample(own_ident)
+            if time.time() >= next_snapshot:
+                self._snapshot(self._stage)
+                next_snapshot = time.time() + self.snapshot_interval
+
+    @contextlib.contextmanager
+    def session(self, label: str) -> Iterator["RunProfiler"]:
+        """
+        在代码块运行期间剖析（未开启时不做任何事）
+
+        Args:
+            label: 运行名称（用于输出文件名）
+
+        Yields:
+            剖析器自身
+        """
+        if not self.enabled or self._active:
+            yield self
+            return
+
+        self._samples.clear()
+        self._stage_samples.clear()
+        self._stage_seconds.clear()
+        self._timeline = []
+        self._stage_snapshots = {}
+        self._stop.clear()
+        self._start_time = self._stage_since = time.time()
+        tracemalloc.start()
+        self._baseline = tracemalloc.take_snapshot()
+        self._active = True
+        sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+        sampler.start()
+        logger.info(f"性能剖析已开始 - 采样间隔: {self.sample_interval * 1000:.0f}毫秒, "
+                    f"内存快照间隔: {self.snapshot_interval:g}秒")
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            sampler.join()
+            self._stage_seconds[self._stage] += time.time() - self._stage_since
+            self._snapshot(self._stage)
+            self._active = False
+            try:
+                self.outputs = self._write(label)
+            finally:
+                tracemalloc.stop()
+                self._baseline = None
+                self._stage_snapshots = {}
+
+    def _write(self, label: str) -> List[str]:
+        """
+        输出剖析结果
+
+        Returns:
+            输出文件路径
+        """
+        from config import config_manager
+
+        prefix = f"profile_{label}_{time.strftime('%Y%m%d_%H%M%S')}"
+        folded_file = str(config_manager.get_log_file_path(f"{prefix}_cpu.folded"))
+        memory_file = str(config_manager.get_log_file_path(f"{prefix}_memory.txt"))
+
+        with open(folded_file, "w", encoding="utf-8") as f:
+            f.writelines(self.folded_lines())
+        with open(memory_file, "w", encoding="utf-8") as f:
+            f.writelines(self.memory_report_lines())
+
+        logger.info(f"性能剖析已保存 - 调用栈: {folded_file}, 内存: {memory_file}")
+        return [folded_file, memory_file]
+
+    def folded_lines(self) -> Iterator[str]:
+        """
+        生成火焰图格式（folded stacks）的调用栈，可直接用于flamegraph.pl或speedscope
+
+        Returns:
+            “阶段;线程;帧1;帧2... 样本数”行
+        """
+        for (stage, thread_name, stack), count in self._samples.most_common():
+            yield f"{stage};{thread_name.replace(';', ',')};{';'.join(stack)} {count}\n"
+
+    def memory_report_lines(self) -> Iterator[str]:
+        """
+        生成内存分配报告
+
+        Returns:
+            报告行（各阶段耗时与采样次数、内存时间线、各阶段结束时分配最多的位置及相对开始时的增长）
+        """
+        total_seconds = sum(self._stage_seconds.values()) or 1.0
+        yield "性能剖析报告\n"
+        yield "=" * 50 + "\n\n"
+        yield f"总耗时: {total_seconds:.1f} 秒，采样间隔 {self.sample_interval * 1000:.0f} 毫秒" \
+              f"（记录内存快照期间暂停采样）\n"
+        for stage, seconds in self._stage_seconds.most_common():
+            if seconds < 0.05 and not self._stage_samples[stage]:
+                continue
+            yield f"  {stage}: {seconds:.1f} 秒 ({seconds / total_seconds:.1%})，" \
+                  f"采样 {self._stage_samples[stage]} 次\n"
+
+        yield "\n内存时间线（tracemalloc统计的Python分配）:\n"
+        for elapsed, stage, current, peak in self._timeline:
+            yield f"  {elapsed:8.1f}秒  {stage:<12} 当前 {current / 1024 / 1024:8.1f} MB  峰值 {peak / 1024 / 1024:8.1f} MB\n"
+
+        # 快照中的条目很多时统计较慢，每个快照只统计一次，增长量按位置与开始时的统计相减
+        baseline = {stat.traceback: stat.size for stat in _statistics(self._baseline)} if self._baseline else {}
+        for stage, snapshot in self._stage_snapshots.items():
+            stats = _statistics(snapshot)
+            yield f"\n阶段 {stage} 结束时分配最多的 {self.top} 个位置:\n"
+            for stat in stats[:self.top]:
+                yield f"  {stat}\n"
+            yield f"\n阶段 {stage} 结束时相对开始增长最多的 {self.top} 个位置:\n"
+            growth = sorted(stats, key=lambda stat: stat.size - baseline.get(stat.traceback, 0), reverse=True)
+            for stat in growth[:self.top]:
+                yield f"  {stat.traceback}: +{(stat.size - baseline.get(stat.traceback, 0)) / 1024:.1f} KiB，" \
+                      f"当前 {stat.size / 1024:.1f} KiB，{stat.count} 个对象\n"
+
+
+# 全局剖析器实例
+run_profiler = RunProfiler()
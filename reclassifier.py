@@ -0,0 +1,207 @@
+"""
+归档重新分类模块
+规则变化后遍历已归档的分类目录，只重新分类受规则差异影响的条目并批量移动
+"""
+
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from loguru import logger
+from archive_index import ArchiveIndex
+from compiled_rules import RulesDiff, compile_rules
+from rule_engine import rule_engine
+from file_processor import FileItem
+from buckets import is_bucket_name
+
+# 分类目录中的保管期限
+PERIODS = ("永久", "长期", "短期")
+
+
+def scan_archive(archive_folder: str) -> List[Tuple[str, str, str, str]]:
+    """
+    遍历已归档的分类目录
+
+    Args:
+        archive_folder: 归档文件夹
+
+    Returns:
+        [(条目名称, 条目路径, 保管期限, 部门)]，分桶子目录中的条目按所属部门返回
+    """
+    entries = []
+    for period in PERIODS:
+        period_path = os.path.join(archive_folder, period)
+        if not os.path.isdir(period_path):
+            continue
+        for department in sorted(os.listdir(period_path)):
+            department_path = os.path.join(period_path, department)
+            if not os.path.isdir(department_path):
+                continue
+            for name in sorted(os.listdir(department_path)):
+                path = os.path.join(department_path, name)
+                if is_bucket_name(name) and os.path.isdir(path):
+                    for bucketed in sorted(os.listdir(path)):
+                        entries.append((bucketed, os.path.join(path, bucketed), period, department))
+                else:
+                    entries.append((name, path, period, department))
+    return entries
+
+
+class ArchiveReclassifier:
+    """已归档条目的增量重新分类"""
+
+    def __init__(self, processor):
+        """
+        初始化重新分类器
+
+        Args:
+            processor: 文件处理器（重新分类的条目由它分类和移动）
+        """
+        self.processor = processor
+        self._diffs: Dict[str, Optional[RulesDiff]] = {}
+        # 因规则只改了措辞而未重新分类的条目数
+        self.text_only_skipped = 0
+
+    def _diff_for(self, version: Optional[str], classification_rules: str) -> Optional[RulesDiff]:
+        """
+        获取某个规则版本与当前规则的差异（按版本缓存）
+
+        Returns:
+            规则差异，旧版本未知时返回None
+        """
+        if not version:
+            return None
+        if version not in self._diffs:
+            old_rules = self.processor.rules_history().load(version)
+            diff = (RulesDiff(compile_rules(old_rules), compile_rules(classification_rules))
+                    if old_rules is not None else None)
+            if diff is not None and diff.text_only:
+                logger.info(f"规则版本 {version} → {diff.new_hash} 只改了措辞（部门和关键词未变），"
+                            f"按该版本归档的条目不重新分类（需要时使用全量重新分类）")
+            self._diffs[version] = diff
+        return self._diffs[version]
+
+    def is_affected(self, name: str, entry_type: str, period: str, department: str,
+                    record: Optional[Dict[str, Any]], classification_rules: str) -> bool:
+        """
+        判断已归档条目是否需要重新分类
+
+        有索引记录且能找到当时的规则版本时按规则差异判断；否则只在部门已不存在，
+        或本地规则引擎按新规则给出了不同判断时重新分类。
+
+        Args:
+            name: 条目名称
+            entry_type: 条目类型（文件/文件夹）
+            period: 当前保管期限
+            department: 当前部门
+            record: 归档索引中的记录
+            classification_rules: 新规则
+
+        Returns:
+            是否需要重新分类
+        """
+        diff = self._diff_for(record.get("rules_version") if record else None, classification_rules)
+        if diff is not None:
+            affected = diff.affects(name, department)
+            if not affected and diff.text_only:
+                self.text_only_skipped += 1
+            return affected
+
+        compiled = compile_rules(classification_rules)
+        if department not in compiled.vocabulary["departments"]:
+            return True
+        agreement = rule_engine.agreement(name, entry_type, classification_rules, f"{period}-{department}")
+        return agreement is not None and agreement < 1
+
+    def run(self, archive_folder: str, classification_rules: str,
+            progress_callback: Optional[Callable[[float, str], None]] = None,
+            max_workers: Optional[int] = None, full: bool = False,
+            plan_file: Optional[str] = None) -> Dict[str, Any]:
+        """
+        重新分类已归档的条目
+
+        Args:
+            archive_folder: 归档文件夹
+            classification_rules: 新规则
+            progress_callback: 进度回调函数
+            max_workers: 并发处理数，默认读取配置
+            full: 是否忽略规则差异、重新分类全部条目
+            plan_file: 计划文件路径，提供时只生成移动计划
+
+        Returns:
+            处理结果统计（含扫描数、受影响数、移动数）
+        """
+        start_time = time.time()
+        index = ArchiveIndex(archive_folder).load()
+        new_version = self.processor.rules_history().save(classification_rules)
+        self.text_only_skipped = 0
+
+        affected: List[FileItem] = []
+        unaffected: List[Tuple[str, str]] = []
+        scanned = scan_archive(archive_folder)
+        for name, path, period, department in scanned:
+            entry_type = "文件" if os.path.isfile(path) else "文件夹"
+            record = index.get(path)
+            if full or self.is_affected(name, entry_type, period, department, record, classification_rules):
+                affected.append(FileItem(name, path, entry_type))
+            else:
+                unaffected.append((path, f"{period}-{department}"))
+
+        logger.info(f"重新分类扫描完成 - 已归档: {len(scanned)}, 受影响: {len(affected)}, "
+                    f"不受影响: {len(unaffected)}（其中规则只改措辞: {self.text_only_skipped}）, "
+                    f"耗时: {time.time() - start_time:.2f}秒")
+
+        # 不受影响的条目沿用原结果，并记为已按新规则确认，下次只与新规则比较
+        for path, result in unaffected:
+            record = index.get(path) or {}
+            index.record(path, record.get("result", result), new_version,
+                         record.get("confidence"), record.get("engine"))
+        index.save()
+
+        self.processor.source_folder = archive_folder
+        self.processor.file_items = affected
+        if not affected:
+            result = {"success": True, "total_files": 0, "success_count": 0, "error_count": 0,
+                      "cancelled": False, "cancelled_count": 0, "duration": 0.0, "file_items": []}
+        elif plan_file:
+            result = self.processor.create_plan(classification_rules, plan_file, progress_callback, max_workers)
+        else:
+            result = self.processor.process_all_files(classification_rules, progress_callback, max_workers)
+
+        if result.get("success"):
+            moved = [item for item in affected if item.target_path and item.target_path != item.path]
+            result["scanned_count"] = len(scanned)
+            result["affected_count"] = len(affected)
+            result["unaffected_count"] = len(unaffected)
+            result["text_only_skipped"] = self.text_only_skipped
+            result["moved_count"] = sum(1 for item in moved if item.completed) if not plan_file else len(moved)
+            result["duration"] = time.time() - start_time
+            if not plan_file:
+                self._remove_empty_directories(archive_folder, classification_rules)
+
+            logger.info(f"重新分类完成 - 已归档: {len(scanned)}, 重新分类: {len(affected)}, "
+                        f"移动: {result['moved_count']}, 耗时: {result['duration']:.2f}秒")
+        return result
+
+    def _remove_empty_directories(self, archive_folder: str, classification_rules: str):
+        """删除已清空的分桶子目录，以及已从规则中移除且已清空的部门目录"""
+        departments = set(compile_rules(classification_rules).vocabulary["departments"])
+        for period in PERIODS:
+            period_path = os.path.join(archive_folder, period)
+            if not os.path.isdir(period_path):
+                continue
+            for department in os.listdir(period_path):
+                department_path = os.path.join(period_path, department)
+                if not os.path.isdir(department_path):
+                    continue
+                for name in os.listdir(department_path):
+                    bucket_path = os.path.join(department_path, name)
+                    if is_bucket_name(name) and os.path.isdir(bucket_path) and not os.listdir(bucket_path):
+                        self._remove_directory(bucket_path)
+                if department not in departments and not os.listdir(department_path):
+                    self._remove_directory(department_path)
+                    logger.info(f"删除已撤销部门的空目录: {department_path}")
+    
+    def _remove_directory(self, path: str):
+        """删除空目录，并从处理器的已存在目录缓存中移除"""
+        os.rmdir(path)
+        self.processor._known_dirs.discard(path)
@@ -0,0 +1,122 @@
+"""
+规则引擎模块
+使用编译后的部门关键词和保管期限条件，对文件名做本地关键词匹配
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from compiled_rules import CompiledRules, compile_rules, PERIOD_ORDER
+
+
+class RuleEngine:
+    """本地关键词规则引擎"""
+
+    def __init__(self):
+        """初始化规则引擎"""
+        self._compiled: Optional[CompiledRules] = None
+
+    @property
+    def departments(self) -> List[Tuple[str, List[str]]]:
+        """最近一次解析的部门规则"""
+        return self._compiled.departments if self._compiled else []
+
+    @property
+    def periods(self) -> List[Tuple[str, List[str]]]:
+        """最近一次解析的保管期限规则（按优先级排序）"""
+        return self._compiled.periods if self._compiled else []
+
+    @property
+    def fallback_department(self) -> Optional[str]:
+        """最近一次解析的兜底部门"""
+        return self._compiled.fallback_department if self._compiled else None
+
+    def parse(self, classification_rules: str) -> CompiledRules:
+        """
+        解析分类规则（按内容哈希复用编译结果）
+
+        Args:
+            classification_rules: 分类规则文本
+
+        Returns:
+            编译后的分类规则
+        """
+        self._compiled = compile_rules(classification_rules)
+        return self._compiled
+
+    def classify(self, filename: str, entry_type: str, classification_rules: str) -> Dict[str, Any]:
+        """
+        按关键词匹配文件名
+
+        Args:
+            filename: 文件名
+            entry_type: 条目类型（文件/文件夹）
+            classification_rules: 分类规则
+
+        Returns:
+            {"period", "department", "result", "matched"}，未命中的字段为None，
+            只有保管期限和部门都命中时result才有值
+        """
+        compiled = self.parse(classification_rules)
+        matched: List[str] = []
+
+        # 部门：命中关键词总长度最大的部门，并列时视为无法判断
+        department = None
+        if compiled.department_pattern is not None:
+            scores: Dict[str, int] = {}
+            hits = {match.group().lower() for match in compiled.department_pattern.finditer(filename)}
+            for keyword in hits:
+                dept = compiled.department_keywords[keyword]
+                scores[dept] = scores.get(dept, 0) + len(keyword)
+            matched.extend(hits)
+            if scores:
+                ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+                if len(ranked) == 1 or ranked[0][1] > ranked[1][1]:
+                    department = ranked[0][0]
+
+        # 保管期限：取命中条件中优先级最高的
+        period = None
+        if compiled.period_pattern is not None:
+            hits = {match.group().lower() for match in compiled.period_pattern.finditer(filename)}
+            matched.extend(hits)
+            candidates = [compiled.period_keywords[keyword] for keyword in hits]
+            if candidates:
+                period = min(candidates, key=PERIOD_ORDER.get)
+
+        return {
+            "period": period,
+            "department": department,
+            "result": f"{period}-{department}" if period and department else None,
+            "matched": matched
+        }
+
+    def agreement(self, filename: str, entry_type: str, classification_rules: str,
+                  result: str) -> Optional[float]:
+        """
+        计算分类结果与规则引擎的一致程度
+
+        Args:
+            filename: 文件名
+            entry_type: 条目类型（文件/文件夹）
+            classification_rules: 分类规则
+            result: 待比较的分类结果（保管期限-部门）
+
+        Returns:
+            规则引擎给出判断的字段中一致的比例（0~1），规则引擎没有判断时返回None
+        """
+        if "-" not in result:
+            return 0.0
+
+        period, department = result.split("-", 1)
+        opinion = self.classify(filename, entry_type, classification_rules)
+        checks = []
+        if opinion["period"]:
+            checks.append(opinion["period"] == period)
+        if opinion["department"]:
+            checks.append(opinion["department"] == department)
+
+        if not checks:
+            return None
+        return sum(checks) / len(checks)
+
+
+# 全局规则引擎实例
+rule_engine = RuleEngine()
@@ -6,6 +6,8 @@
 
 import sys
 import os
+import threading
+import time
 import traceback
 from pathlib import Path
 
@@ -85,6 +87,297 @@ def run_optimized_version():
         print(f"❌ 运行优化版本失败: {e}")
         traceback.print_exc()
 
+def write_stream_event(output, event, progress_callback):
+    """
+    处理结果流中的一个事件：条目结果写入JSON Lines文件，汇总快照输出进度
+    
+    Args:
+        output: 已打开的结果文件
+        event: 结果流事件
+        progress_callback: 进度回调函数
+        
+    Returns:
+        结束事件中的处理结果统计，其他事件返回None
+    """
+    import json
+    
+    if event["event"] == "item":
+        output.write(json.dumps(event["item"].to_dict(), ensure_ascii=False) + "\n")
+    elif event["event"] == "snapshot" and event["total"]:
+        progress_callback(event["done"] / event["total"] * 100, f"已完成 {event['done']}/{event['total']}")
+    elif event["event"] == "done":
+        return event["result"]
+    return None
+
+def run_headless(folder: str, shards: int = 0, plan_file: str = "", use_async: bool = False,
+                 priority: str = "", results_file: str = "") -> bool:
+    """
+    无界面运行分类
+    
+    Args:
+        folder: 需要分类的文件夹
+        shards: 分片进程数，0表示使用配置
+        plan_file: 计划文件路径，提供时只生成移动计划，不移动文件
+        use_async: 使用异步处理器（单个事件循环驱动全部条目）
+        priority: 逗号分隔的优先级键，为空时使用配置
+        results_file: 结果文件路径，提供时每个条目完成后立即写入一行（JSON Lines）
+        
+    Returns:
+        是否成功
+    """
+    try:
+        from config import config_manager
+        from logger import log_manager
+        from api_service import api_service
+        from file_processor import file_processor
+        from sharded_runner import ShardedRunner
+        
+        processor = file_processor
+        if use_async:
+            from async_processor import AsyncFileProcessor
+            processor = AsyncFileProcessor()
+        if priority:
+            processor.priority_keys = [key for key in priority.split(",") if key.strip()]
+        
+        app_config = config_manager.load_config()
+        api_service.update_config(app_config.api_config)
+        classification_rules = config_manager.load_classification_rules()
+        
+        shards = shards or app_config.shard_workers
+        mode = "异步处理" if use_async else f"分片进程数: {max(1, shards)}"
+        # 逐条写入结果时边扫描边处理，不预先加载整个文件夹
+        stream_folder = folder if results_file and not plan_file and (use_async or shards <= 1) else None
+        if stream_folder:
+            print(f"📁 边扫描边处理: {folder}（每批 {app_config.stream_batch_size} 个条目），{mode}")
+        else:
+            file_items = processor.load_files(folder)
+            if not file_items:
+                print(f"❌ 文件夹加载失败或文件夹为空: {folder}")
+                return False
+            print(f"📁 已加载 {len(file_items)} 个文件/文件夹，{mode}")
+        
+        print_lock = threading.Lock()
+        last_print = [0.0]
+        
+        def progress_callback(progress: float, status: str):
+            """每秒最多输出一次进度"""
+            with print_lock:
+                now = time.time()
+                if now - last_print[0] >= 1 or progress >= 100:
+                    last_print[0] = now
+                    print(f"  {progress:5.1f}% {status}")
+        
+        if plan_file:
+            result = processor.create_plan(classification_rules, plan_file, progress_callback)
+            if not result.get("success"):
+                print(f"❌ 生成移动计划失败: {result.get('error', '未知错误')}")
+                return False
+            print(processor.get_processing_summary())
+            print(f"📝 移动计划: {plan_file}（确认后使用 --apply-plan 执行）")
+            return True
+        
+        if use_async:
+            import asyncio
+            
+            async def stream_results():
+                done = {}
+                with open(results_file, "w", encoding="utf-8") as output:
+                    async for event in processor.aiter_results(classification_rules, source_folder=stream_folder):
+                        done = write_stream_event(output, event, progress_callback) or done
+                return done
+            
+            try:
+                if results_file:
+                    result = asyncio.run(stream_results())
+                else:
+                    result = asyncio.run(processor.process_all_files_async(classification_rules, progress_callback))
+            finally:
+                processor.close()
+        elif shards > 1:
+            if results_file:
+                print("⚠️ 分片运行不支持逐条写入结果文件，结果见处理报告")
+                results_file = ""
+            runner = ShardedRunner(shards, app_config.shard_by)
+            result = runner.run(processor, classification_rules, progress_callback)
+        elif results_file:
+            result = {}
+            with open(results_file, "w", encoding="utf-8") as output:
+                for event in processor.iter_results(classification_rules, source_folder=stream_folder):
+                    result = write_stream_event(output, event, progress_callback) or result
+        else:
+            result = processor.process_all_files(classification_rules, progress_callback)
+        
+        if not result.get("success"):
+            print(f"❌ 分类失败: {result.get('error', '未知错误')}")
+            return False
+        
+        print(processor.get_processing_summary())
+        if result.get("budget_exhausted"):
+            print(f"⚠️ 本次运行的token/费用预算已用完，{result['cancelled_count']} 个条目未处理")
+        
+        report_file = result.get("report_file")
+        if not report_file:
+            report_file = str(config_manager.get_log_file_path(
+                f"report_{time.strftime('%Y%m%d_%H%M%S')}.txt"))
+            processor.export_results(report_file)
+        print(f"📄 处理报告: {report_file}")
+        if results_file:
+            print(f"📄 逐条结果: {results_file}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 无界面运行失败: {e}")
+        traceback.print_exc()
+        return False
+
+def run_apply_plan(plan_file: str) -> bool:
+    """
+    执行移动计划
+    
+    Args:
+        plan_file: 计划文件路径
+        
+    Returns:
+        是否成功
+    """
+    try:
+        from config import config_manager
+        from logger import log_manager
+        from file_processor import file_processor
+        
+        config_manager.load_config()
+        
+        def progress_callback(progress: float, status: str):
+            if progress >= 100:
+                print(f"  {progress:5.1f}% {status}")
+        
+        result = file_processor.apply_plan(plan_file, progress_callback)
+        if not result.get("success"):
+            print(f"❌ 执行移动计划失败: {result.get('error', '未知错误')}")
+            return False
+        
+        print(f"✅ 移动完成 - 成功: {result['success_count']}, 失败: {result['error_count']}, "
+              f"跳过: {result['skipped_count']}, 耗时: {result['duration']:.2f}秒")
+        report_file = str(config_manager.get_log_file_path(
+            f"report_{time.strftime('%Y%m%d_%H%M%S')}.txt"))
+        file_processor.export_results(report_file)
+        print(f"📄 处理报告: {report_file}")
+        return result["error_count"] == 0
+        
+    except Exception as e:
+        print(f"❌ 执行移动计划失败: {e}")
+        traceback.print_exc()
+        return False
+
+def run_reclassify(folder: str, plan_file: str = "", full: bool = False) -> bool:
+    """
+    重新分类已归档的文件夹
+    
+    Args:
+        folder: 已归档的文件夹
+        plan_file: 计划文件路径，提供时只生成移动计划
+        full: 是否重新分类全部条目（忽略规则差异）
+        
+    Returns:
+        是否成功
+    """
+    try:
+        from config import config_manager
+        from logger import log_manager
+        from api_service import api_service
+        from file_processor import file_processor
+        from reclassifier import ArchiveReclassifier
+        
+        app_config = config_manager.load_config()
+        api_service.update_config(app_config.api_config)
+        classification_rules = config_manager.load_classification_rules()
+        
+        def progress_callback(progress: float, status: str):
+            if progress >= 100:
+                print(f"  {progress:5.1f}% {status}")
+        
+        result = ArchiveReclassifier(file_processor).run(
+            folder, classification_rules, progress_callback, full=full, plan_file=plan_file or None)
+        if not result.get("success"):
+            print(f"❌ 重新分类失败: {result.get('error', '未知错误')}")
+            return False
+        
+        print(f"✅ 重新分类完成 - 已归档: {result['scanned_count']}, 受影响: {result['affected_count']}, "
+              f"移动: {result['moved_count']}, 失败: {result['error_count']}, 耗时: {result['duration']:.2f}秒")
+        if result.get("text_only_skipped"):
+            print(f"ℹ️ 规则只改了措辞，{result['text_only_skipped']} 个条目未重新分类（需要时使用 --full）")
+        if plan_file:
+            print(f"📝 移动计划: {plan_file}（确认后使用 --apply-plan 执行）")
+        return result["error_count"] == 0
+        
+    except Exception as e:
+        print(f"❌ 重新分类失败: {e}")
+        traceback.print_exc()
+        return False
+
+def run_catalog_query(query: str = "", departments: bool = False, expired: bool = False) -> bool:
+    """
+    查询归档目录数据库
+    
+    Args:
+        query: 名称关键词（空格分隔，需同时匹配）
+        departments: 是否显示各部门的条目数
+        expired: 是否列出保管期限已到期的条目
+        
+    Returns:
+        是否成功
+    """
+    try:
+        from file_processor import FileProcessor
+        
+        catalog = FileProcessor.catalog()
+        start_time = time.time()
+        try:
+            if query:
+                rows = catalog.search(query)
+                print(f"🔍 “{query}” 找到 {len(rows)} 个条目:")
+                for row in rows:
+                    print(f"  {row['period']}-{row['department']}  {row['target_path']}  （原位置: {row['source_path']}）")
+            if departments:
+                counts = catalog.department_counts()
+                print(f"📊 各部门条目数（共 {sum(counts.values())} 个）:")
+                for department, count in sorted(counts.items(), key=lambda item: -item[1]):
+                    print(f"  {department}: {count}")
+            if expired:
+                rows = catalog.expired()
+                print(f"⏰ 保管期限已到期的条目: {len(rows)} 个")
+                for row in rows:
+                    print(f"  {time.strftime('%Y-%m-%d', time.localtime(row['expires_at']))}  "
+                          f"{row['period']}  {row['target_path']}")
+        finally:
+            catalog.close()
+        print(f"查询耗时: {(time.time() - start_time) * 1000:.1f} 毫秒")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 查询归档目录失败: {e}")
+        traceback.print_exc()
+        return False
+
+def get_option_value(args: list, names: tuple) -> str:
+    """
+    获取命令行选项的值
+    
+    Args:
+        args: 命令行参数列表
+        names: 选项名称（如 ('-s', '--shards')）
+        
+    Returns:
+        选项值，未提供时返回空字符串
+    """
+    for i, arg in enumerate(args):
+        if arg in names and i + 1 < len(args):
+            return args[i + 1]
+        for name in names:
+            if name.startswith("--") and arg.startswith(name + "="):
+                return arg.split("=", 1)[1]
+    return ""
+
 def run_tests():
     """运行测试"""
     try:
@@ -114,12 +407,36 @@ def show_help():
     -o, --original     运行原始版本 (V1.41)
     -n, --new          运行优化版本 (V2.0) [默认]
     -t, --test         运行测试
+    -c, --headless DIR 无界面分类指定文件夹
+    -s, --shards N     分片进程数（配合 --headless 使用，默认读取配置 shard_workers）
+    -p, --plan FILE    只生成移动计划（配合 --headless 使用，不创建目录、不移动文件）
+    -a, --apply-plan FILE  执行已确认的移动计划
+    -r, --reclassify DIR   规则变化后重新分类已归档的文件夹（只处理受影响的条目，可配合 -p）
+    --full             配合 --reclassify 使用，重新分类全部条目
+    --async            配合 --headless 使用，以异步方式处理（适合条目很多的文件夹）
+    --priority KEYS    配合 --headless 使用，按优先级键排序处理顺序（逗号分隔：mtime、size、
+                       pattern:通配符、move_cost，加“-”前缀表示反序）
+    --results FILE     配合 --headless 使用，每个条目完成后立即写入一行结果（JSON Lines），
+                       不必等待整次运行结束；边扫描边处理，内存占用与文件夹大小无关（分片运行不支持）
+    -f, --find WORDS   在归档目录数据库中按名称检索已归档的条目（空格分隔的关键词需同时匹配）
+    --departments      显示归档目录数据库中各部门的条目数
+    --expired          列出保管期限已到期的条目（长期30年、短期10年，从形成年度次年起算）
+    --profile          性能剖析：分类期间采样调用栈并记录内存快照，在日志目录输出火焰图格式的
+                       调用栈文件（*_cpu.folded）和内存分配报告（*_memory.txt），可配合 -c 或界面运行
     -h, --help         显示此帮助信息
 
 示例:
     python run.py              # 运行优化版本
     python run.py -o           # 运行原始版本
     python run.py -t           # 运行测试
+    python run.py -c D:\\归档 -s 4   # 4个进程分片无界面分类
+    python run.py -c D:\\归档 -p plan.jsonl   # 生成移动计划
+    python run.py -c D:\\归档 --async   # 单进程异步分类大量文件
+    python run.py -c D:\\归档 --priority "pattern:*紧急*,mtime"   # 紧急和最新的文件先分类
+    python run.py -a plan.jsonl     # 执行移动计划
+    python run.py -r D:\\归档        # 修改规则后重新分类已归档的文件
+    python run.py -f "2022 审计报告"   # 查找已归档文件的位置
+    python run.py -c D:\\归档 --profile   # 分类并输出性能剖析结果
     python run.py --help       # 显示帮助
 
 注意事项:
@@ -156,6 +473,48 @@ def main():
         run_tests()
         return
     
+    from profiler import run_profiler
+    if '--profile' in args:
+        run_profiler.enabled = True
+        print("🔬 已开启性能剖析（调用栈与内存快照保存在日志目录）")
+    
+    apply_plan_file = get_option_value(args, ('-a', '--apply-plan'))
+    if apply_plan_file:
+        print("🚚 执行移动计划...")
+        if not run_apply_plan(apply_plan_file):
+            sys.exit(1)
+        return
+    
+    find_query = get_option_value(args, ('-f', '--find'))
+    if find_query or '--departments' in args or '--expired' in args:
+        if not run_catalog_query(find_query, '--departments' in args, '--expired' in args):
+            sys.exit(1)
+        return
+    
+    reclassify_folder = get_option_value(args, ('-r', '--reclassify'))
+    if reclassify_folder:
+        plan_file = get_option_value(args, ('-p', '--plan'))
+        print("♻️ 重新分类已归档的文件...")
+        if not run_reclassify(reclassify_folder, plan_file, '--full' in args):
+            sys.exit(1)
+        return
+    
+    headless_folder = get_option_value(args, ('-c', '--headless'))
+    if headless_folder:
+        shards = get_option_value(args, ('-s', '--shards'))
+        plan_file = get_option_value(args, ('-p', '--plan'))
+        print("🖥️ 无界面运行...")
+        priority = get_option_value(args, ('--priority',))
+        results_file = get_option_value(args, ('--results',))
+        with run_profiler.session("headless"):
+            success = run_headless(headless_folder, int(shards) if shards else 0, plan_file, '--async' in args,
+                                   priority, results_file)
+        for profile_file in run_profiler.outputs:
+            print(f"🔬 性能剖析: {profile_file}")
+        if not success:
+            sys.exit(1)
+        return
+    
     if '-o' in args or '--original' in args:
         print("📁 启动原始版本 (V1.41)...")
         run_original_version()
@@ -0,0 +1,187 @@
+"""
+优先级调度模块
+按修改时间、大小、路径模式或估算的移动代价排序待处理条目，使最重要的条目最先占用有限的API吞吐
+"""
+
+import fnmatch
+import os
+from typing import List, Dict, Callable, Optional, Tuple
+from loguru import logger
+
+# 估算文件夹大小时最多统计的条目数（超出部分不再遍历，避免调度本身过慢）
+FOLDER_SCAN_LIMIT = 10000
+
+# 优先级键：名称 → 工厂函数(参数) → 键函数(条目, 调度器) → 数值（越小越先处理）
+PriorityKeyFactory = Callable[[str], Callable[..., float]]
+_PRIORITY_KEYS: Dict[str, PriorityKeyFactory] = {}
+
+
+def register_priority_key(name: str, factory: PriorityKeyFactory):
+    """
+    注册优先级键
+
+    Args:
+        name: 键名称（配置中写作“名称”或“名称:参数”，加“-”前缀表示反序）
+        factory: 根据参数生成键函数的工厂函数
+    """
+    _PRIORITY_KEYS[name] = factory
+
+
+def available_priority_keys() -> List[str]:
+    """获取已注册的优先级键名称"""
+    return sorted(_PRIORITY_KEYS)
+
+
+def folder_size(path: str, limit: int = FOLDER_SCAN_LIMIT) -> int:
+    """
+    估算文件夹大小（最多统计limit个条目）
+
+    Args:
+        path: 文件夹路径
+        limit: 最多统计的条目数
+
+    Returns:
+        字节数
+    """
+    total = 0
+    count = 0
+    stack = [path]
+    while stack and count < limit:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    count += 1
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+                    if count >= limit:
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class PriorityScheduler:
+    """按优先级键排序待处理分组"""
+
+    def __init__(self, keys: List[str], source_folder: str = ""):
+        """
+        初始化调度器
+
+        Args:
+            keys: 优先级键列表，按顺序比较（例如["pattern:*紧急*", "mtime"]）
+            source_folder: 源文件夹（用于路径模式和移动代价）
+        """
+        self.source_folder = source_folder
+        self.keys: List[Tuple[str, Callable, bool]] = []
+        self._stats: Dict[str, Optional[os.stat_result]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._source_device: Optional[int] = None
+
+        for spec in keys:
+            spec = spec.strip()
+            reverse = spec.startswith("-")
+            name, _, argument = spec.lstrip("-").partition(":")
+            factory = _PRIORITY_KEYS.get(name)
+            if factory is None:
+                logger.warning(f"未知的优先级键: {spec}（可用: {', '.join(available_priority_keys())}），已忽略")
+                continue
+            self.keys.append((spec, factory(argument), reverse))
+
+    def stat(self, item) -> Optional[os.stat_result]:
+        """获取条目的文件状态（带缓存，条目不存在时返回None）"""
+        if item.path not in self._stats:
+            try:
+                self._stats[item.path] = os.stat(item.path)
+            except OSError:
+                self._stats[item.path] = None
+        return self._stats[item.path]
+
+    def size(self, item) -> int:
+        """获取条目大小（文件夹为估算值，带缓存；同时记录在条目上，供写入目录数据库时复用）"""
+        if item.path not in self._sizes:
+            if item.entry_type == "文件夹":
+                self._sizes[item.path] = folder_size(item.path)
+            else:
+                stat = self.stat(item)
+                self._sizes[item.path] = stat.st_size if stat else 0
+            item.size = self._sizes[item.path]
+        return self._sizes[item.path]
+
+    def source_device(self) -> Optional[int]:
+        """获取源文件夹所在的设备号"""
+        if self._source_device is None and self.source_folder:
+            try:
+                self._source_device = os.stat(self.source_folder).st_dev
+            except OSError:
+                pass
+        return self._source_device
+
+    def item_key(self, item) -> Tuple[float, ...]:
+        """计算单个条目的排序键"""
+        return tuple(-key(item, self) if reverse else key(item, self) for _, key, reverse in self.keys)
+
+    def order(self, groups: List[list]) -> List[list]:
+        """
+        按优先级排序分组（组内最优先的条目决定整组位置，相同优先级保持原顺序）
+
+        Args:
+            groups: 文件项分组
+
+        Returns:
+            排序后的分组
+        """
+        if not self.keys or len(groups) <= 1:
+            return groups
+        ordered = sorted(groups, key=lambda group: min(self.item_key(item) for item in group))
+        logger.info(f"已按优先级排序 {len(groups)} 组条目: {', '.join(spec for spec, _, _ in self.keys)}")
+        return ordered
+
+
+def _mtime_key(argument: str):
+    """修改时间：最新的先处理"""
+    def key(item, scheduler: PriorityScheduler) -> float:
+        stat = scheduler.stat(item)
+        return -stat.st_mtime if stat else 0.0
+    return key
+
+
+def _size_key(argument: str):
+    """大小：小的先处理，大文件夹留到最后（空闲时段）"""
+    def key(item, scheduler: PriorityScheduler) -> float:
+        return float(scheduler.size(item))
+    return key
+
+
+def _pattern_key(argument: str):
+    """路径模式：相对路径或名称匹配通配符的先处理（多个模式用|分隔）"""
+    patterns = [pattern for pattern in argument.split("|") if pattern]
+
+    def key(item, scheduler: PriorityScheduler) -> float:
+        relative = os.path.relpath(item.path, scheduler.source_folder) if scheduler.source_folder else item.path
+        relative = relative.replace(os.sep, "/")
+        matched = any(fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch(item.name, pattern)
+                      for pattern in patterns)
+        return 0.0 if matched else 1.0
+    return key
+
+
+def _move_cost_key(argument: str):
+    """
+    估算的移动代价：同一设备内移动只是重命名，代价与大小无关；
+    跨设备（例如条目是挂载点或链接到其他磁盘）需要复制，代价按大小计
+    """
+    def key(item, scheduler: PriorityScheduler) -> float:
+        stat = scheduler.stat(item)
+        device = scheduler.source_device()
+        if stat is None or device is None or stat.st_dev == device:
+            return 0.0
+        return float(scheduler.size(item))
+    return key
+
+
+register_priority_key("mtime", _mtime_key)
+register_priority_key("size", _size_key)
+register_priority_key("pattern", _pattern_key)
+register_priority_key("move_cost", _move_cost_key)
@@ -0,0 +1,383 @@
+"""
+分片处理模块
+将待处理条目分片到多个进程并行处理，由协调者汇总进度、计数和报告
+"""
+
+import math
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Callable
+from loguru import logger
+from config import config_manager
+from catalog import new_run_id
+from name_grouping import normalize_stem, group_items
+from token_budget import token_budget, format_spend, BUDGET_NORMAL, BUDGET_ECONOMY, BUDGET_EXHAUSTED
+
+
+def partition_items(items: list, num_shards: int, shard_by: str = "hash") -> List[list]:
+    """
+    将条目分片
+
+    同一名称主干的条目总是落在同一分片，保证系列文件合并在分片内依然有效。
+
+    Args:
+        items: 文件项列表
+        num_shards: 分片数
+        shard_by: 分片方式，hash按名称主干哈希，size按分组大小均衡
+
+    Returns:
+        分片列表（不含空分片）
+    """
+    num_shards = max(1, num_shards)
+    shards: List[list] = [[] for _ in range(num_shards)]
+
+    if shard_by == "size":
+        # 最长处理时间优先：大组先分配给当前最轻的分片
+        groups = sorted(group_items(items), key=len, reverse=True)
+        for group in groups:
+            min(shards, key=len).extend(group)
+    else:
+        for item in items:
+            stem = normalize_stem(item.name, item.entry_type) or item.name
+            bucket = zlib.crc32(f"{item.entry_type}:{stem}".encode("utf-8")) % num_shards
+            shards[bucket].append(item)
+
+    return [shard for shard in shards if shard]
+
+
+def _run_shard(shard_index: int, source_folder: str, item_dicts: List[Dict[str, Any]],
+               classification_rules: str, rate_limit_rpm: float, max_workers: int,
+               budget_share: float, priority_keys: Optional[List[str]],
+               progress_queue, pause_event, cancel_event) -> Dict[str, Any]:
+    """
+    在工作进程中处理一个分片
+
+    Args:
+        shard_index: 分片序号
+        source_folder: 源文件夹
+        item_dicts: 分片内条目（FileItem.to_dict格式）
+        classification_rules: 分类规则
+        rate_limit_rpm: 本进程可用的限速份额(次/分钟)，0表示不限速
+        max_workers: 本进程并发数
+        budget_share: 本进程可用的token/费用预算份额
+        priority_keys: 处理顺序的优先级键，None表示使用配置
+        progress_queue: 进度队列
+        pause_event: 暂停事件（置位表示暂停）
+        cancel_event: 取消事件
+
+    Returns:
+        分片处理结果
+    """
+    from api_service import api_service
+    from file_processor import FileProcessor, FileItem
+
+    # 工作进程需要自行加载已保存的API配置
+    api_service.update_config(config_manager.load_config().api_config)
+
+    processor = FileProcessor()
+    processor.source_folder = source_folder
+    processor.file_items = [FileItem(d["name"], d["path"], d["entry_type"]) for d in item_dicts]
+    processor.record_archive_index = False
+    processor.show_spend = False
+    processor.priority_keys = priority_keys
+    api_service.set_rate_limit(rate_limit_rpm)
+    token_budget.set_share(budget_share)
+
+    # 将协调者的暂停/取消状态同步到本进程的处理器
+    stop = threading.Event()
+
+    def watch_control():
+        while not stop.wait(0.2):
+            if cancel_event.is_set():
+                processor.cancel()
+            elif pause_event.is_set():
+                processor.pause()
+            else:
+                processor.resume()
+
+    watcher = threading.Thread(target=watch_control, daemon=True)
+    watcher.start()
+
+    def progress_callback(progress: float, status: str):
+        spend = token_budget.get_stats()
+        progress_queue.put((shard_index, progress, status, (spend["total_tokens"], spend["cost"])))
+
+    try:
+        result = processor.process_all_files(classification_rules, progress_callback, max_workers=max_workers)
+    finally:
+        stop.set()
+        watcher.join()
+
+    result["shard"] = shard_index
+    result["items"] = [item.to_dict() for item in processor.file_items]
+    result.pop("file_items", None)
+    return result
+
+
+def merge_similarity_stats(stats_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并各分片的相似度缓存统计
+
+    Args:
+        stats_list: 各分片统计
+
+    Returns:
+        合并后的统计
+    """
+    stats_list = [stats for stats in stats_list if stats]
+    if not stats_list:
+        return {}
+
+    merged = {key: sum(stats.get(key, 0) for stats in stats_list)
+              for key in ("lookups", "hits", "audits", "audit_mismatches")}
+    merged["hit_rate"] = merged["hits"] / merged["lookups"] if merged["lookups"] else 0.0
+    merged["false_reuse_rate"] = merged["audit_mismatches"] / merged["audits"] if merged["audits"] else 0.0
+    merged["mismatch_samples"] = [sample for stats in stats_list
+                                  for sample in stats.get("mismatch_samples", [])][:100]
+    return merged
+
+
+def merge_budget_stats(stats_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并各分片的token用量统计
+
+    Args:
+        stats_list: 各分片的用量统计
+
+    Returns:
+        合并后的统计（预算状态取最紧张的分片）
+    """
+    stats_list = [stats for stats in stats_list if stats]
+    if not stats_list:
+        return {}
+
+    merged: Dict[str, Any] = {
+        key: sum(stats.get(key, 0) for stats in stats_list)
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens", "requests", "cost", "rule_only", "refused")
+    }
+    projected = [stats["projected_tokens"] for stats in stats_list if stats.get("projected_tokens")]
+    merged["projected_tokens"] = sum(projected) if projected else None
+    states = {stats.get("state") for stats in stats_list}
+    merged["state"] = next((state for state in (BUDGET_EXHAUSTED, BUDGET_ECONOMY) if state in states), BUDGET_NORMAL)
+    return merged
+
+
+class ShardedRunner:
+    """分片处理协调者"""
+
+    def __init__(self, num_workers: int, shard_by: str = "hash"):
+        """
+        初始化分片处理协调者
+
+        Args:
+            num_workers: 工作进程数
+            shard_by: 分片方式（hash/size）
+        """
+        self.num_workers = max(1, num_workers)
+        self.shard_by = shard_by
+        self._paused = False
+        self._cancelled = False
+        self._pause_event = None
+        self._cancel_event = None
+
+    def pause(self):
+        """暂停所有分片"""
+        self._paused = True
+        if self._pause_event is not None:
+            self._pause_event.set()
+        logger.info("分片处理已暂停，等待进行中的条目完成")
+
+    def resume(self):
+        """继续所有分片"""
+        self._paused = False
+        if self._pause_event is not None:
+            self._pause_event.clear()
+        logger.info("分片处理已继续")
+
+    def cancel(self):
+        """取消所有分片"""
+        self._cancelled = True
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+        logger.info("已请求取消分片处理，等待进行中的条目完成")
+
+    def is_paused(self) -> bool:
+        """是否处于暂停状态"""
+        return self._paused
+
+    def is_cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._cancelled
+
+    def run(self, processor, classification_rules: str,
+            progress_callback: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        分片处理文件处理器中的待处理条目
+
+        Args:
+            processor: 已加载条目的文件处理器，处理结果会回写到其中
+            classification_rules: 分类规则
+            progress_callback: 进度回调函数
+
+        Returns:
+            与FileProcessor.process_all_files格式一致的处理结果统计
+        """
+        start_time = time.time()
+        processor.run_id = new_run_id()
+        pending_items = [item for item in processor.file_items if not item.completed]
+        total_files = len(pending_items)
+        shards = partition_items(pending_items, self.num_workers, self.shard_by)
+
+        if len(shards) <= 1:
+            # 只有一个分片时无需启动工作进程
+            return processor.process_all_files(classification_rules, progress_callback)
+
+        # 全局限速、并发数和预算按分片均分
+        app_config = config_manager.load_config()
+        rate_share = app_config.rate_limit_rpm / len(shards) if app_config.rate_limit_rpm else 0
+        workers_per_shard = max(1, math.ceil(app_config.max_workers / len(shards)))
+        logger.info(f"开始分片处理 {total_files} 个文件 - 分片数: {len(shards)}, "
+                    f"每分片并发: {workers_per_shard}, 每分片限速: {rate_share or '不限'}")
+
+        items_by_path = {item.path: item for item in pending_items}
+        shard_sizes = [len(shard) for shard in shards]
+        shard_progress = [0.0] * len(shards)
+        shard_spend = [(0, 0.0)] * len(shards)
+        results: List[Dict[str, Any]] = []
+        self._cancelled = False
+
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager:
+            progress_queue = manager.Queue()
+            self._pause_event = manager.Event()
+            self._cancel_event = manager.Event()
+            if self._paused:
+                self._pause_event.set()
+
+            # 汇总各分片进度
+            listening = threading.Event()
+            listening.set()
+
+            def listen_progress():
+                while listening.is_set() or not progress_queue.empty():
+                    try:
+                        shard_index, progress, status, spend = progress_queue.get(timeout=0.2)
+                    except queue.Empty:
+                        continue
+                    except (EOFError, OSError):
+                        break
+                    shard_progress[shard_index] = progress
+                    shard_spend[shard_index] = spend
+                    if progress_callback:
+                        done = sum(p / 100 * size for p, size in zip(shard_progress, shard_sizes))
+                        total_tokens = sum(tokens for tokens, _ in shard_spend)
+                        if total_tokens:
+                            status += f"（{format_spend(total_tokens, sum(cost for _, cost in shard_spend))}）"
+                        progress_callback(done / total_files * 100, status)
+
+            listener = threading.Thread(target=listen_progress, daemon=True)
+            listener.start()
+
+            try:
+                with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+                    futures = {
+                        executor.submit(_run_shard, index, processor.source_folder,
+                                        [item.to_dict() for item in shard], classification_rules,
+                                        rate_share, workers_per_shard, 1 / len(shards),
+                                        processor.priority_keys, progress_queue,
+                                        self._pause_event, self._cancel_event): index
+                        for index, shard in enumerate(shards)
+                    }
+                    for future in as_completed(futures):
+                        index = futures[future]
+                        try:
+                            results.append(future.result())
+                        except Exception as e:
+                            logger.error(f"分片 {index} 处理失败: {e}")
+                            for item in shards[index]:
+                                item.error = f"分片处理失败: {e}"
+                            results.append({"success": False, "error": str(e), "items": [],
+                                            "error_count": len(shards[index])})
+            finally:
+                listening.clear()
+                listener.join()
+                self._pause_event = None
+                self._cancel_event = None
+
+        # 回写各条目的处理结果
+        for result in results:
+            for data in result.get("items", []):
+                item = items_by_path.get(data["path"])
+                if item is not None:
+                    item.update_from_dict(data)
+        processor.update_archive_index(pending_items)
+
+        processor.success_count = sum(result.get("success_count", 0) for result in results)
+        processor.error_count = sum(result.get("error_count", 0) for result in results)
+        processor.collapsed_calls = sum(result.get("collapsed_calls", 0) for result in results)
+        processor.coalesced_calls = sum(result.get("coalesced_calls", 0) for result in results)
+        processor.similarity_stats = merge_similarity_stats(
+            [result.get("similarity_stats", {}) for result in results])
+        processor.escalation_stats = {
+            key: sum(result.get("escalation_stats", {}).get(key, 0) for result in results)
+            for key in ("escalations", "escalation_changes")
+        }
+        connection_stats = {
+            key: sum(result.get("connection_stats", {}).get(key, 0) for result in results)
+            for key in ("requests", "new_connections", "tls_handshakes")
+        }
+        if connection_stats["requests"]:
+            connection_stats["reuse_rate"] = max(
+                0, connection_stats["requests"] - connection_stats["new_connections"]) / connection_stats["requests"]
+        processor.connection_stats = connection_stats
+        processor.budget_stats = merge_budget_stats([result.get("budget_stats", {}) for result in results])
+        processor.quarantine_stats = {
+            key: sum(result.get("quarantine_stats", {}).get(key, 0) for result in results)
+            for key in ("quarantined", "recovered", "failed", "timeouts")
+        }
+        for key in ("p95", "deadline"):
+            values = [result["quarantine_stats"][key] for result in results
+                      if result.get("quarantine_stats", {}).get(key) is not None]
+            processor.quarantine_stats[key] = max(values) if values else None
+
+        failed_shards = [result.get("error") for result in results if not result.get("success")]
+        cancelled = self._cancelled or any(result.get("cancelled") for result in results)
+        cancelled_count = sum(result.get("cancelled_count", 0) for result in results)
+        duration = time.time() - start_time
+
+        merged = {
+            "success": not failed_shards or len(failed_shards) < len(results),
+            "total_files": total_files,
+            "success_count": processor.success_count,
+            "error_count": processor.error_count,
+            "cancelled": cancelled,
+            "cancelled_count": cancelled_count,
+            "duration": duration,
+            "shards": len(shards),
+            "collapsed_calls": processor.collapsed_calls,
+            "coalesced_calls": processor.coalesced_calls,
+            "similarity_stats": processor.similarity_stats,
+            "escalation_stats": processor.escalation_stats,
+            "connection_stats": processor.connection_stats,
+            "budget_stats": processor.budget_stats,
+            "budget_exhausted": any(result.get("budget_exhausted") for result in results),
+            "quarantine_stats": processor.quarantine_stats,
+            "run_id": processor.run_id,
+            "file_items": processor.file_items
+        }
+        if failed_shards:
+            merged["error"] = "; ".join(failed_shards)
+
+        if cancelled:
+            report_file = config_manager.get_log_file_path(
+                f"report_{time.strftime('%Y%m%d_%H%M%S')}.txt")
+            if processor.export_results(str(report_file)):
+                merged["report_file"] = str(report_file)
+
+        logger.info(f"分片处理完成 - 成功: {processor.success_count}, 失败: {processor.error_count}, "
+                    f"未处理: {cancelled_count}, 耗时: {duration:.2f}秒")
+        return merged
@@ -0,0 +1,319 @@
+"""
+相似度缓存模块
+基于字符n-gram稀疏向量（倒排索引）的近重复文件名分类结果复用
+"""
+
+import math
+import os
+import re
+import threading
+import zlib
+from typing import Optional, Tuple, Dict, Any, List
+from loguru import logger
+from compiled_rules import rules_hash
+
+# numpy较重，在首次创建缓存时才导入
+np = None
+_numpy_loaded = False
+
+
+def _load_numpy():
+    """导入numpy（缺失时退化为纯Python实现）"""
+    global np, _numpy_loaded
+    if _numpy_loaded:
+        return
+    _numpy_loaded = True
+    try:
+        import numpy
+        np = numpy
+    except ImportError:
+        np = None
+
+
+class _SimilarityIndex:
+    """
+    单个命名空间（条目类型+规则版本）下的倒排索引
+
+    每个名称只保存出现过的n-gram桶（稀疏向量），查找时只累加与查询共享n-gram的记录。
+    记录和倒排表只追加，查找可以在锁外基于快照计算。
+    """
+
+    def __init__(self, max_entries: int):
+        """
+        初始化倒排索引
+
+        Args:
+            max_entries: 最多索引的名称数，达到上限后不再收录新名称
+        """
+        self.max_entries = max_entries
+        self.names: List[str] = []
+        self.results: List[str] = []
+        self._exact: Dict[str, int] = {}
+        # n-gram桶 -> [记录序号, 权重, 有效长度]
+        self._postings: Dict[int, list] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, key: str, name: str, result: str, vector: Dict[int, float]):
+        """添加一条记录（在缓存锁内调用）"""
+        if key in self._exact:
+            self.results[self._exact[key]] = result
+            return
+        if len(self.names) >= self.max_entries:
+            return
+
+        index = len(self.names)
+        for bucket, weight in vector.items():
+            posting = self._postings.get(bucket)
+            if posting is None:
+                posting = self._postings[bucket] = self._new_posting()
+            self._append(posting, index, weight)
+        self.names.append(name)
+        self.results.append(result)
+        self._exact[key] = index
+
+    @staticmethod
+    def _new_posting() -> list:
+        """创建空倒排表（有numpy时使用可扩容数组）"""
+        if np is not None:
+            return [np.zeros(8, dtype=np.int32), np.zeros(8, dtype=np.float32), 0]
+        return [[], [], 0]
+
+    @staticmethod
+    def _append(posting: list, index: int, weight: float):
+        """向倒排表追加一条记录"""
+        rows, weights, count = posting
+        if isinstance(rows, list):
+            rows.append(index)
+            weights.append(weight)
+        else:
+            if count >= len(rows):
+                # 扩容时替换为新数组，快照中的旧数组保持不变
+                rows = np.concatenate([rows, np.zeros(len(rows), dtype=np.int32)])
+                weights = np.concatenate([weights, np.zeros(len(weights), dtype=np.float32)])
+            rows[count] = index
+            weights[count] = weight
+            posting[0], posting[1] = rows, weights
+        posting[2] = count + 1
+
+    def exact(self, key: str) -> Optional[int]:
+        """查找规范化名称完全相同的记录序号"""
+        return self._exact.get(key)
+
+    def snapshot(self, vector: Dict[int, float]) -> list:
+        """
+        在缓存锁内取得与查询共享n-gram的倒排片段
+
+        Returns:
+            [(记录序号, 权重, 有效长度, 查询权重), ...]
+        """
+        parts = []
+        for bucket, weight in vector.items():
+            posting = self._postings.get(bucket)
+            if posting is not None:
+                parts.append((posting[0], posting[1], posting[2], weight))
+        return parts
+
+    @staticmethod
+    def score(parts: list) -> Optional[Tuple[int, float]]:
+        """基于快照计算最相似的记录（在锁外调用），返回(序号, 相似度)"""
+        if not parts:
+            return None
+        if not isinstance(parts[0][0], list):
+            rows = np.concatenate([part[0][:part[2]] for part in parts])
+            weights = np.concatenate([part[1][:part[2]] * part[3] for part in parts])
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+            best = int(np.argmax(scores))
+            return int(candidates[best]), float(scores[best])
+
+        scores: Dict[int, float] = {}
+        for rows, weights, count, query_weight in parts:
+            for i in range(count):
+                scores[rows[i]] = scores.get(rows[i], 0.0) + weights[i] * query_weight
+        best = max(scores, key=scores.get)
+        return best, scores[best]
+
+
+class SimilarityCache:
+    """近重复文件名相似度缓存"""
+
+    # 文件名中的数字串（日期、序号、版本号等）统一替换为占位符
+    _DIGITS_PATTERN = re.compile(r"\d+")
+    # 空白和常见分隔符号不参与相似度计算
+    _NOISE_PATTERN = re.compile(r"[\s_\-—.·,，。、()（）\[\]【】]+")
+
+    def __init__(self, threshold: float = 0.92, audit_rate: float = 0.0, dim: int = 2048,
+                 max_entries: int = 200000):
+        """
+        初始化相似度缓存
+
+        Args:
+            threshold: 复用分类结果的最低相似度（0~1）
+            audit_rate: 命中后抽样复核的比例（0~1）
+            dim: n-gram哈希桶数
+            max_entries: 每个命名空间最多索引的名称数
+        """
+        _load_numpy()
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.dim = dim
+        self.max_entries = max_entries
+        self._indexes: Dict[Tuple[str, str], _SimilarityIndex] = {}
+        self._lock = threading.RLock()
+
+        # 统计信息
+        self.lookups = 0
+        self.hits = 0
+        self.audits = 0
+        self.audit_mismatches = 0
+        self.mismatch_samples: List[Dict[str, Any]] = []
+
+    @classmethod
+    def normalize(cls, name: str, entry_type: str = "文件") -> str:
+        """
+        规范化文件名
+
+        Args:
+            name: 文件名
+            entry_type: 条目类型（文件/文件夹）
+
+        Returns:
+            规范化后的名称
+        """
+        if entry_type == "文件":
+            name = os.path.splitext(name)[0]
+        name = cls._DIGITS_PATTERN.sub("#", name.lower())
+        return cls._NOISE_PATTERN.sub("", name)
+
+    @staticmethod
+    def rules_key(classification_rules: str) -> str:
+        """计算分类规则的版本标识（与编译规则的内容哈希一致）"""
+        return rules_hash(classification_rules)
+
+    def _vectorize(self, text: str) -> Dict[int, float]:
+        """将规范化名称转换为L2归一化的稀疏n-gram哈希向量（桶 -> 权重）"""
+        padded = f"^{text}$"
+        counts: Dict[int, float] = {}
+        for n in (2, 3):
+            for i in range(len(padded) - n + 1):
+                bucket = zlib.crc32(padded[i:i + n].encode("utf-8")) % self.dim
+                counts[bucket] = counts.get(bucket, 0.0) + 1.0
+
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {k: v / norm for k, v in counts.items()}
+
+    def lookup(self, name: str, entry_type: str, classification_rules: str) -> Optional[Dict[str, Any]]:
+        """
+        查找近重复名称的分类结果
+
+        Args:
+            name: 文件名
+            entry_type: 条目类型（文件/文件夹）
+            classification_rules: 分类规则
+
+        Returns:
+            命中时返回{"result", "similarity", "matched_name"}，否则返回None
+        """
+        key = self.normalize(name, entry_type)
+        namespace = (entry_type, self.rules_key(classification_rules))
+        vector = self._vectorize(key)
+
+        with self._lock:
+            self.lookups += 1
+            index = self._indexes.get(namespace)
+            if index is None:
+                return None
+            position = index.exact(key)
+            parts = index.snapshot(vector) if position is None else None
+
+        # 相似度在锁外基于快照计算，不阻塞其他线程的查找和添加
+        found = (position, 1.0) if position is not None else index.score(parts)
+        if found is None or found[1] < self.threshold:
+            return None
+
+        position, score = found
+        with self._lock:
+            self.hits += 1
+            return {
+                "result": index.results[position],
+                "similarity": min(score, 1.0),
+                "matched_name": index.names[position]
+            }
+
+    def add(self, name: str, entry_type: str, classification_rules: str, result: str):
+        """
+        记录已分类的名称
+
+        Args:
+            name: 文件名
+            entry_type: 条目类型（文件/文件夹）
+            classification_rules: 分类规则
+            result: 分类结果
+        """
+        key = self.normalize(name, entry_type)
+        namespace = (entry_type, self.rules_key(classification_rules))
+        vector = self._vectorize(key)
+
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = _SimilarityIndex(self.max_entries)
+            index.add(key, name, result, vector)
+
+    def record_audit(self, name: str, matched_name: str, reused: str, actual: str):
+        """
+        记录抽样复核结果
+
+        Args:
+            name: 文件名
+            matched_name: 命中的已分类名称
+            reused: 复用的分类结果
+            actual: 大模型给出的分类结果
+        """
+        with self._lock:
+            self.audits += 1
+            if reused != actual:
+                self.audit_mismatches += 1
+                if len(self.mismatch_samples) < 100:
+                    self.mismatch_samples.append({
+                        "name": name,
+                        "matched_name": matched_name,
+                        "reused": reused,
+                        "actual": actual
+                    })
+                logger.warning(f"相似度复用复核不一致: {name} (参照 {matched_name}) - 复用: {reused}, 实际: {actual}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取统计信息
+
+        Returns:
+            命中率与复核统计
+        """
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "audits": self.audits,
+                "audit_mismatches": self.audit_mismatches,
+                "false_reuse_rate": self.audit_mismatches / self.audits if self.audits else 0.0,
+                "mismatch_samples": list(self.mismatch_samples)
+            }
+
+    def reset_stats(self):
+        """重置统计信息（保留已索引的名称）"""
+        with self._lock:
+            self.lookups = 0
+            self.hits = 0
+            self.audits = 0
+            self.audit_mismatches = 0
+            self.mismatch_samples = []
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._indexes.clear()
+            self.reset_stats()
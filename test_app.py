@@ -7,13 +7,39 @@ import unittest
 import tempfile
 import os
 import shutil
+import threading
+import functools
+import time
+import subprocess
+import sys
 from pathlib import Path
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
+import asyncio
+import gc
+import json
+import weakref
 
 # 导入要测试的模块
-from config import config_manager, APIConfig, AppConfig
+from config import config_manager, APIConfig, AppConfig, ProviderProfile
 from file_processor import FileProcessor, FileItem
-from api_service import APIService
+from archive_index import INDEX_FILE_NAME
+from async_processor import AsyncFileProcessor
+from api_service import APIService, RateLimiter, LatencyTracker
+from ui_components import ProgressThrottler
+from similarity_cache import SimilarityCache
+from rule_engine import RuleEngine
+from compiled_rules import compile_rules, rules_hash, RulesWatcher, RulesDiff
+from reclassifier import ArchiveReclassifier, scan_archive
+from catalog import ArchiveCatalog, expires_at
+from name_grouping import normalize_stem, group_items
+from sharded_runner import partition_items, merge_similarity_stats, ShardedRunner
+import similarity_cache
+import http_pool
+from token_budget import TokenBudget, BUDGET_NORMAL, BUDGET_ECONOMY, BUDGET_EXHAUSTED
+from profiler import RunProfiler
+from move_engine import MoveEngine, SUPPORTS_DIR_FD
+from events import EventBus, ITEM_STARTED, CLASSIFIED, MOVED, FAILED, STAGE
+from buckets import parse_year_month, bucket_name, is_bucket_name, BucketPlanner
 
 
 class TestConfigManager(unittest.TestCase):
@@ -74,6 +100,16 @@ class TestFileProcessor(unittest.TestCase):
         self.temp_dir = tempfile.mkdtemp()
         self.processor = FileProcessor()
         
+        # 使用临时目录中的配置，避免写入程序目录
+        self.config_dir = tempfile.mkdtemp()
+        self.config_manager = config_manager.__class__(self.config_dir)
+        self.config_patcher = patch("file_processor.config_manager", self.config_manager)
+        self.config_patcher.start()
+        # 单元测试不发送预检请求
+        app_config = self.config_manager.load_config()
+        app_config.preflight_connections = 0
+        self.config_manager.save_config()
+        
         # 创建测试文件
         self.test_files = [
             "test1.txt",
@@ -91,7 +127,9 @@ class TestFileProcessor(unittest.TestCase):
     
     def tearDown(self):
         """测试后清理"""
+        self.config_patcher.stop()
         shutil.rmtree(self.temp_dir)
+        shutil.rmtree(self.config_dir)
     
     def test_load_files(self):
         """测试文件加载"""
@@ -124,6 +162,561 @@ class TestFileProcessor(unittest.TestCase):
             period_path = os.path.join(self.temp_dir, period)
             self.assertTrue(os.path.exists(period_path))
     
+    @patch("file_processor.api_service")
+    def test_cancel_stops_new_work(self, mock_api_service):
+        """测试取消后不再领取新条目"""
+        self.processor.load_files(self.temp_dir)
+        
+        def classify(name, entry_type, rules):
+            self.processor.cancel()
+            return True, "短期-办公室", {}
+        
+        mock_api_service.classify_file.side_effect = classify
+        mock_api_service.get_similarity_stats.return_value = {}
+        self.config_manager.load_config().group_similar_names = False
+        self.config_manager.save_config()
+        result = self.processor.process_all_files("规则", max_workers=1)
+        
+        self.assertTrue(result["cancelled"])
+        self.assertEqual(result["success_count"], 1)
+        self.assertEqual(result["cancelled_count"], 2)
+        self.assertEqual(mock_api_service.classify_file.call_count, 1)
+        self.assertTrue(os.path.exists(result["report_file"]))
+        
+        # 重新开始时只处理未完成的条目
+        mock_api_service.classify_file.side_effect = None
+        mock_api_service.classify_file.return_value = (True, "短期-办公室", {})
+        result = self.processor.process_all_files("规则", max_workers=2)
+        self.assertFalse(result["cancelled"])
+        self.assertEqual(result["total_files"], 2)
+        self.assertEqual(result["success_count"], 2)
+    
+    @patch("file_processor.api_service")
+    def test_pause_and_resume(self, mock_api_service):
+        """测试暂停期间不领取新条目，继续后处理完成"""
+        self.processor.load_files(self.temp_dir)
+        calls = []
+        
+        def classify(name, entry_type, rules):
+            calls.append(name)
+            if len(calls) == 1:
+                self.processor.pause()
+                threading.Timer(0.3, self.processor.resume).start()
+            return True, "长期-财务资金部", {}
+        
+        mock_api_service.classify_file.side_effect = classify
+        result = self.processor.process_all_files("规则", max_workers=1)
+        
+        self.assertFalse(result["cancelled"])
+        self.assertEqual(result["success_count"], 3)
+        self.assertFalse(self.processor.is_paused())
+    
+    @patch("file_processor.api_service")
+    def test_group_numbered_series(self, mock_api_service):
+        """测试同名系列文件只调用一次大模型"""
+        for i in range(1, 6):
+            with open(os.path.join(self.temp_dir, f"XX合同_{i:03d}.pdf"), "w") as f:
+                f.write("合同")
+        with open(os.path.join(self.temp_dir, "XX合同_001 - 副本.pdf"), "w") as f:
+            f.write("合同")
+        
+        self.processor.load_files(self.temp_dir)
+        mock_api_service.classify_file.return_value = (True, "永久-经营管理部（法律合约部）", {})
+        mock_api_service.get_similarity_stats.return_value = {}
+        result = self.processor.process_all_files("规则", max_workers=2)
+        
+        # 9个条目分为3组：XX合同系列、test1/test2、test_folder
+        self.assertEqual(result["success_count"], 9)
+        self.assertEqual(result["collapsed_calls"], 6)
+        self.assertEqual(mock_api_service.classify_file.call_count, 3)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.temp_dir, "永久", "经营管理部（法律合约部）", "XX合同_001 - 副本.pdf")))
+
+    @patch("file_processor.RulesWatcher", functools.partial(RulesWatcher, check_interval=0))
+    @patch("file_processor.api_service")
+    def test_rules_hot_reload(self, mock_api_service):
+        """测试运行中修改规则后，新领取的条目使用新规则"""
+        self.processor.load_files(self.temp_dir)
+        self.config_manager.save_classification_rules("旧规则")
+        self.config_manager.load_config().group_similar_names = False
+        self.config_manager.save_config()
+        seen_rules = []
+        
+        def classify(name, entry_type, rules):
+            seen_rules.append(rules)
+            if len(seen_rules) == 1:
+                self.config_manager.save_classification_rules("新规则内容")
+            return True, "短期-办公室", {}
+        
+        mock_api_service.classify_file.side_effect = classify
+        result = self.processor.process_all_files("旧规则", max_workers=1)
+        
+        self.assertEqual(seen_rules, ["旧规则", "新规则内容", "新规则内容"])
+        self.assertEqual(result["rules_reloads"], 1)
+        self.assertEqual(result["rules_version"], rules_hash("新规则内容"))
+        self.assertEqual(self.processor.file_items[0].rules_version, rules_hash("旧规则"))
+    
+    @patch("file_processor.api_service")
+    def test_plan_then_apply(self, mock_api_service):
+        """测试生成移动计划不改动文件，执行计划后完成移动"""
+        self.processor.load_files(self.temp_dir)
+        mock_api_service.classify_file.return_value = (True, "短期-办公室", {"confidence": 0.9})
+        mock_api_service.get_similarity_stats.return_value = {}
+        plan_file = os.path.join(self.config_dir, "plan.jsonl")
+        
+        result = self.processor.create_plan("规则", plan_file, max_workers=2)
+        self.assertTrue(result["success"])
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), sorted(self.test_files))
+        
+        header, entries = FileProcessor.load_plan(plan_file)
+        self.assertEqual(header["source_folder"], self.temp_dir)
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[0]["confidence"], 0.9)
+        
+        result = FileProcessor().apply_plan(plan_file, max_workers=2)
+        self.assertEqual(result["success_count"], 3)
+        self.assertEqual(result["skipped_count"], 0)
+        for file_name in self.test_files:
+            self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "短期", "办公室", file_name)))
+        
+        # 执行计划后条目写入目录数据库
+        catalog = FileProcessor.catalog()
+        try:
+            self.assertEqual(catalog.department_counts("短期"), {"办公室": 3})
+            row = catalog.find(os.path.join(self.temp_dir, "test1.txt"))
+            self.assertEqual(row["size"], len("Test content for test1.txt"))
+            self.assertIsNone(row["hash"])
+        finally:
+            catalog.close()
+        
+        # 内容摘要需要开启；排序时已统计的文件夹大小直接复用
+        item = FileItem("test1.txt", os.path.join(self.temp_dir, "test1.txt"), "文件")
+        item.classification_result = "短期-办公室"
+        item.target_path = os.path.join(self.temp_dir, "短期", "办公室", "test1.txt")
+        self.assertIsNotNone(ArchiveCatalog.describe(item, "run1", content_hash=True)["hash"])
+        folder = FileItem("test_folder", os.path.join(self.temp_dir, "test_folder"), "文件夹")
+        folder.classification_result = "短期-办公室"
+        folder.target_path = os.path.join(self.temp_dir, "短期", "办公室", "test_folder")
+        folder.size = 12345
+        with patch("catalog.folder_size") as mock_folder_size:
+            self.assertEqual(ArchiveCatalog.describe(folder, "run1")["size"], 12345)
+        mock_folder_size.assert_not_called()
+        
+    @patch("file_processor.api_service")
+    def test_reclassify_only_affected(self, mock_api_service):
+        """测试规则变化后只重新分类受影响的已归档条目"""
+        for file_name in ["采购合同.pdf", "安全检查记录.xlsx"]:
+            with open(os.path.join(self.temp_dir, file_name), "w") as f:
+                f.write("内容")
+        old_rules = "含合同等关键词的归经营管理部；含安全等关键词的归安全部；满足合同等条件的永久保管"
+        new_rules = "含合同、协议等关键词的归法律合约部；含安全等关键词的归安全部；满足合同等条件的永久保管"
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_api_service.classify_file.side_effect = lambda name, entry_type, rules: (
+            True, "永久-经营管理部" if "合同" in name else "短期-安全部", {})
+        self.processor.load_files(self.temp_dir)
+        self.processor.file_items = [item for item in self.processor.file_items if not item.name.startswith("test")]
+        self.processor.process_all_files(old_rules, max_workers=1)
+        
+        mock_api_service.classify_file.reset_mock()
+        mock_api_service.classify_file.side_effect = lambda name, entry_type, rules: (True, "永久-法律合约部", {})
+        result = ArchiveReclassifier(self.processor).run(self.temp_dir, new_rules, max_workers=1)
+        
+        self.assertEqual(result["scanned_count"], 2)
+        self.assertEqual(result["affected_count"], 1)
+        self.assertEqual(result["moved_count"], 1)
+        self.assertEqual(mock_api_service.classify_file.call_args[0][0], "采购合同.pdf")
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "永久", "法律合约部", "采购合同.pdf")))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "短期", "安全部", "安全检查记录.xlsx")))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "永久", "经营管理部")))
+        
+        # 只改措辞的规则不触发重新分类
+        mock_api_service.classify_file.reset_mock()
+        result = ArchiveReclassifier(self.processor).run(self.temp_dir, new_rules.replace("；", "。"), max_workers=1)
+        self.assertEqual((result["affected_count"], result["text_only_skipped"]), (0, 2))
+        mock_api_service.classify_file.assert_not_called()
+
+    @patch("file_processor.api_service")
+    def test_bucketed_targets(self, mock_api_service):
+        """测试部门目录按年份分桶，扫描归档目录时分桶子目录中的条目仍归属部门"""
+        self.assertEqual(parse_year_month("2023年3月会议纪要.docx"), (2023, 3))
+        self.assertEqual(parse_year_month("20240115报告.pdf"), (2024, 1))
+        self.assertIsNone(parse_year_month("编号123456.pdf"))
+        self.assertEqual(bucket_name("month", "2023-03-15会议纪要.docx", ""), "2023年03月")
+        self.assertTrue(is_bucket_name(bucket_name("hash", "test1.txt", "", hash_chars=3)))
+
+        for file_name in ["2023年3月会议纪要.docx", "20240115报告.pdf"]:
+            with open(os.path.join(self.temp_dir, file_name), "w") as f:
+                f.write("内容")
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_api_service.classify_file.return_value = (True, "短期-办公室", {})
+        app_config = self.config_manager.load_config()
+        app_config.bucket_by = "year"
+        app_config.group_similar_names = False
+        self.config_manager.save_config()
+        self.processor.load_files(self.temp_dir)
+        self.processor.process_all_files("规则", max_workers=1)
+
+        department = os.path.join(self.temp_dir, "短期", "办公室")
+        this_year = f"{time.localtime().tm_year}年"
+        self.assertTrue(os.path.exists(os.path.join(department, "2023年", "2023年3月会议纪要.docx")))
+        self.assertTrue(os.path.exists(os.path.join(department, "2024年", "20240115报告.pdf")))
+        self.assertTrue(os.path.isdir(os.path.join(department, this_year, "test_folder")))
+
+        entries = {name: (period, dept) for name, _, period, dept in scan_archive(self.temp_dir)}
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(entries["20240115报告.pdf"], ("短期", "办公室"))
+
+        # 清空后的分桶子目录随重新分类一并删除，并移出已存在目录缓存
+        os.rename(os.path.join(department, "2024年", "20240115报告.pdf"), os.path.join(self.temp_dir, "报告.pdf"))
+        ArchiveReclassifier(self.processor)._remove_empty_directories(self.temp_dir, "规则")
+        self.assertFalse(os.path.exists(os.path.join(department, "2024年")))
+        self.assertNotIn(os.path.join(department, "2024年"), self.processor._known_dirs)
+
+    @patch("file_processor.api_service")
+    def test_preflight_gates_run(self, mock_api_service):
+        """测试预检失败时不创建目录直接返回错误，预检估计的并行能力限制工作线程数"""
+        app_config = self.config_manager.load_config()
+        app_config.preflight_connections = 2
+        self.config_manager.save_config()
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_api_service.preflight.return_value = {"ok": False, "error": "doubao（doubao-pro-32k-241215）: invalid key",
+                                                   "providers": {}, "concurrency": None, "duration": 0.1}
+        self.processor.load_files(self.temp_dir)
+        result = self.processor.process_all_files("规则", max_workers=4)
+        self.assertFalse(result["success"])
+        self.assertIn("预检失败", result["error"])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "短期")))
+        mock_api_service.classify_file.assert_not_called()
+
+        mock_api_service.preflight.return_value = {"ok": True, "error": None, "providers": {},
+                                                   "concurrency": 1, "duration": 0.1}
+        mock_api_service.classify_file.return_value = (True, "短期-办公室", {})
+        self.assertEqual(self.processor._preflight_workers(4), 4)
+        result = self.processor.process_all_files("规则", max_workers=4)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["preflight"]["concurrency"], 1)
+        self.assertEqual(self.processor._preflight_workers(4), 1)
+
+    @patch("async_processor.config_manager")
+    @patch("async_processor.api_service")
+    @patch("file_processor.api_service")
+    def test_async_process_all_files(self, mock_api_service, mock_async_api_service, mock_async_config):
+        """测试异步处理器分类、移动并导出报告"""
+        mock_async_config.load_config.return_value = self.config_manager.load_config()
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_async_api_service.classify_file_async = AsyncMock(return_value=(True, "短期-办公室", {"engine": "llm"}))
+        processor = AsyncFileProcessor(io_workers=2)
+        report_file = os.path.join(self.config_dir, "report.txt")
+        
+        async def run():
+            await processor.load_files_async(self.temp_dir)
+            result = await processor.process_all_files_async("规则", max_concurrency=2)
+            await processor.export_results_async(report_file)
+            return result
+        
+        try:
+            result = asyncio.run(run())
+        finally:
+            processor.close()
+        
+        self.assertEqual(result["success_count"], 3)
+        # test1.txt与test2.docx名称主干相同，只分类一次
+        self.assertEqual(mock_async_api_service.classify_file_async.await_count, 2)
+        self.assertEqual(result["collapsed_calls"], 1)
+        for file_name in self.test_files:
+            self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "短期", "办公室", file_name)))
+        with open(report_file, "r", encoding="utf-8") as f:
+            self.assertIn("成功处理: 3", f.read())
+    
+    @patch("async_processor.config_manager")
+    @patch("async_processor.api_service")
+    @patch("file_processor.api_service")
+    def test_async_buckets_resolved_off_loop(self, mock_api_service, mock_async_api_service, mock_async_config):
+        """测试异步处理时分桶目标目录在线程池中计算，不阻塞事件循环"""
+        app_config = self.config_manager.load_config()
+        app_config.bucket_by = "year"
+        app_config.bucket_threshold = 1
+        mock_async_config.load_config.return_value = app_config
+        self.config_manager.save_config()
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_async_api_service.classify_file_async = AsyncMock(return_value=(True, "短期-办公室", {"engine": "llm"}))
+        processor = AsyncFileProcessor(io_workers=2)
+        threads = []
+        
+        async def run():
+            await processor.load_files_async(self.temp_dir)
+            loop_thread = threading.current_thread()
+            original = BucketPlanner.target_dir
+            
+            def target_dir(planner, *args):
+                threads.append(threading.current_thread() is loop_thread)
+                return original(planner, *args)
+            
+            with patch.object(BucketPlanner, "target_dir", target_dir):
+                return await processor.process_all_files_async("规则", max_concurrency=2)
+        
+        try:
+            result = asyncio.run(run())
+        finally:
+            processor.close()
+        
+        self.assertEqual(result["success_count"], 3)
+        self.assertEqual(threads, [False] * 3)
+        
+    @patch("async_processor.api_service")
+    @patch("file_processor.api_service")
+    def test_async_processor_sync_plan_preflight(self, mock_api_service, mock_async_api_service):
+        """测试异步处理器通过同步入口生成计划时改用同步预检"""
+        app_config = self.config_manager.load_config()
+        app_config.preflight_connections = 2
+        self.config_manager.save_config()
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_api_service.classify_file.return_value = (True, "短期-办公室", {})
+        mock_api_service.preflight.return_value = {"ok": True, "error": None, "providers": {},
+                                                   "concurrency": None, "duration": 0.0}
+        processor = AsyncFileProcessor(io_workers=2)
+        plan_file = os.path.join(self.config_dir, "plan.jsonl")
+        try:
+            processor.load_files(self.temp_dir)
+            result = processor.create_plan("规则", plan_file, max_workers=1)
+        finally:
+            processor.close()
+        
+        self.assertTrue(result["success"])
+        mock_api_service.preflight.assert_called_once()
+        mock_async_api_service.preflight_async.assert_not_called()
+        self.assertTrue(os.path.exists(plan_file))
+        
+    @patch("file_processor.api_service")
+    def test_iter_results_streams_items(self, mock_api_service):
+        """测试结果流：条目完成时逐个产出，最后给出不含条目列表的统计；提前停止迭代会取消运行"""
+        mock_api_service.classify_file.return_value = (True, "短期-办公室", {})
+        mock_api_service.get_similarity_stats.return_value = {}
+        self.config_manager.load_config().group_similar_names = False
+        self.processor.load_files(self.temp_dir)
+        
+        events = list(self.processor.iter_results("规则", max_workers=2, dry_run=True, buffer_size=1))
+        items = [event["item"].name for event in events if event["event"] == "item"]
+        self.assertEqual(sorted(items), sorted(self.test_files))
+        self.assertEqual(events[-2]["event"], "snapshot")
+        self.assertEqual((events[-2]["done"], events[-2]["total"]), (3, 3))
+        self.assertEqual(events[-1]["event"], "done")
+        self.assertEqual(events[-1]["result"]["success_count"], 3)
+        self.assertNotIn("file_items", events[-1]["result"])
+        
+        # 使用方提前停止：未开始的条目不再处理
+        for i in range(20):
+            with open(os.path.join(self.temp_dir, f"报告{i}.pdf"), "w") as f:
+                f.write("x")
+        self.processor.load_files(self.temp_dir)
+        mock_api_service.classify_file.reset_mock()
+        stream = self.processor.iter_results("规则", max_workers=1, dry_run=True, buffer_size=1)
+        next(event for event in stream if event["event"] == "item")
+        stream.close()
+        self.assertLess(mock_api_service.classify_file.call_count, 10)
+        self.assertIsNone(self.processor._result_sink)
+        
+    @patch("file_processor.api_service")
+    def test_iter_results_scans_in_batches(self, mock_api_service):
+        """测试边扫描边处理：按批扫描，已完成的条目不再保留，归档记录完整"""
+        alive = weakref.WeakSet()
+        
+        class TrackedItem(FileItem):
+            def __init__(self, *args):
+                super().__init__(*args)
+                alive.add(self)
+        
+        peak = [0]
+        
+        def classify(name, entry_type, rules):
+            gc.collect()
+            peak[0] = max(peak[0], len(alive))
+            return True, "短期-办公室", {}
+        
+        mock_api_service.classify_file.side_effect = classify
+        for stats in ("similarity", "escalation", "connection", "deadline", "coalescing"):
+            getattr(mock_api_service, f"get_{stats}_stats").return_value = {}
+        for i in range(20):
+            with open(os.path.join(self.temp_dir, f"报告{i}.pdf"), "w") as f:
+                f.write("x")
+        app_config = self.config_manager.load_config()
+        app_config.group_similar_names = False
+        app_config.stream_batch_size = 2
+        self.config_manager.save_config()
+        
+        names = []
+        with patch("file_processor.FileItem", TrackedItem):
+            for event in self.processor.iter_results("规则", max_workers=1, buffer_size=1,
+                                                     source_folder=self.temp_dir):
+                if event["event"] == "item":
+                    names.append(event["item"].name)
+                elif event["event"] == "done":
+                    result = event["result"]
+                del event
+        
+        self.assertEqual(len(names), 23)
+        self.assertEqual((result["total_files"], result["success_count"]), (23, 23))
+        self.assertEqual(self.processor.file_items, [])
+        self.assertLessEqual(peak[0], 8)
+        with open(os.path.join(self.temp_dir, INDEX_FILE_NAME), encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["entries"]), 23)
+        self.assertIn("总文件数: 23", self.processor.get_processing_summary())
+        
+    @patch("async_processor.config_manager")
+    @patch("async_processor.api_service")
+    @patch("file_processor.api_service")
+    def test_aiter_results_scans_in_batches(self, mock_api_service, mock_async_api_service, mock_async_config):
+        """测试异步边扫描边处理"""
+        for i in range(10):
+            with open(os.path.join(self.temp_dir, f"报告{i}.pdf"), "w") as f:
+                f.write("x")
+        app_config = self.config_manager.load_config()
+        app_config.group_similar_names = False
+        app_config.stream_batch_size = 3
+        mock_async_config.load_config.return_value = app_config
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_async_api_service.classify_file_async = AsyncMock(return_value=(True, "短期-办公室", {"engine": "llm"}))
+        processor = AsyncFileProcessor(io_workers=2)
+        
+        async def run():
+            return [event async for event in processor.aiter_results(
+                "规则", max_concurrency=2, buffer_size=1, source_folder=self.temp_dir)]
+        
+        try:
+            events = asyncio.run(run())
+        finally:
+            processor.close()
+        
+        items = [event["item"].name for event in events if event["event"] == "item"]
+        self.assertEqual(len(items), 13)
+        self.assertEqual(len(set(items)), 13)
+        self.assertEqual(events[-1]["result"]["total_files"], 13)
+        self.assertEqual(processor.file_items, [])
+        
+    @patch("async_processor.config_manager")
+    @patch("async_processor.api_service")
+    @patch("file_processor.api_service")
+    def test_aiter_results_streams_items(self, mock_api_service, mock_async_api_service, mock_async_config):
+        """测试异步结果流"""
+        mock_async_config.load_config.return_value = self.config_manager.load_config()
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_async_api_service.classify_file_async = AsyncMock(return_value=(True, "短期-办公室", {"engine": "llm"}))
+        processor = AsyncFileProcessor(io_workers=2)
+        
+        async def run():
+            await processor.load_files_async(self.temp_dir)
+            return [event async for event in processor.aiter_results("规则", max_concurrency=2, buffer_size=1)]
+        
+        try:
+            events = asyncio.run(run())
+        finally:
+            processor.close()
+        
+        items = [event["item"].name for event in events if event["event"] == "item"]
+        self.assertEqual(sorted(items), sorted(self.test_files))
+        self.assertEqual(events[-1]["result"]["success_count"], 3)
+        self.assertNotIn("file_items", events[-1]["result"])
+        
+    @patch("file_processor.api_service")
+    def test_timed_out_items_retried_at_end(self, mock_api_service):
+        """测试超过截止时间的条目在运行末尾以完整超时重试"""
+        self.processor.load_files(self.temp_dir)
+        mock_api_service.get_similarity_stats.return_value = {}
+        mock_api_service.get_escalation_stats.return_value = {}
+        mock_api_service.get_connection_stats.return_value = {}
+        mock_api_service.get_deadline_stats.return_value = {"timeouts": 1, "p95": 2.0, "deadline": 6.0}
+        mock_api_service.get_coalescing_stats.return_value = {}
+        calls = []
+        
+        def classify(name, entry_type, rules):
+            calls.append(name)
+            if name == "test_folder" and calls.count(name) == 1:
+                return False, "未分类-未分类", {"error": "请求超时（6.0秒）", "timed_out": True}
+            return True, "短期-办公室", {}
+        
+        mock_api_service.classify_file.side_effect = classify
+        result = self.processor.process_all_files("规则", max_workers=2)
+        
+        self.assertEqual(calls[-1], "test_folder")
+        self.assertEqual(result["success_count"], 3)
+        self.assertEqual(result["error_count"], 0)
+        self.assertEqual(result["quarantine_stats"]["recovered"], 1)
+        mock_api_service.set_request_deadline.assert_called_with(None)
+        self.assertIn("超时隔离: 1 个条目", self.processor.get_processing_summary())
+        
+    @patch("file_processor.api_service")
+    def test_priority_keys_order_work(self, mock_api_service):
+        """测试按优先级键排序处理顺序：匹配模式的先处理，其余按修改时间从新到旧"""
+        os.utime(os.path.join(self.temp_dir, "test_folder"), (1000, 1000))
+        for name, mtime in (("旧报告.pdf", 2000), ("新报告.pdf", 3000)):
+            path = os.path.join(self.temp_dir, name)
+            with open(path, "w") as f:
+                f.write(name)
+            os.utime(path, (mtime, mtime))
+        
+        self.processor.load_files(self.temp_dir)
+        self.processor.priority_keys = ["pattern:*folder*", "mtime"]
+        mock_api_service.classify_file.return_value = (True, "短期-办公室", {})
+        mock_api_service.get_similarity_stats.return_value = {}
+        self.processor.process_all_files("规则", max_workers=1)
+        
+        calls = [call.args[0] for call in mock_api_service.classify_file.call_args_list]
+        # test1/test2刚创建，修改时间最新
+        self.assertEqual(calls[0], "test_folder")
+        self.assertEqual(calls[-2:], ["新报告.pdf", "旧报告.pdf"])
+        
+    @patch("file_processor.api_service")
+    def test_profiling_session_tags_stages(self, mock_api_service):
+        """测试性能剖析：调用栈按处理阶段标记，输出火焰图格式的调用栈和内存报告"""
+        profiler = RunProfiler(sample_interval=0.001, snapshot_interval=60)
+        profiler.enabled = True
+        
+        def classify(name, entry_type, rules):
+            threading.Event().wait(0.05)
+            return True, "短期-办公室", {}
+        
+        mock_api_service.classify_file.side_effect = classify
+        mock_api_service.get_similarity_stats.return_value = {}
+        self.processor.load_files(self.temp_dir)
+        with patch("file_processor.run_profiler", profiler), patch("config.config_manager", self.config_manager):
+            with profiler.session("test"):
+                self.processor.process_all_files("规则", max_workers=1)
+        
+        folded_file, memory_file = profiler.outputs
+        self.assertTrue(folded_file.startswith(self.config_dir))
+        with open(folded_file, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertIn("classify", {line.split(";")[0] for line in lines})
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertTrue(any("classify (" in line for line in lines))
+        with open(memory_file, encoding="utf-8") as f:
+            report = f.read()
+        self.assertIn("阶段 classify 结束时分配最多的", report)
+        self.assertIn("阶段 finish 结束时分配最多的", report)
+        
+    def test_move_engine_renames_relative_to_directory_handles(self):
+        """测试移动引擎以目录句柄重命名，目标已存在时与shutil.move一致（移入已有文件夹）"""
+        engine = MoveEngine()
+        target_dir = os.path.join(self.temp_dir, "短期", "办公室")
+        os.makedirs(target_dir)
+        try:
+            engine.move(os.path.join(self.temp_dir, "test1.txt"), os.path.join(target_dir, "test1.txt"))
+            engine.move(os.path.join(self.temp_dir, "test2.docx"), os.path.join(target_dir, "test2.docx"))
+            os.makedirs(os.path.join(target_dir, "test_folder"))
+            engine.move(os.path.join(self.temp_dir, "test_folder"), os.path.join(target_dir, "test_folder"))
+            
+            self.assertTrue(engine.exists(os.path.join(target_dir, "test1.txt")))
+            self.assertFalse(engine.exists(os.path.join(self.temp_dir, "test1.txt")))
+            self.assertTrue(os.path.isdir(os.path.join(target_dir, "test_folder", "test_folder")))
+            if SUPPORTS_DIR_FD:
+                self.assertEqual((engine.renames, engine.fallbacks), (2, 1))
+                self.assertEqual(len(engine._handles), 2)
+            with self.assertRaises(OSError):
+                engine.move(os.path.join(self.temp_dir, "不存在.txt"), os.path.join(target_dir, "不存在.txt"))
+        finally:
+            engine.close()
+        self.assertEqual(engine._handles, {})
+        
     def test_get_file_list_display(self):
         """测试文件列表显示"""
         self.processor.load_files(self.temp_dir)
@@ -134,6 +727,38 @@ class TestFileProcessor(unittest.TestCase):
         self.assertIn("test_folder", display_text)
 
 
+class TestNameGrouping(unittest.TestCase):
+    """文件名分组测试"""
+    
+    def test_normalize_stem(self):
+        """测试去除日期、序号、扩展名和副本标记"""
+        for name in ["XX合同_001.pdf", "XX合同_400.pdf", "XX合同_001 - 副本.pdf", "XX合同(1).pdf"]:
+            self.assertEqual(normalize_stem(name), "xx合同")
+        self.assertEqual(normalize_stem("2024年3月工程例会纪要.docx"), "工程例会纪要")
+        self.assertEqual(normalize_stem("20240305安全检查记录.xlsx"), "安全检查记录")
+        self.assertEqual(normalize_stem("第3期 党建简报.doc"), "党建简报")
+    
+    def test_group_items(self):
+        """测试按条目类型和名称主干分组"""
+        items = [
+            FileItem("XX合同_001.pdf", "/a/XX合同_001.pdf", "文件"),
+            FileItem("财务决算.xls", "/a/财务决算.xls", "文件"),
+            FileItem("XX合同_002.pdf", "/a/XX合同_002.pdf", "文件"),
+            FileItem("XX合同_003", "/a/XX合同_003", "文件夹"),
+            FileItem("001.pdf", "/a/001.pdf", "文件"),
+            FileItem("002.pdf", "/a/002.pdf", "文件"),
+        ]
+        groups = group_items(items)
+        
+        self.assertEqual([[item.name for item in group] for group in groups], [
+            ["XX合同_001.pdf", "XX合同_002.pdf"],
+            ["财务决算.xls"],
+            ["XX合同_003"],
+            ["001.pdf"],
+            ["002.pdf"],
+        ])
+
+
 class TestFileItem(unittest.TestCase):
     """文件项测试"""
     
@@ -161,6 +786,17 @@ class TestAPIService(unittest.TestCase):
     def setUp(self):
         """测试前准备"""
         self.api_service = APIService()
+        
+        # 使用临时目录中的配置，避免写入程序目录
+        self.config_dir = tempfile.mkdtemp()
+        self.config_manager = config_manager.__class__(self.config_dir)
+        self.config_patcher = patch("api_service.config_manager", self.config_manager)
+        self.config_patcher.start()
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.config_patcher.stop()
+        shutil.rmtree(self.config_dir)
     
     def test_get_model_name(self):
         """测试模型名称获取"""
@@ -170,6 +806,24 @@ class TestAPIService(unittest.TestCase):
         self.assertEqual(doubao_model, "doubao-pro-32k-241215")
         self.assertEqual(deepseek_model, "deepseek-chat")
     
+    def test_provider_profiles(self):
+        """测试服务商配置：自定义本地服务、沿用旧版密钥、未配置的类型"""
+        api_config = APIConfig(api_type="gateway", doubao_api_key="旧密钥", profiles={
+            "gateway": ProviderProfile(base_url="http://127.0.0.1:8080/v1", model="qwen2.5-3b")
+        })
+        self.api_service.update_config(api_config)
+        
+        self.assertTrue(api_config.has_credentials())
+        self.assertEqual(api_config.profile_names(), ["doubao", "deepseek", "local", "gateway"])
+        self.assertEqual(api_config.get_profile("doubao").api_key, "旧密钥")
+        self.assertEqual(self.api_service._get_model_name("gateway"), "qwen2.5-3b")
+        self.assertEqual(str(self.api_service._get_client("gateway").base_url), "http://127.0.0.1:8080/v1/")
+        with self.assertRaises(ValueError):
+            self.api_service._get_model_name("missing")
+        
+        # 远程服务没有密钥时不可用
+        self.assertFalse(APIConfig(api_type="deepseek").has_credentials())
+    
     @patch.object(APIService, '_get_client')
     def test_test_connection_success(self, mock_get_client):
         """测试连接成功"""
@@ -202,6 +856,756 @@ class TestAPIService(unittest.TestCase):
         success, message = self.api_service.test_connection("doubao")
         self.assertFalse(success)
         self.assertIn("API错误", message)
+    
+    @patch.object(APIService, "_request_classification")
+    @patch.object(APIService, "_get_similarity_cache")
+    def test_classify_file_reuses_similar_result(self, mock_get_cache, mock_request):
+        """测试近重复文件名不重复调用大模型"""
+        mock_get_cache.return_value = SimilarityCache(threshold=0.9, audit_rate=0.0)
+        mock_request.return_value = (True, "长期-生产管理部", {"engine": "llm"})
+        
+        self.api_service.classify_file("2024年3月工程例会纪要.docx", "文件", "规则")
+        success, result, details = self.api_service.classify_file("2024年4月工程例会纪要.docx", "文件", "规则")
+        
+        self.assertTrue(success)
+        self.assertEqual(result, "长期-生产管理部")
+        self.assertEqual(details["engine"], "similarity")
+        self.assertEqual(mock_request.call_count, 1)
+    
+    @patch.object(APIService, "_request_classification")
+    @patch.object(APIService, "_get_similarity_cache")
+    def test_audit_mismatch_corrects_cache(self, mock_get_cache, mock_request):
+        """测试抽样复核不一致时更正缓存，之后的近重复名称复用大模型的新结果"""
+        cache = SimilarityCache(threshold=0.9, audit_rate=0.0)
+        cache.add("2024年3月工程例会纪要.docx", "文件", "规则", "长期-生产管理部")
+        mock_get_cache.return_value = cache
+        mock_request.return_value = (True, "短期-办公室", {"engine": "llm"})
+        
+        cache.audit_rate = 1.0
+        success, result, details = self.api_service.classify_file("2024年4月工程例会纪要.docx", "文件", "规则")
+        self.assertEqual(result, "短期-办公室")
+        self.assertTrue(details["audited"])
+        self.assertEqual(cache.get_stats()["audit_mismatches"], 1)
+        
+        cache.audit_rate = 0.0
+        success, result, details = self.api_service.classify_file("2024年5月工程例会纪要.docx", "文件", "规则")
+        self.assertEqual(details["engine"], "similarity")
+        self.assertEqual(result, "短期-办公室")
+        self.assertEqual(mock_request.call_count, 1)
+    
+    @patch.object(APIService, "_classify_with_confidence", return_value=(True, "短期-办公室", {"engine": "llm"}))
+    def test_classify_file_loads_config_once(self, mock_classify):
+        """测试每次分类只加载一次配置"""
+        with patch.object(self.config_manager, "load_config", wraps=self.config_manager.load_config) as mock_load:
+            self.api_service.classify_file("通知.pdf", "文件", "规则")
+        self.assertEqual(mock_load.call_count, 1)
+    
+    @patch.object(APIService, "_request_classification")
+    @patch.object(APIService, "_get_similarity_cache", return_value=None)
+    def test_low_confidence_escalates(self, mock_get_cache, mock_request):
+        """测试与规则引擎不一致的结果请求第二意见"""
+        rules = self.config_manager.load_classification_rules()
+        mock_request.side_effect = [
+            (True, "短期-办公室（党委办公室、党委工作部）", {"engine": "llm"}),
+            (True, "永久-财务资金部", {"engine": "llm"})
+        ]
+        
+        success, result, details = self.api_service.classify_file("2023年度财务决算报告.pdf", "文件", rules)
+        
+        self.assertEqual(result, "永久-财务资金部")
+        self.assertTrue(details["escalated"])
+        self.assertGreater(details["confidence"], 0.6)
+        self.assertEqual(self.api_service.get_escalation_stats()["escalation_changes"], 1)
+        
+        # 与规则引擎一致的结果不再复查
+        mock_request.side_effect = None
+        mock_request.return_value = (True, "永久-财务资金部", {"engine": "llm"})
+        self.api_service.classify_file("2022年度财务决算报告.pdf", "文件", rules)
+        self.assertEqual(mock_request.call_count, 3)
+    
+    def test_escalation_target_uses_profiles(self):
+        """测试第二意见可使用无需密钥的本地服务和自带密钥的自定义服务商，未配置密钥时退回当前服务商"""
+        self.api_service.config = APIConfig(api_type="doubao", doubao_api_key="test_key")
+        self.api_service.config.profiles["gateway"] = ProviderProfile(
+            base_url="https://llm.example.com/v1", model="qwen-max", api_key="gateway_key")
+        
+        self.assertEqual(self.api_service._escalation_target(AppConfig(escalation_api_type="local")),
+                         ("local", "qwen2.5:7b-instruct"))
+        self.assertEqual(self.api_service._escalation_target(AppConfig(escalation_api_type="gateway")),
+                         ("gateway", "qwen-max"))
+        self.assertEqual(self.api_service._escalation_target(AppConfig(escalation_api_type="deepseek")),
+                         ("doubao", "doubao-pro-32k-241215"))
+        self.assertEqual(self.api_service._preflight_targets(
+            AppConfig(escalation_api_type="gateway", escalation_threshold=0.6)),
+            [("doubao", "doubao-pro-32k-241215"), ("gateway", "qwen-max")])
+
+    @patch.object(APIService, "_request_classification")
+    @patch.object(APIService, "_get_similarity_cache", return_value=None)
+    def test_budget_falls_back_to_rule_engine(self, mock_get_cache, mock_request):
+        """测试预算用完后规则引擎能判断的条目不再调用大模型，其余条目不分类"""
+        rules = self.config_manager.load_classification_rules()
+        budget = TokenBudget()
+        budget.start(AppConfig(run_token_budget=100), 10)
+        budget.record(80, 30)
+        
+        with patch("api_service.token_budget", budget):
+            success, result, details = self.api_service.classify_file("2023年度财务决算报告.pdf", "文件", rules)
+            self.assertTrue(success)
+            self.assertEqual(result, "永久-财务资金部")
+            self.assertEqual(details["engine"], "rule")
+            
+            success, _, details = self.api_service.classify_file("杂项.txt", "文件", rules)
+            self.assertFalse(success)
+            self.assertEqual(details["error"], "预算已用完")
+        
+        mock_request.assert_not_called()
+        self.assertEqual((budget.rule_only, budget.refused), (1, 1))
+
+    
+    def test_adaptive_deadline(self):
+        """测试按耗时分位数计算截止时间，并限制在下限与全局超时之间"""
+        tracker = LatencyTracker()
+        app_config = AppConfig(timeout=30, deadline_min_samples=5, deadline_multiplier=3.0, min_deadline=5.0)
+        for _ in range(4):
+            tracker.record(2.0)
+        self.assertEqual(tracker.deadline(app_config), 30.0)
+        
+        tracker.record(3.0)
+        self.assertEqual(tracker.deadline(app_config), 9.0)
+        
+        for _ in range(100):
+            tracker.record(0.5)
+        self.assertEqual(tracker.deadline(app_config), 5.0)
+        self.assertEqual(tracker.deadline(AppConfig(timeout=30, adaptive_timeout=False)), 30.0)
+    
+    def test_timeout_streak_raises_deadline(self):
+        """测试连续超时时截止时间逐步上升，不会停留在过低的值"""
+        tracker = LatencyTracker()
+        app_config = AppConfig(timeout=60, deadline_min_samples=20, deadline_multiplier=3.0, min_deadline=5.0)
+        tracker.baseline = 0.4
+        deadlines = []
+        for _ in range(3):
+            deadlines.append(tracker.deadline(app_config))
+            tracker.record_timeout(deadlines[-1])
+        self.assertEqual(deadlines, [5.0, 15.0, 45.0])
+        self.assertEqual(tracker.deadline(app_config), 60.0)
+        
+        # 样本充足后超时比例超过分位时同样抬高截止时间
+        tracker = LatencyTracker()
+        for _ in range(20):
+            tracker.record(1.0)
+        self.assertEqual(tracker.deadline(app_config), 5.0)
+        for _ in range(5):
+            tracker.record_timeout(5.0)
+        self.assertEqual(tracker.deadline(app_config), 15.0)
+        self.assertEqual(tracker.timeouts, 5)
+    
+    def test_deadline_starts_from_preflight_baseline(self):
+        """测试样本不足时以预检基线延迟为截止时间起点"""
+        tracker = LatencyTracker()
+        app_config = AppConfig(timeout=30, deadline_min_samples=5, deadline_multiplier=3.0, min_deadline=5.0)
+        tracker.baseline = 4.0
+        self.assertEqual(tracker.deadline(app_config), 12.0)
+        
+        for _ in range(5):
+            tracker.record(1.0)
+        self.assertEqual(tracker.deadline(app_config), 5.0)
+    
+    @patch.object(APIService, '_get_client')
+    def test_preflight_estimates_local_slots(self, mock_get_client):
+        """测试预检预热连接并按本地服务的排队情况估计并行槽位，以分类大小的校准请求设置基线延迟"""
+        slot = threading.Lock()
+        
+        def create(**kwargs):
+            # 模拟只有一个并行槽位的本地服务，完整的分类请求比预热请求慢得多
+            with slot:
+                time.sleep(0.05 if kwargs.get("max_tokens") == 1 else 0.3)
+        
+        mock_client = Mock()
+        mock_client.with_options.return_value = mock_client
+        mock_client.chat.completions.create.side_effect = create
+        mock_get_client.return_value = mock_client
+        
+        self.api_service.config.api_type = "local"
+        result = self.api_service.preflight(AppConfig(preflight_connections=4, escalation_threshold=0))
+        self.assertTrue(result["ok"])
+        self.assertEqual(mock_client.chat.completions.create.call_count, 4)
+        self.assertEqual(result["providers"]["local"]["connections"], 4)
+        self.assertEqual(result["concurrency"], 1)
+        # 预热请求的耗时不作为截止时间的起点
+        self.assertIsNone(self.api_service.latency.baseline)
+        mock_client.with_options.assert_called_with(max_retries=0)
+        
+        rules = self.config_manager.load_classification_rules()
+        result = self.api_service.preflight(AppConfig(preflight_connections=4, escalation_threshold=0),
+                                            ("2023年度财务决算报告.pdf", "文件", rules))
+        self.assertEqual(mock_client.chat.completions.create.call_count, 9)
+        calibration = mock_client.chat.completions.create.call_args.kwargs
+        self.assertNotIn("max_tokens", calibration)
+        self.assertIn("2023年度财务决算报告.pdf", calibration["messages"][0]["content"])
+        self.assertGreaterEqual(result["providers"]["local"]["calibration"], 0.3)
+        self.assertEqual(self.api_service.latency.baseline, result["providers"]["local"]["calibration"])
+    
+    @patch.object(APIService, '_get_client')
+    def test_preflight_reports_config_errors(self, mock_get_client):
+        """测试缺少密钥或鉴权失败时预检失败"""
+        from openai import AuthenticationError
+        
+        class InvalidKeyError(AuthenticationError):
+            def __init__(self):
+                Exception.__init__(self, "invalid key")
+        
+        self.api_service.config.api_type = "doubao"
+        self.api_service.config.doubao_api_key = ""
+        result = self.api_service.preflight(AppConfig(preflight_connections=2, escalation_threshold=0))
+        self.assertFalse(result["ok"])
+        self.assertIn("未配置API密钥", result["error"])
+        mock_get_client.assert_not_called()
+        
+        mock_client = Mock()
+        mock_client.with_options.return_value = mock_client
+        mock_client.chat.completions.create.side_effect = InvalidKeyError()
+        mock_get_client.return_value = mock_client
+        self.api_service.config.doubao_api_key = "bad_key"
+        result = self.api_service.preflight(AppConfig(preflight_connections=2, escalation_threshold=0))
+        self.assertFalse(result["ok"])
+        self.assertIn("invalid key", result["error"])
+        self.assertIsNone(self.api_service.latency.baseline)
+    
+    @patch.object(APIService, "_get_similarity_cache", return_value=None)
+    def test_single_flight_across_threads_and_tasks(self, mock_get_cache):
+        """测试相同名称的并发请求（线程与协程混合）只调用一次大模型并共享结果"""
+        release = threading.Event()
+        calls = []
+        
+        async def classify_async(filename, entry_type, rules, app_config=None):
+            calls.append(filename)
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+            return True, "短期-办公室", {"engine": "llm"}
+        
+        def wait_for(count):
+            for _ in range(500):
+                if self.api_service.single_flight.coalesced >= count:
+                    return
+                release.wait(0.01)
+        
+        async def scenario():
+            leader = asyncio.create_task(self.api_service.classify_file_async("通知.pdf", "文件", "规则"))
+            follower_task = asyncio.create_task(self.api_service.classify_file_async("通知.pdf", "文件", "规则"))
+            cancelled_task = asyncio.create_task(self.api_service.classify_file_async("通知.pdf", "文件", "规则"))
+            thread_results = []
+            follower_thread = threading.Thread(target=lambda: thread_results.append(
+                self.api_service.classify_file("通知.pdf", "文件", "规则")))
+            await asyncio.sleep(0.05)
+            follower_thread.start()
+            await asyncio.to_thread(wait_for, 3)
+            # 取消一个等待者不影响领头者和其他等待者
+            cancelled_task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled_task
+            release.set()
+            results = [await leader, await follower_task]
+            await asyncio.to_thread(follower_thread.join)
+            return results + thread_results
+        
+        with patch.object(APIService, "_classify_with_confidence_async", side_effect=classify_async):
+            results = asyncio.run(scenario())
+        
+        self.assertEqual(calls, ["通知.pdf"])
+        self.assertEqual([result[1] for result in results], ["短期-办公室"] * 3)
+        self.assertEqual([bool(result[2].get("coalesced")) for result in results], [False, True, True])
+        self.assertEqual(self.api_service.get_coalescing_stats(), {"coalesced_calls": 3})
+        
+        # 请求结束后不再合并
+        with patch.object(APIService, "_classify_with_confidence",
+                          return_value=(True, "短期-办公室", {"engine": "llm"})) as mock_classify:
+            self.api_service.classify_file("通知.pdf", "文件", "规则")
+        mock_classify.assert_called_once()
+
+    def test_strategy_accuracy_on_gold_corpus(self):
+        """测试各分类策略在标注语料上（离线模拟模型）的准确率不低于下限"""
+        root_dir = os.path.dirname(os.path.abspath(__file__))
+        completed = subprocess.run(
+            [sys.executable, os.path.join(root_dir, "benchmarks", "classification_accuracy.py"), "--latency-scale", "0"],
+            capture_output=True, text=True, cwd=root_dir)
+
+        self.assertEqual(completed.returncode, 0, completed.stdout + completed.stderr)
+        self.assertIn("准确率检查通过", completed.stdout)
+
+
+class TestRuleEngine(unittest.TestCase):
+    """规则引擎测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.rules = config_manager.__class__(self.temp_dir).load_classification_rules()
+        self.engine = RuleEngine()
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_parse_default_rules(self):
+        """测试解析默认规则"""
+        self.engine.parse(self.rules)
+        
+        self.assertEqual(len(self.engine.departments), 10)
+        self.assertEqual([period for period, _ in self.engine.periods], ["永久", "长期", "短期"])
+        self.assertEqual(self.engine.fallback_department, "各部门通用归档范围")
+    
+    def test_classify_and_agreement(self):
+        """测试关键词匹配与一致性"""
+        opinion = self.engine.classify("2023年度财务决算报告.pdf", "文件", self.rules)
+        self.assertEqual(opinion["result"], "永久-财务资金部")
+        
+        self.assertEqual(self.engine.agreement("财务决算.pdf", "文件", self.rules, "永久-财务资金部"), 1.0)
+        self.assertEqual(self.engine.agreement("财务决算.pdf", "文件", self.rules, "短期-财务资金部"), 0.5)
+        self.assertIsNone(self.engine.agreement("照片.jpg", "文件", self.rules, "短期-办公室"))
+
+
+class TestCompiledRules(unittest.TestCase):
+    """规则编译测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.rules_file = os.path.join(self.temp_dir, "rules.txt")
+        with open(self.rules_file, "w", encoding="utf-8") as f:
+            f.write("含合同等关键词的归经营管理部；满足重大合同等条件的永久保管")
+    
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_compile_cached_by_hash(self):
+        """测试按内容哈希复用编译结果"""
+        compiled = compile_rules("含合同等关键词的归经营管理部")
+        
+        self.assertIs(compiled, compile_rules("含合同等关键词的归经营管理部"))
+        self.assertEqual(compiled.hash, rules_hash(compiled.text))
+        self.assertEqual(compiled.vocabulary["departments"], ["经营管理部"])
+        self.assertTrue(compiled.problems)
+    
+    def test_watcher_reloads_changed_file(self):
+        """测试规则文件修改后热更新"""
+        with open(self.rules_file, "r", encoding="utf-8") as f:
+            watcher = RulesWatcher(self.rules_file, f.read(), check_interval=0)
+        old_hash = watcher.current().hash
+        
+        with open(self.rules_file, "w", encoding="utf-8") as f:
+            f.write("含合同、协议等关键词的归法律合约部；满足重大合同等条件的永久保管")
+        
+        self.assertNotEqual(watcher.current().hash, old_hash)
+        self.assertEqual(watcher.current().vocabulary["departments"], ["法律合约部"])
+        self.assertEqual(watcher.reload_count, 1)
+
+
+    def test_rules_diff_affects(self):
+        """测试按规则差异判断已归档条目是否受影响"""
+        old = compile_rules("含合同等关键词的归经营管理部；含安全等关键词的归安全部")
+        new = compile_rules("含合同、协议等关键词的归法律合约部；含安全等关键词的归安全部")
+        diff = RulesDiff(old, new)
+        
+        self.assertEqual(diff.removed_departments, {"经营管理部"})
+        self.assertTrue(diff.affects("采购合同.pdf", "经营管理部"))
+        self.assertTrue(diff.affects("框架协议.pdf", "安全部"))
+        self.assertFalse(diff.affects("安全检查记录.xlsx", "安全部"))
+        self.assertFalse(RulesDiff(old, old).affects("采购合同.pdf", "经营管理部"))
+        
+        # 只改措辞（部门和关键词归属不变）时不重新分类
+        reworded = compile_rules("含合同、协议等关键词的归法律合约部。含安全等关键词的归安全部")
+        diff = RulesDiff(new, reworded)
+        self.assertTrue(diff.text_only)
+        self.assertFalse(diff.affects("框架协议.pdf", "法律合约部"))
+        self.assertTrue(diff.affects("框架协议.pdf", "经营管理部"))
+
+
+class TestArchiveCatalog(unittest.TestCase):
+    """归档目录数据库测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.catalog = ArchiveCatalog(os.path.join(self.temp_dir, "catalog.db"), batch_size=2)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.catalog.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def make_record(self, name, period, department, mtime=1_600_000_000.0, source=None, target=None):
+        """构造目录记录"""
+        return {
+            "name": name, "entry_type": "文件", "source_path": source or f"/源/{name}",
+            "target_path": target or f"/归档/{period}/{department}/{name}", "period": period,
+            "department": department, "size": 1, "mtime": mtime, "hash": None, "run_id": "run1",
+            "rules_version": None, "archived_at": mtime, "expires_at": expires_at(period, mtime)
+        }
+    
+    def test_search_counts_and_expiry(self):
+        """测试名称检索、部门统计和到期查询"""
+        self.catalog.record([
+            self.make_record("2022年审计报告.pdf", "长期", "审计部"),
+            self.make_record("审计通知.docx", "短期", "审计部"),
+            self.make_record("会议纪要.docx", "短期", "办公室"),
+            self.make_record("章程.pdf", "永久", "办公室"),
+        ])
+        
+        self.assertEqual(self.catalog.count(), 4)
+        self.assertEqual([row["name"] for row in self.catalog.search("2022 审计报告")], ["2022年审计报告.pdf"])
+        # 两个字的关键词不走全文索引，仍能匹配
+        self.assertEqual(len(self.catalog.search("审计")), 2)
+        self.assertEqual(self.catalog.department_counts(), {"审计部": 2, "办公室": 2})
+        self.assertEqual(self.catalog.department_counts("短期"), {"审计部": 1, "办公室": 1})
+        
+        # 2020年形成的短期条目于2031年1月1日到期，长期条目于2051年到期，永久不到期
+        expired = self.catalog.expired(as_of=expires_at("短期", 1_600_000_000.0))
+        self.assertEqual(sorted(row["name"] for row in expired), ["会议纪要.docx", "审计通知.docx"])
+        self.assertEqual(len(self.catalog.expired(as_of=4_000_000_000.0)), 3)
+    
+    def test_reclassified_entry_keeps_source(self):
+        """测试重新分类移动的条目替换原记录并保留最初的来源路径"""
+        self.catalog.record([self.make_record("合同.pdf", "短期", "办公室")])
+        self.catalog.record([self.make_record("合同.pdf", "永久", "法务部", source="/归档/短期/办公室/合同.pdf")])
+        
+        self.assertEqual(self.catalog.count(), 1)
+        row = self.catalog.find("/源/合同.pdf")
+        self.assertEqual(row["target_path"], "/归档/永久/法务部/合同.pdf")
+        self.assertEqual(self.catalog.department_counts(), {"法务部": 1})
+        self.assertEqual([row["department"] for row in self.catalog.search("合同")], ["法务部"])
+
+
+class TestEventBus(unittest.TestCase):
+    """事件总线测试"""
+    
+    def test_batched_delivery_and_type_filter(self):
+        """测试按间隔批量投递、按类型过滤，取消订阅前投递积压事件"""
+        bus = EventBus(batch_interval=0.05)
+        batches, failures = [], []
+        subscription = bus.subscribe(batches.append)
+        failed_subscription = bus.subscribe(failures.append, types=[FAILED], interval=60)
+        
+        def publish(offset: int):
+            for i in range(100):
+                bus.publish(CLASSIFIED if i % 10 else FAILED, data=offset + i)
+        
+        threads = [threading.Thread(target=publish, args=(n * 100,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        bus.unsubscribe(subscription)
+        
+        events = [event for batch in batches for event in batch]
+        self.assertEqual(len(events), 400)
+        self.assertLess(len(batches), 400)
+        # 同一线程发布的事件保持顺序
+        first = [event.data["data"] for event in events if event.data["data"] < 100]
+        self.assertEqual(first, list(range(100)))
+        
+        # 间隔未到时不投递，flush立即投递
+        self.assertEqual(failures, [])
+        bus.flush()
+        self.assertEqual(len(failures[0]), 40)
+        self.assertTrue(all(event.type == FAILED for event in failures[0]))
+        bus.unsubscribe(failed_subscription)
+        self.assertFalse(bus.wants(FAILED))
+    
+    @patch("file_processor.api_service")
+    def test_processor_publishes_item_and_stage_events(self, mock_api_service):
+        """测试处理器发布条目和阶段事件，运行结束时订阅者已收到全部事件"""
+        temp_dir = tempfile.mkdtemp()
+        config_dir = tempfile.mkdtemp()
+        try:
+            for name in ("报告.pdf", "合同.docx"):
+                with open(os.path.join(temp_dir, name), "w") as f:
+                    f.write(name)
+            processor = FileProcessor()
+            processor.events = EventBus(batch_interval=60)
+            received = []
+            processor.events.subscribe(received.extend)
+            mock_api_service.classify_file.side_effect = [(True, "短期-办公室", {}), (False, "", {"error": "失败"})]
+            mock_api_service.get_similarity_stats.return_value = {}
+            mock_api_service.preflight.return_value = {"ok": True, "error": None, "providers": {},
+                                                       "concurrency": None, "duration": 0.0}
+            with patch("file_processor.config_manager", config_manager.__class__(config_dir)):
+                processor.load_files(temp_dir)
+                processor.process_all_files("规则", max_workers=1)
+            
+            types = [event.type for event in received]
+            self.assertEqual(types.count(ITEM_STARTED), 2)
+            self.assertEqual(types.count(CLASSIFIED), 1)
+            self.assertEqual(types.count(MOVED), 1)
+            self.assertEqual(types.count(FAILED), 1)
+            stages = [event.data["stage"] for event in received if event.type == STAGE]
+            self.assertEqual(stages, ["prepare", "preflight", "prepare", "classify", "finish"])
+            failed = next(event for event in received if event.type == FAILED)
+            self.assertEqual(failed.to_dict()["error"], "失败")
+        finally:
+            shutil.rmtree(temp_dir)
+            shutil.rmtree(config_dir)
+
+
+class TestTokenBudget(unittest.TestCase):
+    """Token预算测试"""
+    
+    def test_unlimited_by_default(self):
+        """测试未设置预算时只统计用量"""
+        budget = TokenBudget()
+        budget.start(AppConfig(prompt_price_per_million=1.0, completion_price_per_million=2.0), 5)
+        budget.record(1_000_000, 500_000)
+        
+        stats = budget.get_stats()
+        self.assertEqual(stats["total_tokens"], 1_500_000)
+        self.assertAlmostEqual(stats["cost"], 2.0)
+        self.assertEqual(stats["state"], BUDGET_NORMAL)
+    
+    def test_sample_projection_and_exhaustion(self):
+        """测试按样本估算超出预算时提前进入节约模式，用完后停止"""
+        budget = TokenBudget()
+        budget.start(AppConfig(run_token_budget=1000, budget_sample_size=2), 20)
+        budget.record(40, 10)
+        self.assertEqual(budget.state(), BUDGET_NORMAL)
+        
+        # 每次约50 tokens，20次约需1000 tokens以上
+        budget.record(50, 10)
+        self.assertEqual(budget.get_stats()["projected_tokens"], 1100)
+        self.assertEqual(budget.state(), BUDGET_ECONOMY)
+        
+        budget.record(800, 100)
+        self.assertEqual(budget.state(), BUDGET_EXHAUSTED)
+    
+    def test_cost_budget_share(self):
+        """测试分片时按份额使用费用预算"""
+        budget = TokenBudget()
+        budget.set_share(0.5)
+        budget.start(AppConfig(run_cost_budget=1.0, prompt_price_per_million=1.0,
+                               completion_price_per_million=1.0, budget_sample_size=100), 10)
+        budget.record(450_000, 0)
+        self.assertEqual(budget.state(), BUDGET_ECONOMY)
+        budget.record(50_000, 0)
+        self.assertEqual(budget.state(), BUDGET_EXHAUSTED)
+
+
+class TestSimilarityCache(unittest.TestCase):
+    """相似度缓存测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.cache = SimilarityCache(threshold=0.9, audit_rate=0.0)
+        self.cache.add("2024年3月工程例会纪要.docx", "文件", "规则", "长期-生产管理部")
+    
+    def test_near_duplicate_hit(self):
+        """测试仅日期不同的文件名复用分类结果"""
+        hit = self.cache.lookup("2024年4月工程例会纪要.docx", "文件", "规则")
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit["result"], "长期-生产管理部")
+        self.assertEqual(hit["matched_name"], "2024年3月工程例会纪要.docx")
+        self.assertGreaterEqual(hit["similarity"], 0.9)
+    
+    def test_distinct_name_and_rules_miss(self):
+        """测试不同名称或不同规则版本不复用"""
+        self.assertIsNone(self.cache.lookup("财务决算报告.xlsx", "文件", "规则"))
+        self.assertIsNone(self.cache.lookup("2024年4月工程例会纪要.docx", "文件", "新规则"))
+        self.assertIsNone(self.cache.lookup("2024年4月工程例会纪要.docx", "文件夹", "规则"))
+        
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["lookups"], 3)
+        self.assertEqual(stats["hits"], 0)
+    
+    def test_pure_python_fallback(self):
+        """测试缺少numpy时的纯Python实现"""
+        with patch.object(similarity_cache, "np", None):
+            cache = SimilarityCache(threshold=0.9)
+            cache.add("2024年3月工程例会纪要.docx", "文件", "规则", "长期-生产管理部")
+            hit = cache.lookup("2024年5月工程例会纪要.docx", "文件", "规则")
+            self.assertEqual(hit["result"], "长期-生产管理部")
+            self.assertIsNone(cache.lookup("安全生产检查记录", "文件", "规则"))
+    
+    def test_sparse_index_scored_outside_lock(self):
+        """测试倒排索引只保存稀疏向量、达到上限后不再收录，相似度在锁外计算"""
+        cache = SimilarityCache(threshold=0.8, max_entries=3)
+        for name in ("2024年3月工程例会纪要", "财务决算报告", "安全生产检查记录", "职工培训计划"):
+            cache.add(name, "文件夹", "规则", "长期-办公室")
+        index = next(iter(cache._indexes.values()))
+        self.assertEqual(len(index), 3)
+        self.assertFalse(hasattr(index, "_matrix"))
+        
+        lock_free = []
+        score = similarity_cache._SimilarityIndex.score
+        
+        def try_lock():
+            acquired = cache._lock.acquire(blocking=False)
+            if acquired:
+                cache._lock.release()
+            lock_free.append(acquired)
+        
+        def checked_score(parts):
+            probe = threading.Thread(target=try_lock)
+            probe.start()
+            probe.join()
+            return score(parts)
+        
+        with patch.object(similarity_cache._SimilarityIndex, "score", staticmethod(checked_score)):
+            hit = cache.lookup("2024年4月工程例会纪要1", "文件夹", "规则")
+        self.assertEqual(hit["matched_name"], "2024年3月工程例会纪要")
+        self.assertEqual(lock_free, [True])
+        self.assertIsNone(cache.lookup("职工培训计划", "文件夹", "规则"))
+    
+    def test_audit_statistics(self):
+        """测试抽样复核统计"""
+        self.cache.record_audit("a.docx", "b.docx", "长期-生产管理部", "长期-生产管理部")
+        self.cache.record_audit("c.docx", "b.docx", "长期-生产管理部", "短期-办公室")
+        
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["audits"], 2)
+        self.assertEqual(stats["audit_mismatches"], 1)
+        self.assertAlmostEqual(stats["false_reuse_rate"], 0.5)
+        self.assertEqual(stats["mismatch_samples"][0]["actual"], "短期-办公室")
+
+
+class TestHttpPool(unittest.TestCase):
+    """HTTP连接池测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.pool = http_pool.HttpPool()
+    
+    def test_connection_stats(self):
+        """测试连接复用统计"""
+        for i in range(4):
+            self.pool._on_request(Mock(extensions={}))
+        self.pool._trace("connection.connect_tcp.started", {})
+        self.pool._trace("connection.start_tls.started", {})
+        self.pool._trace("http11.send_request_headers.started", {})
+        
+        stats = self.pool.get_stats()
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["new_connections"], 1)
+        self.assertEqual(stats["tls_handshakes"], 1)
+        self.assertAlmostEqual(stats["reuse_rate"], 0.75)
+    
+    @unittest.skipIf(http_pool._load_httpx() is None, "未安装httpx")
+    def test_client_shared_until_settings_change(self):
+        """测试配置不变时复用同一客户端"""
+        config = AppConfig()
+        client = self.pool.client(config)
+        self.assertIs(self.pool.client(config), client)
+        
+        config.http_max_connections = 8
+        self.assertIsNot(self.pool.client(config), client)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """请求限速器测试"""
+    
+    def test_unlimited(self):
+        """测试不限速时不等待"""
+        limiter = RateLimiter(0)
+        self.assertEqual(limiter.acquire(), 0.0)
+        self.assertEqual(limiter.acquire(), 0.0)
+    
+    def test_fixed_interval(self):
+        """测试按固定间隔发放许可"""
+        limiter = RateLimiter(600)  # 每0.1秒一个请求
+        limiter.acquire()
+        waited = limiter.acquire()
+        self.assertGreater(waited, 0.05)
+
+
+class TestShardedRunner(unittest.TestCase):
+    """分片处理测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.items = [FileItem(f"XX合同_{i:03d}.pdf", f"/a/XX合同_{i:03d}.pdf", "文件") for i in range(10)]
+        self.items += [FileItem(f"文件{i}.doc", f"/a/报告{chr(65 + i)}.doc", "文件") for i in range(3)]
+        self.items += [FileItem(f"项目{chr(65 + i)}资料", f"/a/项目{chr(65 + i)}资料", "文件夹") for i in range(6)]
+    
+    def test_partition_keeps_series_together(self):
+        """测试同一系列文件落在同一分片"""
+        for shard_by in ("hash", "size"):
+            shards = partition_items(self.items, 3, shard_by)
+            self.assertEqual(sum(len(shard) for shard in shards), len(self.items))
+            series_shards = [i for i, shard in enumerate(shards)
+                             if any(item.name.startswith("XX合同") for item in shard)]
+            self.assertEqual(len(series_shards), 1)
+    
+    def test_partition_by_size_balances(self):
+        """测试按组大小均衡分片"""
+        shards = partition_items(self.items, 3, "size")
+        sizes = sorted(len(shard) for shard in shards)
+        self.assertEqual(sizes[-1], 10)
+        self.assertLessEqual(sizes[1] - sizes[0], 1)
+    
+    def test_merge_similarity_stats(self):
+        """测试合并各分片相似度统计"""
+        merged = merge_similarity_stats([
+            {"lookups": 10, "hits": 4, "audits": 2, "audit_mismatches": 1, "mismatch_samples": [{"name": "a"}]},
+            {},
+            {"lookups": 10, "hits": 6, "audits": 2, "audit_mismatches": 0, "mismatch_samples": []},
+        ])
+        self.assertEqual(merged["lookups"], 20)
+        self.assertAlmostEqual(merged["hit_rate"], 0.5)
+        self.assertAlmostEqual(merged["false_reuse_rate"], 0.25)
+        self.assertEqual(len(merged["mismatch_samples"]), 1)
+    
+    def test_single_shard_runs_in_process(self):
+        """测试只有一个分片时不启动工作进程"""
+        processor = Mock()
+        processor.file_items = self.items[:10]
+        processor.process_all_files.return_value = {"success": True}
+        
+        result = ShardedRunner(4).run(processor, "规则")
+        self.assertEqual(result, {"success": True})
+        processor.process_all_files.assert_called_once_with("规则", None)
+
+
+class TestProgressThrottler(unittest.TestCase):
+    """进度合并通道测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.widget = Mock()
+        self.handler = Mock()
+        self.throttler = ProgressThrottler(self.widget, self.handler, fps=10)
+    
+    def test_coalesce_updates(self):
+        """测试多次推送只投递最新进度"""
+        for i in range(1000):
+            self.throttler.push(i / 10, f"处理中: {i}")
+        
+        self.throttler._poll()
+        self.handler.assert_called_once_with(99.9, "处理中: 999")
+        
+        # 没有新进度时不重复投递
+        self.throttler._poll()
+        self.assertEqual(self.handler.call_count, 1)
+    
+    def test_fixed_frame_rate(self):
+        """测试按固定帧率调度"""
+        self.throttler.start()
+        self.widget.after.assert_called_once_with(100, self.throttler._tick)
+        
+        self.throttler.push(50.0, "处理中")
+        self.throttler.stop()
+        self.handler.assert_called_once_with(50.0, "处理中")
+
+
+class TestStartup(unittest.TestCase):
+    """启动性能测试"""
+    
+    def test_heavy_modules_deferred(self):
+        """测试启动时不导入大模型客户端和数值计算依赖"""
+        code = ("import sys, main_optimized; "
+                "print(','.join(m for m in ('openai', 'numpy', 'httpx') if m in sys.modules))")
+        completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout.strip(), "")
 
 
 class TestIntegration(unittest.TestCase):
@@ -247,8 +1651,20 @@ def run_tests():
     test_classes = [
         TestConfigManager,
         TestFileProcessor,
+        TestNameGrouping,
         TestFileItem,
         TestAPIService,
+        TestRuleEngine,
+        TestCompiledRules,
+        TestArchiveCatalog,
+        TestTokenBudget,
+        TestEventBus,
+        TestSimilarityCache,
+        TestHttpPool,
+        TestRateLimiter,
+        TestShardedRunner,
+        TestProgressThrottler,
+        TestStartup,
         TestIntegration
     ]
     
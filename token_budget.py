@@ -0,0 +1,197 @@
+"""
+Token预算模块
+统计每次运行的token用量和费用，预算紧张时逐级改用更省的分类方式，用完后停止
+"""
+
+import threading
+from typing import Optional, Dict, Any
+from loguru import logger
+
+# 预算状态：正常、节约（规则引擎能判断的不再调用大模型，不再复查）、已用完
+BUDGET_NORMAL = "normal"
+BUDGET_ECONOMY = "economy"
+BUDGET_EXHAUSTED = "exhausted"
+
+_STATE_NAMES = {BUDGET_NORMAL: "正常", BUDGET_ECONOMY: "节约模式", BUDGET_EXHAUSTED: "已用完"}
+
+
+def format_spend(total_tokens: int, cost: float) -> str:
+    """
+    格式化已用token和费用
+
+    Args:
+        total_tokens: 已用token数
+        cost: 已用费用(元)
+
+    Returns:
+        例如“已用 12,345 tokens，约¥0.02”
+    """
+    return f"已用 {total_tokens:,} tokens，约¥{cost:.2f}"
+
+
+class TokenBudget:
+    """单次运行的token与费用预算（线程安全）"""
+
+    def __init__(self):
+        """初始化预算（默认不限）"""
+        self._lock = threading.Lock()
+        self.max_tokens = 0
+        self.max_cost = 0.0
+        self.prompt_price = 0.0
+        self.completion_price = 0.0
+        self.economy_ratio = 1.0
+        self.sample_size = 0
+        self.planned_requests = 0
+        self.share = 1.0
+        self.reset()
+
+    def reset(self):
+        """清空用量统计"""
+        with self._lock:
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.requests = 0
+            self.rule_only = 0
+            self.refused = 0
+            self.projected_tokens: Optional[int] = None
+            self._forced_economy = False
+            self._state = BUDGET_NORMAL
+
+    def set_share(self, share: float):
+        """
+        设置本进程可用的预算份额（分片运行时每个进程只使用总预算的一部分）
+
+        Args:
+            share: 份额（0~1）
+        """
+        self.share = share
+
+    def start(self, app_config, planned_requests: int):
+        """
+        开始新一轮运行
+
+        Args:
+            app_config: 应用配置
+            planned_requests: 预计的大模型请求数（用于按样本估算整次运行的用量）
+        """
+        self.reset()
+        self.max_tokens = int(app_config.run_token_budget * self.share)
+        self.max_cost = app_config.run_cost_budget * self.share
+        self.prompt_price = app_config.prompt_price_per_million
+        self.completion_price = app_config.completion_price_per_million
+        self.economy_ratio = app_config.budget_economy_ratio
+        self.sample_size = min(app_config.budget_sample_size, planned_requests)
+        self.planned_requests = planned_requests
+        if self.limited:
+            logger.info(f"本次运行预算 - token: {self.max_tokens or '不限'}, "
+                        f"费用: {f'¥{self.max_cost:.2f}' if self.max_cost else '不限'}")
+
+    @property
+    def limited(self) -> bool:
+        """是否设置了预算"""
+        return self.max_tokens > 0 or self.max_cost > 0
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """按单价计算费用(元)"""
+        return (prompt_tokens * self.prompt_price + completion_tokens * self.completion_price) / 1_000_000
+
+    def _used_fraction(self) -> float:
+        """已用预算比例（token和费用中较高者，调用方持有锁）"""
+        fractions = [0.0]
+        if self.max_tokens:
+            fractions.append((self.prompt_tokens + self.completion_tokens) / self.max_tokens)
+        if self.max_cost:
+            fractions.append(self._cost(self.prompt_tokens, self.completion_tokens) / self.max_cost)
+        return max(fractions)
+
+    def _project(self):
+        """按已完成的样本请求估算整次运行的用量，超出预算时提前进入节约模式（调用方持有锁）"""
+        average = (self.prompt_tokens + self.completion_tokens) / self.requests
+        self.projected_tokens = int(average * max(self.planned_requests, self.requests))
+        projected_cost = self._cost(self.prompt_tokens, self.completion_tokens) / self.requests \
+            * max(self.planned_requests, self.requests)
+        logger.info(f"按前 {self.requests} 次请求估算，本次运行约需 {self.projected_tokens:,} tokens，"
+                    f"约¥{projected_cost:.2f}")
+
+        if (self.max_tokens and self.projected_tokens > self.max_tokens) or \
+                (self.max_cost and projected_cost > self.max_cost):
+            self._forced_economy = True
+            logger.warning("预计用量超出预算，提前改用节约模式（规则引擎能判断的条目不再调用大模型）")
+
+    def _update_state(self):
+        """根据用量更新预算状态，状态变化时记录日志（调用方持有锁）"""
+        if not self.limited:
+            return
+        fraction = self._used_fraction()
+        if fraction >= 1:
+            state = BUDGET_EXHAUSTED
+        elif self._forced_economy or fraction >= self.economy_ratio:
+            state = BUDGET_ECONOMY
+        else:
+            state = BUDGET_NORMAL
+
+        if state != self._state:
+            logger.warning(f"预算状态: {_STATE_NAMES[self._state]} → {_STATE_NAMES[state]}（已用 {fraction:.0%}）")
+            self._state = state
+
+    def record(self, prompt_tokens: int, completion_tokens: int):
+        """
+        记录一次大模型请求的用量
+
+        Args:
+            prompt_tokens: 输入token数
+            completion_tokens: 输出token数
+        """
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.requests += 1
+            if self.sample_size and self.requests == self.sample_size:
+                self._project()
+            self._update_state()
+
+    def record_rule_only(self):
+        """记录一次因预算改用规则引擎的分类"""
+        with self._lock:
+            self.rule_only += 1
+
+    def record_refused(self):
+        """记录一次因预算用完而未分类的条目"""
+        with self._lock:
+            self.refused += 1
+
+    def state(self) -> str:
+        """
+        获取当前预算状态
+
+        进行中的请求在返回前无法计入，并发时实际用量可能略超预算。
+
+        Returns:
+            BUDGET_NORMAL、BUDGET_ECONOMY或BUDGET_EXHAUSTED
+        """
+        with self._lock:
+            return self._state
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取用量统计
+
+        Returns:
+            token数、费用、预算状态、估算用量及降级处理的条目数
+        """
+        with self._lock:
+            return {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "requests": self.requests,
+                "cost": self._cost(self.prompt_tokens, self.completion_tokens),
+                "state": self._state,
+                "projected_tokens": self.projected_tokens,
+                "rule_only": self.rule_only,
+                "refused": self.refused
+            }
+
+
+# 全局预算实例
+token_budget = TokenBudget()
@@ -8,6 +8,7 @@ from tkinter import ttk, messagebox, filedialog
 from typing import Optional, Callable, Dict, Any
 from config import config_manager, APIConfig
 from api_service import api_service
+from compiled_rules import compile_rules
 import threading
 
 
@@ -88,6 +89,16 @@ class APIConfigDialog:
         ttk.Radiobutton(api_frame, text="DeepSeek API", variable=self.api_type_var, 
                        value="deepseek", command=self._on_api_type_change).pack(anchor=tk.W)
         
+        # 配置文件中的其他服务商（本地模型、内部网关等）
+        api_config = config_manager.get_api_config()
+        for name in api_config.profile_names():
+            if name in ("doubao", "deepseek"):
+                continue
+            profile = api_config.get_profile(name)
+            ttk.Radiobutton(api_frame, text=f"{profile.name or name}（{profile.base_url}）",
+                           variable=self.api_type_var, value=name,
+                           command=self._on_api_type_change).pack(anchor=tk.W)
+        
         # API Key输入
         key_frame = ttk.LabelFrame(main_frame, text="API密钥", padding="10")
         key_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 15))
@@ -177,11 +188,12 @@ class APIConfigDialog:
     def _save_config(self):
         """保存配置"""
         try:
-            api_config = APIConfig(
-                doubao_api_key=self.doubao_entry.get().strip(),
-                deepseek_api_key=self.deepseek_entry.get().strip(),
-                api_type=self.api_type_var.get()
-            )
+            # 保留配置文件中的服务商配置
+            api_config = config_manager.get_api_config().model_copy(update={
+                "doubao_api_key": self.doubao_entry.get().strip(),
+                "deepseek_api_key": self.deepseek_entry.get().strip(),
+                "api_type": self.api_type_var.get()
+            })
             
             # 更新配置
             if config_manager.update_api_config(api_config):
@@ -298,9 +310,15 @@ class ClassificationRulesDialog:
         try:
             new_rules = self.text_widget.get(1.0, tk.END).strip()
             
+            # 保存前先编译校验，发现问题时由用户确认
+            problems = compile_rules(new_rules).problems
+            if problems and not messagebox.askyesno(
+                    "规则校验", "规则可能存在以下问题：\n" + "\n".join(f"- {p}" for p in problems) + "\n\n仍要保存吗？"):
+                return
+            
             if config_manager.save_classification_rules(new_rules):
                 self.result = new_rules
-                messagebox.showinfo("保存成功", "分类规则已保存")
+                messagebox.showinfo("保存成功", "分类规则已保存，正在进行的分类会对尚未开始的条目使用新规则")
                 self.dialog.destroy()
             else:
                 messagebox.showerror("保存失败", "规则保存失败，请检查文件权限")
@@ -321,17 +339,29 @@ class ClassificationRulesDialog:
 class ProgressDialog:
     """进度对话框"""
     
-    def __init__(self, parent, title="处理中"):
-        """初始化进度对话框"""
+    def __init__(self, parent, title="处理中", on_pause: Optional[Callable[[], bool]] = None,
+                 on_cancel: Optional[Callable[[], None]] = None):
+        """
+        初始化进度对话框
+        
+        Args:
+            parent: 父窗口
+            title: 对话框标题
+            on_pause: 暂停/继续回调，返回切换后是否处于暂停状态
+            on_cancel: 取消回调
+        """
         self.parent = parent
         self.title = title
+        self.on_pause = on_pause
+        self.on_cancel = on_cancel
         self._create_dialog()
     
     def _create_dialog(self):
         """创建对话框"""
+        height = 200 if (self.on_pause or self.on_cancel) else 150
         self.dialog = tk.Toplevel(self.parent)
         self.dialog.title(self.title)
-        self.dialog.geometry("400x150")
+        self.dialog.geometry(f"400x{height}")
         self.dialog.resizable(False, False)
         self.dialog.transient(self.parent)
         self.dialog.grab_set()
@@ -339,8 +369,12 @@ class ProgressDialog:
         # 居中显示
         self.dialog.update_idletasks()
         x = (self.dialog.winfo_screenwidth() // 2) - (400 // 2)
-        y = (self.dialog.winfo_screenheight() // 2) - (150 // 2)
-        self.dialog.geometry(f"400x150+{x}+{y}")
+        y = (self.dialog.winfo_screenheight() // 2) - (height // 2)
+        self.dialog.geometry(f"400x{height}+{x}+{y}")
+        
+        # 关闭窗口视为取消，避免直接中断正在进行的移动
+        if self.on_cancel:
+            self.dialog.protocol("WM_DELETE_WINDOW", self._cancel)
         
         self._create_widgets()
     
@@ -367,20 +401,279 @@ class ProgressDialog:
         percent_label = ttk.Label(main_frame, textvariable=self.percent_var, 
                                  font=("微软雅黑", 9))
         percent_label.pack()
+        
+        # 暂停/取消按钮
+        if self.on_pause or self.on_cancel:
+            button_frame = ttk.Frame(main_frame)
+            button_frame.pack(pady=(10, 0))
+            
+            if self.on_pause:
+                self.pause_button = ModernButton(button_frame, text="暂停", command=self._toggle_pause)
+                self.pause_button.pack(side=tk.LEFT, padx=(0, 10))
+            
+            if self.on_cancel:
+                self.cancel_button = ModernButton(button_frame, text="取消", command=self._cancel)
+                self.cancel_button.pack(side=tk.LEFT)
+    
+    def _toggle_pause(self):
+        """暂停/继续"""
+        paused = self.on_pause()
+        self.pause_button.config(text="继续" if paused else "暂停")
+        if paused:
+            self.status_var.set("已暂停，等待进行中的条目完成...")
+    
+    def _cancel(self):
+        """取消处理"""
+        if messagebox.askyesno("确认取消", "确定要取消分类吗？\n进行中的条目完成后将停止，未处理的文件保持原位。",
+                               parent=self.dialog):
+            self.on_cancel()
+            self.status_var.set("正在取消，等待进行中的条目完成...")
+            if self.on_pause:
+                self.pause_button.config(state=tk.DISABLED)
+            self.cancel_button.config(state=tk.DISABLED)
     
     def update_progress(self, progress: float, status: str = None):
-        """更新进度"""
+        """更新进度（仅修改变量，由Tk事件循环统一重绘）"""
         self.progress_var.set(progress)
         self.percent_var.set(f"{progress:.1f}%")
         if status:
             self.status_var.set(status)
-        self.dialog.update()
-    
+
     def close(self):
         """关闭对话框"""
         self.dialog.destroy()
 
 
+class ProgressThrottler:
+    """进度合并通道：工作线程随时推送，界面线程按固定帧率只取最新值"""
+
+    def __init__(self, widget, handler: Callable[[float, str], None], fps: int = 20):
+        """
+        初始化进度合并通道
+
+        Args:
+            widget: 用于调度定时器的Tk控件
+            handler: 在界面线程中执行的进度处理函数
+            fps: 每秒最多刷新次数
+        """
+        self.widget = widget
+        self.handler = handler
+        self.interval_ms = max(1, int(1000 / max(1, fps)))
+        self._lock = threading.Lock()
+        self._latest: Optional[tuple] = None
+        self._running = False
+        self._after_id = None
+
+    def push(self, progress: float, status: str = ""):
+        """推送进度（线程安全，只保留最新一次）"""
+        with self._lock:
+            self._latest = (progress, status)
+
+    def start(self):
+        """开始按固定帧率刷新"""
+        self._running = True
+        self._schedule()
+
+    def stop(self, flush: bool = True):
+        """
+        停止刷新
+
+        Args:
+            flush: 是否在停止前投递最后一次进度
+        """
+        self._running = False
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        if flush:
+            self._poll()
+
+    def _schedule(self):
+        """调度下一帧"""
+        if self._running:
+            self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def _tick(self):
+        """定时器回调"""
+        self._after_id = None
+        self._poll()
+        self._schedule()
+
+    def _poll(self):
+        """取出最新进度并交给处理函数"""
+        with self._lock:
+            latest, self._latest = self._latest, None
+        if latest is not None:
+            self.handler(*latest)
+
+
+class VirtualFileList(ttk.Frame):
+    """虚拟化文件列表：Treeview中只保留可见的行，滚动时用后备列表中对应位置的条目填充这些行"""
+
+    def __init__(self, parent, page_size: int = 500, **kwargs):
+        """
+        初始化虚拟化文件列表
+
+        Args:
+            parent: 父控件
+            page_size: 最多同时渲染的行数
+        """
+        super().__init__(parent, **kwargs)
+        self.page_size = max(1, page_size)
+        self._source: Optional[list] = None
+        self._items: list = []
+        self._positions: dict = {}
+        self._first = 0
+        self._rows = 1
+        self._slots = 0
+        self._row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+
+        self._scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self._scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree = ttk.Treeview(self, columns=("type", "name", "result"), show="headings", selectmode="browse")
+        self.tree.heading("type", text="类型")
+        self.tree.heading("name", text="名称")
+        self.tree.heading("result", text="分类结果")
+        self.tree.column("type", width=70, stretch=False, anchor=tk.CENTER)
+        self.tree.column("name", width=380)
+        self.tree.column("result", width=260)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", self._on_wheel)
+        self.tree.bind("<Button-5>", self._on_wheel)
+        self.tree.bind("<Prior>", lambda event: self._scroll_by(-self._rows))
+        self.tree.bind("<Next>", lambda event: self._scroll_by(self._rows))
+
+        # 配置行标签
+        self.tree.tag_configure("success", foreground="green")
+        self.tree.tag_configure("error", foreground="red")
+        self.tree.tag_configure("info", foreground="blue")
+
+    def set_items(self, items: list):
+        """
+        设置列表数据（回到顶部，只渲染可见的行）
+
+        Args:
+            items: 文件项列表
+        """
+        self.tree.delete(*self.tree.get_children())
+        self._slots = 0
+        self._source = items
+        self._items = list(items)
+        self._positions = {id(item): index for index, item in enumerate(self._items)}
+        self._first = 0
+
+        if not self._items:
+            self.tree.insert("", tk.END, values=("", "未加载文件", ""), tags=("info",))
+            self._scrollbar.set(0.0, 1.0)
+            return
+
+        self._render()
+
+    def sync(self, items: list):
+        """
+        运行结束后同步显示：数据源已被替换（执行计划、重新分类）时重新设置列表，否则刷新可见行
+
+        Args:
+            items: 处理器当前的文件项列表
+        """
+        if items is self._source and len(items) == len(self._items):
+            self.refresh()
+        else:
+            self.set_items(items)
+
+    def refresh(self):
+        """刷新可见行的分类结果"""
+        if self._items:
+            self._render()
+
+    def update_items(self, items: list):
+        """
+        刷新指定条目所在的行（不在可见范围内的条目滚动到时显示最新结果）
+
+        Args:
+            items: 文件项列表
+        """
+        for item in items:
+            index = self._positions.get(id(item))
+            if index is not None and self._first <= index < self._first + self._slots:
+                self.tree.item(str(index - self._first), values=self._row_values(item), tags=self._row_tags(item))
+
+    def _render(self):
+        """用后备列表中从_first开始的条目填充可见行（行控件复用，数量不随条目数增长）"""
+        total = len(self._items)
+        self._first = max(0, min(self._first, total - self._rows))
+        end = min(self._first + self._rows, total)
+        count = end - self._first
+
+        for slot in range(count):
+            item = self._items[self._first + slot]
+            if slot < self._slots:
+                self.tree.item(str(slot), values=self._row_values(item), tags=self._row_tags(item))
+            else:
+                self.tree.insert("", tk.END, iid=str(slot), values=self._row_values(item),
+                                 tags=self._row_tags(item))
+        for slot in range(count, self._slots):
+            self.tree.delete(str(slot))
+        self._slots = count
+        self._scrollbar.set(self._first / total, end / total)
+
+    def _scroll_by(self, rows: int):
+        """滚动指定行数"""
+        self._scroll_to(self._first + rows)
+        return "break"
+
+    def _scroll_to(self, first: int):
+        """滚动到以指定条目开始的位置"""
+        first = max(0, min(first, len(self._items) - self._rows))
+        if first != self._first and self._items:
+            self._first = first
+            self.tree.selection_remove(self.tree.selection())
+            self._render()
+
+    def _on_scrollbar(self, action: str, value: str, unit: str = ""):
+        """滚动条回调：拖动滑块（moveto）或点击箭头/空白处（scroll）"""
+        if action == "moveto":
+            self._scroll_to(int(float(value) * len(self._items)))
+        elif action == "scroll":
+            step = int(value) * (self._rows if unit == "pages" else 1)
+            self._scroll_by(step)
+
+    def _on_wheel(self, event):
+        """鼠标滚轮：每格滚动3行（Linux为Button-4/5，其他平台为delta）"""
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            return self._scroll_by(-3)
+        return self._scroll_by(3)
+
+    def _on_resize(self, event):
+        """控件高度变化时重新计算可见行数（表头按一行计）"""
+        rows = max(1, min(self.page_size, event.height // self._row_height - 1))
+        if rows != self._rows:
+            self._rows = rows
+            self.refresh()
+
+    @staticmethod
+    def _row_values(item) -> tuple:
+        """生成行数据"""
+        result = item.classification_result or (f"失败: {item.error}" if item.error else "")
+        return item.entry_type, item.name, result
+
+    @staticmethod
+    def _row_tags(item) -> tuple:
+        """生成行标签"""
+        if item.error:
+            return ("error",)
+        if item.target_path:
+            return ("success",)
+        return ()
+
+
 class HelpDialog:
     """帮助对话框"""
     